@@ -32,13 +32,17 @@ from pp.config import CONFIG, call_if_func, conf
 from pp.component import Component, ComponentReference
 from pp.port import Port
 from pp.port import port_array
+from pp.cell import build_many
 from pp.cell import cell
 from pp.cell import clear_cache
+from pp.import_cache import clear_import_cache
+from pp.profiler import profile
 from pp.layers import LAYER
 from pp.load_component import load_component
 
 from pp.write_component import show
 from pp.write_component import write_gds
+from pp.write_component import write_gds_stream
 from pp.write_component import write_component
 from pp.write_doe import write_doe
 
@@ -76,6 +80,7 @@ __all__ = [
     "Group",
     "Path",
     "bias",
+    "build_many",
     "cell",
     "add_padding",
     "add_pins",
@@ -84,6 +89,8 @@ __all__ = [
     "import_gds",
     "c",
     "clear_cache",
+    "clear_import_cache",
+    "profile",
     "conf",
     "call_if_func",
     "extend_ports",
@@ -106,6 +113,7 @@ __all__ = [
     "write_component",
     "write_doe",
     "write_gds",
+    "write_gds_stream",
     "Port",
     "component_from_yaml",
 ]
@@ -1,12 +1,78 @@
 import glob
 import json
+import pathlib
 import re
 from collections import defaultdict
-
-import klayout.db as pya
+from collections.abc import MutableMapping
 
 from pp.autoplacer.cell_list import CellList
 from pp.autoplacer.functions import WORKING_MEMORY, area
+from pp.catalog import Catalog
+from pp.compression import LAYOUT_SUFFIXES, read_layout
+
+
+def _width(entry):
+    """ Width of a catalog entry, the same order as area() """
+    bbox = entry["bbox"]
+    return bbox[1][0] - bbox[0][0] if bbox else 0
+
+
+class _Cells(MutableMapping):
+    """ Top cells by name, the GDS of a cell is only read when it is first
+    accessed """
+
+    def __init__(self, library):
+        self.library = library
+        self.gdspaths = {}
+        self.loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self.loaded:
+            self.library.load_gds(self.gdspaths[name])
+        return self.loaded[name]
+
+    def __setitem__(self, name, cell):
+        self.gdspaths.setdefault(name, None)
+        self.loaded[name] = cell
+
+    def __delitem__(self, name):
+        del self.gdspaths[name]
+        self.loaded.pop(name, None)
+
+    def __iter__(self):
+        return iter(self.gdspaths)
+
+    def __len__(self):
+        return len(self.gdspaths)
+
+    def __repr__(self):
+        return "<cells {}>".format(sorted(self.gdspaths))
+
+
+class _Does(MutableMapping):
+    """ Cells of each DOE (only the ones still in the library) """
+
+    def __init__(self, library):
+        self.library = library
+        self.names = defaultdict(list)
+
+    def __getitem__(self, doe_name):
+        if doe_name not in self.names:
+            raise KeyError(doe_name)
+        cells = self.library.cells
+        return [cells[name] for name in self.names[doe_name] if name in cells]
+
+    def __setitem__(self, doe_name, cells):
+        self.names[doe_name] = [cell.name for cell in cells]
+
+    def __delitem__(self, doe_name):
+        del self.names[doe_name]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
 
 
 class Library(object):
@@ -18,6 +84,11 @@ class Library(object):
 
     Args:
         root: GDS devices path
+        doe_root: path of the DOE JSON files (defaults to root)
+        catalog: read the cells, their bbox and the DOEs from the catalog of
+            root (see pp.catalog, creates or updates root/catalog.db) and
+            only load each GDS when its cell is used.
+            By default all the GDS files of root are loaded.
 
     To make a `Library` containing all the devices in `build/devices`, just instantiate the class (`library = Library()`).
     You can then pull out subsets of devices using `library.pop()`.
@@ -47,16 +118,37 @@ class Library(object):
 
     """
 
-    def __init__(self, root="build/devices"):
+    def __init__(self, root="build/devices", doe_root=None, catalog=False):
         self.root = root
-        self.cells = {}
-        self.does = defaultdict(list)
-        self.load_all_gds()
-        self.load_all_json()
+        self.doe_root = doe_root or root
+        self.cells = _Cells(self)
+        self.does = _Does(self)
+        self.catalog = None
+        if catalog:
+            self.catalog = Catalog(pathlib.Path(root), doe_dirpath=doe_root)
+            self.catalog.update()
+            for entry in self.catalog.query():
+                self.cells.gdspaths[entry["name"]] = entry["gdspath"]
+            for doe_name, cell_names in self.catalog.does().items():
+                self.does.names[doe_name] = [
+                    name for name in cell_names if name in self.cells
+                ]
+        else:
+            self.load_all_gds()
+            self.load_all_json()
+
+    @property
+    def names(self):
+        """ names of the cells still in the library """
+        return set(self.cells)
 
     def load_all_gds(self):
         """ Loads all the gds files """
-        filenames = glob.glob(self.root + "/*.gds")
+        filenames = [
+            str(path)
+            for path in sorted(pathlib.Path(self.root).glob("*"))
+            if path.name.endswith(LAYOUT_SUFFIXES)
+        ]
         print("Loading {} GDS files...".format(len(filenames)))
         for filename in filenames:
             self.load_gds(filename)
@@ -64,15 +156,14 @@ class Library(object):
 
     def load_all_json(self):
         """ loads all the json files """
-        filenames = glob.glob(self.root + "/*.json")
+        filenames = glob.glob(str(self.doe_root) + "/*.json")
         for filename in filenames:
             self.load_json(filename)
 
     def load_gds(self, filename):
         """ Load a GDS and append it into self.cells """
-        layout = pya.Layout()
+        layout = read_layout(filename)
         WORKING_MEMORY[filename] = layout
-        layout.read(str(filename))
         self.cells[layout.top_cell().name] = layout.top_cell()
         self.cells[layout.top_cell().name].metadata = {}
 
@@ -84,22 +175,34 @@ class Library(object):
                 doe_name = metadata.get("name")
                 for cell_name in metadata.get("cells"):
                     if cell_name in self.cells:
-                        self.does[doe_name].append(self.cells[cell_name])
+                        self.does.names[doe_name].append(cell_name)
+
+    def find(self, regex):
+        """ Returns the names of the cells that match regex, widest first
+        (with a catalog, without loading their GDS) """
+        entries = []
+        if self.catalog:
+            entries = [
+                entry
+                for entry in self.catalog.query(regex=regex)
+                if entry["name"] in self.cells
+            ]
+        found = {entry["name"] for entry in entries}
+        for name in self.cells:
+            if name not in found and re.search(regex, name, flags=re.IGNORECASE):
+                box = self.cells[name].bbox()
+                bbox = [[box.left, box.bottom], [box.right, box.top]]
+                entries.append({"name": name, "bbox": bbox})
+        return [entry["name"] for entry in sorted(entries, key=_width, reverse=True)]
 
     def get(self, regex):
-        cells = [
-            cell
-            for key, cell in self.cells.items()
-            if re.search(regex, key, flags=re.IGNORECASE)
-        ]
-        return CellList(cells)
+        return CellList([self.cells[name] for name in self.find(regex)])
 
     def pop_doe(self, regex):
         """ pop out a set of cells """
         cells = []
         if regex in self.does:
-            cells = self.does[regex]
-            del self.does[regex]
+            cells = self.does.pop(regex)
             self.delete_cells(cells)
             cells = sorted(cells, key=area, reverse=True)
 
@@ -110,21 +213,11 @@ class Library(object):
 
     def pop(self, regex, delete=True):
         """ pop cells """
-        # pop out the cells
-        # cells = [
-        #     cell for key, cell in self.cells.items()
-        #     if re.search(regex, key, flags=re.IGNORECASE)
-        # ]
-        cells = []
-        keys = []
-        for key, cell in self.cells.items():
-            if re.search(regex, key, flags=re.IGNORECASE):
-                cells.append(cell)
-                keys.append(key)
+        names = self.find(regex)
+        cells = [self.cells[name] for name in names]
 
         if delete:
-            for key in keys:
-                del self.cells[key]
+            self.delete_cells(cells)
         if cells:
             cells = sorted(cells, key=area, reverse=True)
         else:
@@ -134,15 +227,12 @@ class Library(object):
 
     def delete_cells(self, cells):
         for cell in cells:
-            try:
-                del self.cells[cell.name]
-            except KeyError:
-                pass
+            self.cells.pop(cell.name, None)
 
     def list(self):
         """ just list the devices currently in the collection """
         print("Library contains cells:")
-        for name in sorted(self.cells.keys()):
+        for name in sorted(self.names):
             print("-", name)
 
         if self.does and False:
@@ -153,11 +243,11 @@ class Library(object):
 
     def count(self):
         """ Safety check at the end """
-        if self.cells:
-            print("{} cells were not used".format(len(self.cells)))
+        if self.names:
+            print("{} cells were not used".format(len(self.names)))
 
     def __str__(self):
-        return "<collection of {} cells>".format(len(self.cells))
+        return "<collection of {} cells>".format(len(self.names))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,440 @@
+"""SQLite catalog of the GDS files of a directory (gdslib, build/devices ...).
+
+One `catalog.db` per directory stores, for each top cell: name, file, size,
+mtime, settings, bbox, ports, layers and geometry hash, and the cells of each
+DOE. Name (regex), settings and DOE queries hit the index and GDS files are
+only read when a cell is loaded.
+
+`write_component(..., catalog=True)` (or `catalog: true` in config.yml) adds
+the components it writes, and `Catalog.update()` indexes the files that were
+added, modified or removed since the last update.
+
+.. code::
+
+    from pp.catalog import Catalog
+
+    catalog = Catalog(pp.CONFIG["gdslib"])
+    catalog.update()
+    catalog.names("mmi")  # regex on the cell name
+    catalog.query(function_name="waveguide", length=2)
+    c = catalog.load("mmi1x2")
+
+"""
+import json
+import os
+import pathlib
+import re
+import sqlite3
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from pp.component import Component
+from pp.compression import LAYOUT_SUFFIXES, read_layout, strip_compression
+from pp.sidecar import get_ports_array, read_sidecar
+
+CATALOG_NAME = "catalog.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    name TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    function_name TEXT,
+    settings TEXT,
+    xmin REAL, ymin REAL, xmax REAL, ymax REAL,
+    ports TEXT,
+    layers TEXT,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS cells_filename ON cells (filename);
+CREATE INDEX IF NOT EXISTS cells_function_name ON cells (function_name);
+CREATE INDEX IF NOT EXISTS cells_hash ON cells (hash);
+CREATE TABLE IF NOT EXISTS does (
+    doe TEXT NOT NULL,
+    cell TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    mtime_ns INTEGER,
+    PRIMARY KEY (doe, cell)
+);
+CREATE INDEX IF NOT EXISTS does_filename ON does (filename);
+"""
+
+COLUMNS = [
+    "name",
+    "filename",
+    "size",
+    "mtime_ns",
+    "function_name",
+    "settings",
+    "xmin",
+    "ymin",
+    "xmax",
+    "ymax",
+    "ports",
+    "layers",
+    "hash",
+]
+
+
+@lru_cache(maxsize=None)
+def _compile(regex: str):
+    return re.compile(regex, flags=re.IGNORECASE)
+
+
+def _regexp(regex: str, value: str) -> bool:
+    """SQLite REGEXP, with the same semantics as re.search(regex, value, re.I)."""
+    return value is not None and _compile(regex).search(value) is not None
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _get_ports(ports_array) -> List[Dict[str, Any]]:
+    return [
+        {name: port[name].item() for name in ports_array.dtype.names}
+        for port in ports_array
+    ]
+
+
+def _read_metadata(gdspath: pathlib.Path, name: str):
+    """Returns cell settings and ports from the sidecars of gdspath."""
+    gdspath = strip_compression(gdspath)
+    npz_path = gdspath.with_suffix(".npz")
+    json_path = gdspath.with_suffix(".json")
+    ports_path = gdspath.with_suffix(".ports")
+    if npz_path.exists():
+        ports_array, metadata = read_sidecar(npz_path)
+        return metadata.get("cells", {}).get(name, {}), _get_ports(ports_array)
+
+    settings = {}
+    ports = []
+    if json_path.exists():
+        settings = json.loads(json_path.read_text()).get("cells", {}).get(name, {})
+    if ports_path.exists():
+        for line in ports_path.read_text().splitlines():
+            r = [value.strip() for value in line.split(",")]
+            ports.append(
+                dict(
+                    name=r[0],
+                    x=float(r[1]),
+                    y=float(r[2]),
+                    orientation=float(r[3]),
+                    width=float(r[4]),
+                    layer=int(r[5]),
+                    purpose=int(r[6]),
+                )
+            )
+    return settings, ports
+
+
+def _read_hash(gdspath: pathlib.Path) -> Optional[str]:
+    """Returns the geometry hash of the write_component manifest (if any)."""
+    try:
+        manifest_path = strip_compression(gdspath).with_suffix(".manifest")
+        return json.loads(manifest_path.read_text())["geometry"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+class Catalog:
+    """SQLite index of the GDS files of a directory.
+
+    Args:
+        dirpath: directory with the GDS files (and their sidecars)
+        doe_dirpath: directory with DOE JSON files (type="doe"),
+            defaults to dirpath
+    """
+
+    def __init__(
+        self, dirpath: pathlib.Path, doe_dirpath: Optional[pathlib.Path] = None
+    ) -> None:
+        self.dirpath = pathlib.Path(dirpath)
+        self.doe_dirpath = pathlib.Path(doe_dirpath or dirpath)
+        self.dirpath.mkdir(parents=True, exist_ok=True)
+        self.path = self.dirpath / CATALOG_NAME
+        self.connection = sqlite3.connect(str(self.path), timeout=60)
+        self.connection.create_function("REGEXP", 2, _regexp)
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM cells").fetchone()[0]
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _upsert(self, row: Dict[str, Any]) -> None:
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM cells WHERE filename = ? AND name != ?",
+                (row["filename"], row["name"]),
+            )
+            self.connection.execute(
+                f"INSERT OR REPLACE INTO cells ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                [row[column] for column in COLUMNS],
+            )
+
+    def add_component(
+        self,
+        component: Component,
+        gdspath: pathlib.Path,
+        geometry_hash: Optional[str] = None,
+    ) -> None:
+        """Adds (or updates) component written in gdspath."""
+        gdspath = pathlib.Path(gdspath)
+        stat = os.stat(gdspath)
+        bbox = component.get_bounding_box()
+        (xmin, ymin), (xmax, ymax) = (
+            bbox.tolist() if bbox is not None else [[None] * 2] * 2
+        )
+        settings = component.get_json()["cells"].get(component.name, {})
+        self._upsert(
+            dict(
+                name=component.name,
+                filename=gdspath.name,
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                function_name=settings.get("function_name"),
+                settings=_dumps(settings),
+                xmin=xmin,
+                ymin=ymin,
+                xmax=xmax,
+                ymax=ymax,
+                ports=_dumps(_get_ports(get_ports_array(component))),
+                layers=_dumps(sorted(component.get_layers())),
+                hash=geometry_hash,
+            )
+        )
+
+    def add_file(self, gdspath: pathlib.Path) -> Optional[str]:
+        """Adds (or updates) the top cell of gdspath, reading the geometry
+        with klayout and settings and ports from the sidecars.
+        Returns the cell name (None for files without top cell)."""
+        gdspath = pathlib.Path(gdspath)
+        stat = os.stat(gdspath)
+        layout = read_layout(gdspath)
+        top_cells = layout.top_cells()
+        if not top_cells:
+            return None
+        cell = top_cells[0]
+        bbox = cell.dbbox()
+        layers = sorted(
+            (info.layer, info.datatype)
+            for index, info in zip(layout.layer_indexes(), layout.layer_infos())
+            if not cell.bbox_per_layer(index).empty()
+        )
+        settings, ports = _read_metadata(gdspath, cell.name)
+        self._upsert(
+            dict(
+                name=cell.name,
+                filename=gdspath.name,
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns,
+                function_name=settings.get("function_name"),
+                settings=_dumps(settings),
+                xmin=None if bbox.empty() else bbox.left,
+                ymin=None if bbox.empty() else bbox.bottom,
+                xmax=None if bbox.empty() else bbox.right,
+                ymax=None if bbox.empty() else bbox.top,
+                ports=_dumps(ports),
+                layers=_dumps(layers),
+                hash=_read_hash(gdspath),
+            )
+        )
+        return cell.name
+
+    def add_doe(self, jsonpath: pathlib.Path) -> Optional[str]:
+        """Adds the cells of a DOE JSON file (written by write_doe).
+        Returns the DOE name (None for other JSON files)."""
+        jsonpath = pathlib.Path(jsonpath)
+        mtime_ns = os.stat(jsonpath).st_mtime_ns
+        try:
+            metadata = json.loads(jsonpath.read_text())
+        except ValueError:
+            metadata = {}
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM does WHERE filename = ?", (jsonpath.name,)
+            )
+            if metadata.get("type") != "doe":
+                return None
+            doe = metadata.get("name")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO does VALUES (?, ?, ?, ?)",
+                [(doe, cell, jsonpath.name, mtime_ns) for cell in metadata["cells"]],
+            )
+        return doe
+
+    def update(self) -> None:
+        """Indexes the GDS and DOE JSON files added or modified since the
+        last update, and removes the ones that were deleted."""
+        indexed = dict(self.connection.execute("SELECT filename, mtime_ns FROM cells"))
+        for entry in _scandir(self.dirpath, LAYOUT_SUFFIXES):
+            if indexed.pop(entry.name, None) != entry.stat().st_mtime_ns:
+                self.add_file(entry.path)
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM cells WHERE filename = ?", [(f,) for f in indexed]
+            )
+
+        # JSON files next to a GDS are sidecars, not DOEs
+        indexed = dict(self.connection.execute("SELECT filename, mtime_ns FROM does"))
+        entries = _scandir(self.doe_dirpath, (".json",) + LAYOUT_SUFFIXES)
+        gds_stems = {
+            strip_compression(e.name).stem
+            for e in entries
+            if e.name.endswith(LAYOUT_SUFFIXES)
+        }
+        for entry in entries:
+            if (
+                not entry.name.endswith(".json")
+                or entry.name[: -len(".json")] in gds_stems
+            ):
+                continue
+            if indexed.pop(entry.name, None) != entry.stat().st_mtime_ns:
+                self.add_doe(entry.path)
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM does WHERE filename = ?", [(f,) for f in indexed]
+            )
+
+    def remove(self, name: str) -> None:
+        with self.connection:
+            self.connection.execute("DELETE FROM cells WHERE name = ?", (name,))
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Returns the catalog entry of a cell (None if missing)."""
+        rows = self._select("WHERE name = ?", [name])
+        return rows[0] if rows else None
+
+    def _select(self, where: str = "", args: List[Any] = ()) -> List[Dict[str, Any]]:
+        rows = self.connection.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM cells {where}", list(args)
+        )
+        entries = []
+        for row in rows:
+            entry = dict(zip(COLUMNS, row))
+            for column in ["settings", "ports", "layers"]:
+                entry[column] = json.loads(entry[column])
+            entry["layers"] = [tuple(layer) for layer in entry["layers"]]
+            xmin, ymin, xmax, ymax = [
+                entry.pop(key) for key in "xmin ymin xmax ymax".split()
+            ]
+            entry["bbox"] = None if xmin is None else [[xmin, ymin], [xmax, ymax]]
+            entry["gdspath"] = self.dirpath / entry["filename"]
+            entries.append(entry)
+        return entries
+
+    def query(
+        self,
+        regex: Optional[str] = None,
+        doe: Optional[str] = None,
+        function_name: Optional[str] = None,
+        layer: Optional[Any] = None,
+        **settings,
+    ) -> List[Dict[str, Any]]:
+        """Returns the catalog entries that match all the conditions, sorted by name.
+
+        Args:
+            regex: searched in the cell name (case insensitive)
+            doe: DOE name
+            function_name: name of the cell function
+            layer: (layer, datatype) in the cell
+            settings: cell settings values
+        """
+        conditions = []
+        args = []
+        if regex is not None:
+            conditions.append("name REGEXP ?")
+            args.append(regex)
+        if doe is not None:
+            conditions.append("name IN (SELECT cell FROM does WHERE doe = ?)")
+            args.append(doe)
+        if function_name is not None:
+            conditions.append("function_name = ?")
+            args.append(function_name)
+        if layer is not None:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM json_each(layers) WHERE value = json(?))"
+            )
+            args.append(_dumps(list(layer)))
+        for key, value in settings.items():
+            if isinstance(value, (list, tuple, dict)):
+                conditions.append("json_extract(settings, ?) = json(?)")
+                args.extend([f"$.settings.{key}", _dumps(value)])
+            else:
+                conditions.append("json_extract(settings, ?) = ?")
+                args.extend([f"$.settings.{key}", value])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._select(f"{where} ORDER BY name", args)
+
+    def names(self, regex: Optional[str] = None, **kwargs) -> List[str]:
+        """Returns the names of the cells that match a query."""
+        return [entry["name"] for entry in self.query(regex=regex, **kwargs)]
+
+    def does(self) -> Dict[str, List[str]]:
+        """Returns {doe name: cell names}."""
+        does = {}
+        rows = self.connection.execute("SELECT doe, cell FROM does ORDER BY doe, cell")
+        for doe, cell in rows:
+            does.setdefault(doe, []).append(cell)
+        return does
+
+    def load(self, name: str) -> Component:
+        """Returns the Component of a cell, with ports and settings."""
+        from pp.load_component import load_component
+
+        entry = self.get(name)
+        if entry is None:
+            raise KeyError(f"{name!r} not in {self.path}")
+        return load_component(entry["gdspath"])
+
+
+def _scandir(dirpath: pathlib.Path, suffixes):
+    if not dirpath.exists():
+        return []
+    with os.scandir(dirpath) as it:
+        return [
+            entry
+            for entry in it
+            if entry.is_file()
+            and entry.name.endswith(suffixes)
+            and not entry.name.startswith(".")
+        ]
+
+
+def update_catalog(dirpath: pathlib.Path, **kwargs) -> Catalog:
+    """Returns the (updated) catalog of dirpath."""
+    catalog = Catalog(dirpath, **kwargs)
+    catalog.update()
+    return catalog
+
+
+def test_catalog(tmp_path) -> None:
+    import pp
+
+    for length in [1, 2]:
+        pp.write_component(pp.c.waveguide(length=length), gdsdir=tmp_path)
+    catalog = update_catalog(tmp_path)
+    assert catalog.names("waveguide") == ["waveguide_L1", "waveguide_L2"]
+    assert catalog.names(length=2) == ["waveguide_L2"]
+    assert catalog.get("waveguide_L2")["bbox"] == [[0.0, -0.25], [2.0, 0.25]]
+
+
+if __name__ == "__main__":
+    import pp
+
+    catalog = update_catalog(pp.CONFIG["gdslib"])
+    print(len(catalog), catalog.names("mmi"))
@@ -1,20 +1,294 @@
 import hashlib
+import pathlib
+import threading
 import uuid
+import weakref
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import partial, wraps
 from inspect import signature
-from typing import Callable, Dict, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from phidl.device_layout import Device
 
 from pp.component import Component
-from pp.config import MAX_NAME_LENGTH
+from pp import profiler
+from pp.config import CONFIG, MAX_NAME_LENGTH, conf
+from pp.disk_cache import DiskCache, get_key
+from pp.lazy_component import load_lazy_component
 from pp.name import get_component_name
 
-CACHE: Dict[str, Component] = {}
+CacheInfo = namedtuple(
+    "CacheInfo",
+    ["hits", "misses", "evictions", "max_entries", "max_bytes", "size", "nbytes"],
+)
+
+
+def _get_nbytes(component: Component) -> int:
+    """Returns the approximate memory of the polygons owned by a component.
+    References are not counted as their cells are cached on their own.
+    """
+    nbytes = 0
+    if component.is_lazy:
+        return nbytes
+    for polygonset in component.polygons:
+        for polygon in polygonset.polygons:
+            nbytes += getattr(polygon, "nbytes", 0)
+    return nbytes
+
+
+class CellCache:
+    """Least recently used (LRU) cache of Components keyed by cell name.
 
+    Evicts the least recently used cells when there are more than
+    `max_entries` cells or their polygons take more than `max_bytes`.
+    Cells that are still referenced by a live parent Component are never evicted,
+    as rebuilding them would create a second cell with the same name.
 
-def clear_cache():
+    Args:
+        max_entries: maximum number of cells (None for unbounded)
+        max_bytes: maximum polygon memory in bytes (None for unbounded)
+
+    All methods are thread safe.
+    """
+
+    def __init__(
+        self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cells: "OrderedDict[str, Component]" = OrderedDict()
+        self._nbytes: Dict[str, int] = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._cells
+
+    def __getitem__(self, name: str) -> Component:
+        with self._lock:
+            component = self._cells[name]
+            self._cells.move_to_end(name)
+            return component
+
+    def __setitem__(self, name: str, component: Component) -> None:
+        nbytes = _get_nbytes(component)
+        with self._lock:
+            if name in self._cells:
+                self.pop(name)
+            self._cells[name] = component
+            self._nbytes[name] = nbytes
+            self.nbytes += nbytes
+            self.evict()
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._cells)
+
+    def get(
+        self, name: str, default: Optional[Component] = None, count: bool = True
+    ) -> Optional[Component]:
+        """Returns a cell and records a cache hit or miss (if count).
+        Cells renamed after being cached are stale and get dropped.
+        """
+        with self._lock:
+            if name in self._cells and self._cells[name].name != name:
+                self.pop(name)
+            if name in self._cells:
+                self.hits += count
+                return self[name]
+            self.misses += count
+            return default
+
+    def keys(self):
+        return self._cells.keys()
+
+    def values(self):
+        return self._cells.values()
+
+    def items(self):
+        return self._cells.items()
+
+    def pop(self, name: str, *args) -> Optional[Component]:
+        with self._lock:
+            if name not in self._cells:
+                if args:
+                    return args[0]
+                raise KeyError(name)
+            self.nbytes -= self._nbytes.pop(name)
+            return self._cells.pop(name)
+
+    def clear(self) -> None:
+        """Removes all cells and resets the counters."""
+        with self._lock:
+            self._cells.clear()
+            self._nbytes.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def is_full(self) -> bool:
+        return (self.max_entries is not None and len(self) > self.max_entries) or (
+            self.max_bytes is not None and self.nbytes > self.max_bytes
+        )
+
+    def has_live_parents(self, name: str) -> bool:
+        return len(self._cells[name]._parents) > 0
+
+    def evict(self) -> None:
+        """Removes least recently used cells until the cache fits its budget."""
+        with self._lock:
+            if not self.is_full():
+                return
+            for name in list(self._cells):
+                if not self.is_full():
+                    break
+                if self.has_live_parents(name):
+                    continue
+                self.pop(name)
+                self.evictions += 1
+
+    def invalidate(self, component: Component) -> None:
+        """Removes a component and any cached cells that reference it,
+        directly or through cells that are not cached."""
+        with self._lock:
+            cells = [component]
+            seen = {id(component)}
+            while cells:
+                cell = cells.pop()
+                if self._cells.get(cell.name) is cell:
+                    self.pop(cell.name)
+                for parent in list(getattr(cell, "_parents", ())):
+                    if id(parent) not in seen:
+                        seen.add(id(parent))
+                        cells.append(parent)
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            max_entries=self.max_entries,
+            max_bytes=self.max_bytes,
+            size=len(self),
+            nbytes=self.nbytes,
+        )
+
+
+MAX_NAMES = 100000  # bound for the memo of cell names of each function
+
+
+def _freeze(value: Any) -> Any:
+    """Returns a hashable canonical form of a cell setting.
+
+    Keeps the type of scalars, so `1`, `1.0` and `True` do not collide,
+    and only the name of Devices, which is what goes into the cell name.
+    Raises TypeError for values that can not be hashed.
+    """
+    value_type = type(value)
+    if value_type in (int, float, str, bool, type(None)):
+        return value_type, value
+    if value_type is dict:
+        return dict, tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if value_type in (list, tuple):
+        return value_type, tuple(_freeze(v) for v in value)
+    if isinstance(value, Device):
+        return value_type, value.name
+    hash(value)
+    return value_type, value
+
+
+CACHE = CellCache(
+    max_entries=conf.cell_cache.max_entries, max_bytes=conf.cell_cache.max_bytes
+)
+
+
+def clear_cache() -> None:
     """Clears the cache of components."""
-    global CACHE
-    CACHE = {}
+    CACHE.clear()
+
+
+class _KeyLocks:
+    """Per-key locks, so only one thread builds a given cell at a time."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._locks: Dict[str, List[Any]] = {}
+
+    @contextmanager
+    def __call__(self, key: str):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.RLock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+_build_lock = _KeyLocks()
+
+
+def cache_info() -> CacheInfo:
+    """Returns cell cache hits, misses, evictions and size."""
+    return CACHE.cache_info()
+
+
+DISK_CACHE: Optional[DiskCache] = None
+
+
+def enable_disk_cache(
+    dirpath: Optional[pathlib.Path] = None,
+    max_bytes: Optional[int] = int(conf.cell_cache.disk_max_bytes),
+) -> DiskCache:
+    """Enables the persistent disk cache shared by all processes.
+
+    Cells missing from the memory cache are loaded from disk and
+    new cells are written to disk.
+
+    Args:
+        dirpath: cache directory (defaults to CONFIG["cell_cache_directory"])
+        max_bytes: disk budget, least recently used cells are deleted when exceeded
+    """
+    global DISK_CACHE
+    dirpath = dirpath or CONFIG["cell_cache_directory"]
+    DISK_CACHE = DiskCache(dirpath, max_bytes=max_bytes)
+    return DISK_CACHE
+
+
+def disable_disk_cache() -> None:
+    global DISK_CACHE
+    DISK_CACHE = None
+
+
+# component: disk cache key, or (func, name, kwargs) to compute it when needed
+_CELL_KEYS = weakref.WeakKeyDictionary()
+
+
+def get_cell_key(component: Component) -> Optional[str]:
+    """Returns the disk cache key (function source hash, name and settings)
+    of a component built by a cell function, None for other components."""
+    key = _CELL_KEYS.get(component)
+    if key is None or isinstance(key, str):
+        return key
+    func, name, kwargs = key
+    key = _CELL_KEYS[component] = get_key(func, name=name, **kwargs)
+    return key
+
+
+if conf.cell_cache.disk:
+    enable_disk_cache()
 
 
 def cell(
@@ -24,6 +298,7 @@ def cell(
     name: Optional[str] = None,
     uid: bool = False,
     cache: bool = True,
+    lazy: bool = False,
 ) -> Callable:
     """Cell Decorator.
 
@@ -32,6 +307,9 @@ def cell(
         name (str): Optional (ignored when autoname=True)
         uid (bool): adds a unique id to the name
         cache (bool): get component from the cache if it already exists
+        lazy (bool): returns a LazyComponent (ports, bbox and settings) if
+            there are `.json` and `.ports` sidecars in CONFIG["lazy_directory"]
+            and builds the geometry only when needed
 
     Implements a cache so that if a component has already been build
     it will return the component from the cache.
@@ -57,7 +335,37 @@ def cell(
     """
 
     if func is None:
-        return partial(cell, autoname=autoname, name=name, uid=uid, cache=cache,)
+        return partial(
+            cell, autoname=autoname, name=name, uid=uid, cache=cache, lazy=lazy
+        )
+
+    assert callable(
+        func
+    ), f"{func} is not Callable, make sure you only use the @cell decorator with functions"
+
+    # analyze the signature once, when decorating, instead of on every call
+    component_type = func.__name__
+    sig = signature(func)
+    parameters = frozenset(sig.parameters)
+    check_kwargs = "args" not in parameters and "kwargs" not in parameters
+    defaults = {
+        p.name: p.default for p in sig.parameters.values() if not callable(p.default)
+    }
+    names = {}
+
+    def _get_name(kwargs: Dict[str, Any]) -> str:
+        """Returns the cell name, memoized by the canonical tuple of kwargs."""
+        try:
+            key = _freeze(kwargs)
+            cell_name = names.get(key)
+        except TypeError:  # unhashable settings
+            return get_component_name(component_type, **kwargs)
+        if cell_name is None:
+            cell_name = get_component_name(component_type, **kwargs)
+            if len(names) >= MAX_NAMES:
+                names.clear()
+            names[key] = cell_name
+        return cell_name
 
     @wraps(func)
     def _cell(
@@ -65,80 +373,157 @@ def cell(
         name: Optional[str] = name,
         uid: bool = uid,
         cache: bool = cache,
+        lazy: bool = lazy,
         *args,
         **kwargs,
     ) -> Component:
-        args_repr = [repr(a) for a in args]
-        kwargs_repr = [f"{k}={v!r}" for k, v in kwargs.items()]
-        arguments = ", ".join(args_repr + kwargs_repr)
-
+        if profiler.PROFILER is None:
+            return _get_component(autoname, name, uid, cache, lazy, args, kwargs)
+        with profiler.PROFILER.record(component_type):
+            return _get_component(autoname, name, uid, cache, lazy, args, kwargs)
+
+    def _get_component(
+        autoname: bool,
+        name: Optional[str],
+        uid: bool,
+        cache: bool,
+        lazy: bool,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+    ) -> Component:
         if args:
+            args_repr = [repr(a) for a in args]
+            kwargs_repr = [f"{k}={v!r}" for k, v in kwargs.items()]
+            arguments = ", ".join(args_repr + kwargs_repr)
             raise ValueError(
                 f"cell supports only Keyword args for `{func.__name__}({arguments})`"
             )
 
-        component_type = func.__name__
-        name = name or get_component_name(component_type, **kwargs)
-
-        if uid:
-            name += f"_{str(uuid.uuid4())[:8]}"
-
-        kwargs.pop("ignore_from_name", [])
-        sig = signature(func)
-
-        # first_letters = [join_first_letters(k) for k in kwargs.keys() if k != "layer"]
-        # keys = set(kwargs.keys()) - set(["layer"])
-        # if not len(set(first_letters)) == len(first_letters):
-        #     print(
-        #         f"Warning! Possible Duplicated name in {component_type}. "
-        #         f"Args {keys} have repeated first letters {first_letters}"
-        #     )
-
-        if "args" not in sig.parameters and "kwargs" not in sig.parameters:
+        ignore_from_name = kwargs.pop("ignore_from_name", None)
+        if check_kwargs and not parameters.issuperset(kwargs):
             for key in kwargs.keys():
-                if key not in sig.parameters.keys():
+                if key not in parameters:
                     raise TypeError(
                         f"{component_type}() got an unexpected keyword argument `{key}`\n"
                         f"valid keyword arguments are {list(sig.parameters.keys())}"
                     )
 
-        if cache and autoname and name in CACHE:
-            return CACHE[name]
-        else:
-            assert callable(
-                func
-            ), f"{func} is not Callable, make sure you only use the @cell decorator with functions"
+        if not name:
+            name = _get_name(
+                kwargs
+                if ignore_from_name is None
+                else dict(kwargs, ignore_from_name=ignore_from_name)
+            )
+
+        if uid:
+            name += f"_{str(uuid.uuid4())[:8]}"
+
+        name_long = None
+        if len(name) > MAX_NAME_LENGTH:
+            name_long = name
+            name = f"{component_type}_{hashlib.md5(name.encode()).hexdigest()[:8]}"
+
+        if cache and autoname:
+            component = CACHE.get(name)
+            if component is not None:
+                return component
+
+            # single-flight: other threads wait for the first one to build it
+            with _build_lock(name):
+                component = CACHE.get(name, count=False)
+                if component is not None:
+                    return component
+                return _build(name, name_long, autoname, uid, lazy, kwargs)
+        return _build(name, name_long, autoname, uid, lazy, kwargs)
+
+    def _build(
+        name: str,
+        name_long: Optional[str],
+        autoname: bool,
+        uid: bool,
+        lazy: bool,
+        kwargs: Dict[str, Any],
+    ) -> Component:
+        disk_key = None
+        if DISK_CACHE is not None and autoname and not uid:
+            disk_key = get_key(func, name=name, **kwargs)
+            component = DISK_CACHE.load(disk_key, cells=CACHE)
+            if component is not None:
+                CACHE[component.name] = component
+                _CELL_KEYS[component] = disk_key
+                return component
+
+        component = None
+        if lazy and autoname and not uid:
+            disk_key = disk_key or get_key(func, name=name, **kwargs)
+            component = load_lazy_component(
+                CONFIG["lazy_directory"] / f"{name}.gds",
+                factory=partial(func, **kwargs),
+                key=disk_key,
+            )
+        if component is None:
             component = func(**kwargs)
             assert isinstance(
                 component, Component
             ), f"`{func.__name__}` function needs to return a Component, it returned `{component}` "
-            component.module = func.__module__
-            component.function_name = func.__name__
-
-            if len(name) > MAX_NAME_LENGTH:
-                component.name_long = name
-                name = f"{component_type}_{hashlib.md5(name.encode()).hexdigest()[:8]}"
-            if autoname:
-                component.name = name
-
-            if not hasattr(component, "settings"):
-                component.settings = {}
-            component.settings.update(
-                **{
-                    p.name: p.default
-                    for p in sig.parameters.values()
-                    if not callable(p.default)
-                }
-            )
-            component.settings.update(**kwargs)
-            component.settings_changed = kwargs.copy()
-
-            CACHE[name] = component
-            return component
+            if profiler.PROFILER is not None:
+                profiler.PROFILER.add_component(component)
+        component.module = func.__module__
+        component.function_name = func.__name__
+
+        if name_long:
+            component.name_long = name_long
+        if autoname:
+            component.name = name
+
+        if not hasattr(component, "settings"):
+            component.settings = {}
+        component.settings.update(**defaults)
+        component.settings.update(**kwargs)
+        component.settings_changed = kwargs.copy()
+
+        CACHE[name] = component
+        if autoname and not uid:
+            _CELL_KEYS[component] = disk_key or (func, name, kwargs)
+        if disk_key and DISK_CACHE is not None:
+            DISK_CACHE.save(disk_key, component)
+        return component
 
     return _cell
 
 
+cell.cache_info = cache_info
+cell.cache_clear = clear_cache
+
+
+def build_many(
+    factory: Callable[..., Component],
+    list_of_kwargs: Iterable[Dict[str, Any]],
+    max_workers: Optional[int] = None,
+) -> List[Component]:
+    """Builds one Component for each kwargs dict using a pool of threads.
+
+    Returns the Components in the same order as list_of_kwargs.
+    Cells shared between builds (same name) are built only once.
+
+    Args:
+        factory: function that returns a Component (usually decorated with @cell)
+        list_of_kwargs: list of keyword arguments for each Component
+        max_workers: number of threads (defaults to ThreadPoolExecutor default)
+
+    .. code::
+
+        import pp
+
+        components = pp.build_many(
+            pp.c.waveguide, [dict(length=length) for length in range(1, 10)]
+        )
+
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda kwargs: factory(**kwargs), list_of_kwargs))
+
+
 @cell(autoname=True)
 def wg(length=3, width=0.5):
     from pp.component import Component
@@ -211,6 +596,166 @@ def test_autoname():
     assert name_float == "_dummy_WW500n"
 
 
+def test_ignore_from_name():
+    c = _dummy(length=2, wg_width=0.6, ignore_from_name=["length"])
+    assert c.name == "_dummy_WW600n"
+    assert c.settings["length"] == 2
+    assert "ignore_from_name" not in c.settings
+    assert _dummy(length=2, ignore_from_name=["length"]).name == "_dummy_"
+
+
+@cell
+def _dummy_parent(length=3):
+    c = Component()
+    c << _dummy(length=length)
+    return c
+
+
+def test_cache_info():
+    clear_cache()
+    wg3(length=1)
+    wg3(length=1)
+    wg3(length=2)
+    info = cell.cache_info()
+    assert info.hits == 1
+    assert info.misses == 2
+    assert info.size == 2
+    assert info.nbytes > 0
+
+
+def test_cache_lru_eviction():
+    cache = CellCache(max_entries=2)
+    cache["a"] = Component("a")
+    cache["b"] = Component("b")
+    cache["a"]
+    cache["c"] = Component("c")
+    assert list(cache) == ["a", "c"]
+    assert cache.evictions == 1
+
+
+def test_cache_keeps_referenced_cells():
+    clear_cache()
+    CACHE.max_entries = 1
+    try:
+        parent = _dummy_parent(length=5)
+        child = _dummy(length=5)
+        assert "_dummy_L5" in CACHE
+        assert child is parent.references[0].parent
+    finally:
+        CACHE.max_entries = None
+
+
+def test_cache_invalidate():
+    clear_cache()
+    parent = _dummy_parent(length=7)
+    child = _dummy(length=7)
+    wg3(length=7)
+    CACHE.invalidate(child)
+    assert child.name not in CACHE
+    assert parent.name not in CACHE
+    assert "wg3_L7" in CACHE
+
+    child = _dummy(length=8)
+    middle = Component("uncached_middle")
+    middle.add_ref(child)
+    top = _dummy(length=9)
+    top.add_ref(middle)
+    CACHE.invalidate(child)
+    assert child.name not in CACHE
+    assert top.name not in CACHE
+
+
+def test_disk_cache(tmp_path):
+    clear_cache()
+    enable_disk_cache(tmp_path)
+    try:
+        c1 = _dummy_parent(length=11)
+        clear_cache()
+        c2 = _dummy_parent(length=11)
+        assert c2 is not c1
+        assert c2.name == c1.name
+        assert DISK_CACHE.hits == 1
+        assert _dummy(length=11) is c2.references[0].parent
+    finally:
+        disable_disk_cache()
+
+
+def test_long_names_are_cached():
+    clear_cache()
+    c1 = _dummy(length=1234567.891, wg_width=1234567.891)
+    c2 = _dummy(length=1234567.891, wg_width=1234567.891)
+    assert len(c1.name) <= MAX_NAME_LENGTH
+    assert c1.name_long.startswith("_dummy_L")
+    assert c1 is c2
+
+
+def test_freeze():
+    assert _freeze(dict(a=1)) != _freeze(dict(a=1.0)) != _freeze(dict(a=True))
+    assert _freeze(dict(a=1, b=[2, 3])) == _freeze(dict(b=[2, 3], a=1))
+    assert _freeze(dict(a=[1])) != _freeze(dict(a=(1,)))
+
+
+def test_lazy(tmp_path, monkeypatch):
+    import json
+
+    from pp.write_component import write_component
+
+    monkeypatch.setitem(CONFIG, "lazy_directory", tmp_path)
+    clear_cache()
+    c = _dummy_parent(length=13)
+    write_component(c, gdsdir=tmp_path)
+    clear_cache()
+
+    lazy = _dummy_parent(length=13, lazy=True)
+    assert lazy.is_lazy
+    assert lazy.name == c.name
+    assert lazy.settings["length"] == 13
+    assert list(lazy.ports) == list(c.ports)
+    assert _dummy_parent(length=13) is lazy
+    assert len(lazy.references) == 1
+    assert not lazy.is_lazy
+    assert _dummy(length=13) is lazy.references[0].parent
+
+    # sidecars of other settings or source are not used
+    clear_cache()
+    json_path = tmp_path / f"{c.name}.json"
+    data = json.loads(json_path.read_text())
+    assert data["cell_key"] == get_cell_key(lazy)
+    data["cell_key"] = "stale"
+    json_path.write_text(json.dumps(data))
+    assert not _dummy_parent(length=13, lazy=True).is_lazy
+
+
+_slow_calls = []
+
+
+@cell
+def _slow(length=3):
+    import time
+
+    _slow_calls.append(length)
+    time.sleep(0.05)
+    return _dummy(length=length)
+
+
+def test_single_flight():
+    clear_cache()
+    _slow_calls.clear()
+    components = build_many(_slow, [dict(length=5)] * 8, max_workers=8)
+    assert _slow_calls == [5]
+    assert all(c is components[0] for c in components)
+
+
+def test_build_many():
+    clear_cache()
+    _slow_calls.clear()
+    lengths = [1, 2, 3, 2, 1]
+    components = build_many(_slow, [dict(length=length) for length in lengths])
+    assert sorted(_slow_calls) == [1, 2, 3]
+    assert [c.settings["length"] for c in components] == lengths
+    assert components[0] is components[4]
+
+
 if __name__ == "__main__":
     import pp
 
@@ -3,8 +3,11 @@ and which cells with the same name are different
 This is not a diff tool
 """
 import hashlib
+import itertools
 import json
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 
@@ -18,12 +21,10 @@ def get_transform(cell_ref, precision=1e-4):
     """
     Get the transform from a cell-instance as a hashable object
     """
-    if cell_ref.rotation is None:
-        cell_ref.rotation = 0
     return (
         int(cell_ref.origin[0] / precision),
         int(cell_ref.origin[1] / precision),
-        int(cell_ref.rotation) % 360,
+        int(cell_ref.rotation or 0) % 360,
         cell_ref.x_reflection,
     )
 
@@ -60,7 +61,99 @@ def normalize_polygon_start_point(p, dbg=False):
     return np.roll(p, -i0, axis=0)
 
 
-def hash_cells(cell, dict_hashes=None, precision=1e-4, dbg_indent=0, dbg=False):
+"""
+# A random offset which fixes common rounding errors intrinsic
+# to floating point math. Example: with a precision of 0.1, the
+# floating points 7.049999 and 7.050001 round to different values
+# (7.0 and 7.1), but offset values (7.220485 and 7.220487) don't
+"""
+MAGIC_OFFSET = 0.17048614
+
+
+def hash_polygons(
+    points: np.ndarray, sizes: np.ndarray, precision: float = 1e-4
+) -> List[str]:
+    """Returns the sorted SHA1 of each polygon.
+
+    Same as hashing each polygon after `normalize_polygon_start_point`,
+    but the polygons are snapped and rotated to their start point
+    all at once.
+
+    Args:
+        points: (N, 2) points of all the polygons, one after the other
+        sizes: number of points of each polygon
+        precision: snapping grid
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    if len(sizes) == 0:
+        return []
+    ints = ((points / precision) + MAGIC_OFFSET).astype(np.int64)
+    offsets = np.zeros(len(sizes), dtype=np.int64)
+    np.cumsum(sizes[:-1], out=offsets[1:])
+    polygon_start = np.repeat(offsets, sizes)
+
+    # start point: min x, then min y, then first index
+    order = np.lexsort(
+        (ints[:, 1], ints[:, 0], np.repeat(np.arange(len(sizes)), sizes))
+    )
+    shift = np.repeat(order[offsets] - offsets, sizes)
+    local = np.arange(len(ints)) - polygon_start
+    index = polygon_start + (local + shift) % np.repeat(sizes, sizes)
+
+    data = memoryview(np.ascontiguousarray(ints[index]).tobytes())
+    row = 2 * ints.itemsize
+    return sorted(
+        [
+            hashlib.sha1(data[offset * row : (offset + size) * row]).hexdigest()
+            for offset, size in zip(offsets.tolist(), sizes.tolist())
+        ]
+    )
+
+
+def _hash_layers(
+    polygons_by_spec: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]],
+    precision: float,
+) -> bytes:
+    """Returns what the polygons of one cell add to the cell hash."""
+    data = []
+    for layer in sorted(polygons_by_spec.keys()):
+        points, sizes = polygons_by_spec[layer]
+        data.append(hashlib.sha1(str(layer).encode()).hexdigest())
+        data.extend(hash_polygons(points, sizes, precision=precision))
+    return "".join(data).encode()
+
+
+def _stack_polygons_by_spec(
+    cell,
+) -> Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]:
+    """Returns {(layer, datatype): (points, sizes)} for the polygons of cell."""
+    stacked = {}
+    for layer, polygons in get_polygons_by_spec(cell).items():
+        sizes = np.array([len(p) for p in polygons], dtype=np.int64)
+        stacked[layer] = (np.concatenate(polygons), sizes)
+    return stacked
+
+
+def _get_memo(cell, precision: float) -> Optional[bytes]:
+    """Returns the polygons hash stored in cell if its version has not changed.
+    The hash of the references is not stored, as references can be moved
+    without changing the version of cells that do not own them."""
+    memo = getattr(cell, "_geometry_hash", None)
+    if memo is not None:
+        cell._check_lists()
+    if memo is not None and memo[0] == cell._version and memo[1] == precision:
+        return memo[2]
+    return None
+
+
+def hash_cells(
+    cell,
+    dict_hashes=None,
+    precision=1e-4,
+    dbg_indent=0,
+    dbg=False,
+    max_workers: Optional[int] = None,
+):
     """
 
     Algorithm:
@@ -76,72 +169,84 @@ def hash_cells(cell, dict_hashes=None, precision=1e-4, dbg_indent=0, dbg=False):
         recursively hash the ref_cell + transform
         sort all the hashes for the hash to stay constant regardless of cell instance order
 
+    The polygons of the cells are hashed in a process pool of max_workers
+    (serially if max_workers is None). Components keep the hash of their
+    polygons until they change, so hashing them again only hashes the
+    transforms of their references.
+
     """
-    dict_hashes = dict_hashes or {}
+    dict_hashes = {} if dict_hashes is None else dict_hashes
     if cell.name in dict_hashes:
         return dict_hashes
 
-    polygons_by_spec = get_polygons_by_spec(cell)
-    layers = list(polygons_by_spec.keys())
-    layers.sort()
-
-    if dbg:
-        _print(layers)
-
-    """
-    # A random offset which fixes common rounding errors intrinsic
-    # to floating point math. Example: with a precision of 0.1, the
-    # floating points 7.049999 and 7.050001 round to different values
-    # (7.0 and 7.1), but offset values (7.220485 and 7.220487) don't
-    """
-    magic_offset = 0.17048614
-
-    final_hash = hashlib.sha1()
+    # unique cells, children before parents
+    cells = []
+    visited = set(dict_hashes)
+    stack = [(cell, False)]
+    while stack:
+        _cell, expanded = stack.pop()
+        if expanded:
+            cells.append(_cell)
+            continue
+        if _cell.name in visited:
+            continue
+        visited.add(_cell.name)
+        stack.append((_cell, True))
+        for cell_ref in reversed(_cell.references):
+            stack.append((cell_ref.ref_cell, False))
+
+    layer_hashes = {}
+    to_hash = []
+    for _cell in cells:
+        h = _get_memo(_cell, precision)
+        if h is None:
+            to_hash.append(_cell)
+        else:
+            layer_hashes[_cell.name] = h
+
+    polygons = [_stack_polygons_by_spec(_cell) for _cell in to_hash]
+    if max_workers and max_workers > 1 and len(to_hash) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            hashes = list(
+                executor.map(
+                    _hash_layers, polygons, itertools.repeat(precision), chunksize=8
+                )
+            )
+    else:
+        hashes = [_hash_layers(p, precision) for p in polygons]
+    for _cell, h in zip(to_hash, hashes):
+        layer_hashes[_cell.name] = h
+        if hasattr(_cell, "_geometry_hash"):
+            _cell._geometry_hash = (_cell._version, precision, h)
 
-    for layer in layers:
-        layer_hash = hashlib.sha1(str(layer).encode()).hexdigest()
-        polygons = polygons_by_spec[tuple(layer)]
+    for _cell in cells:
+        if dbg:
+            _print(" " * dbg_indent, _cell.name, sorted(get_polygons_by_spec(_cell)))
 
-        polygons = [((p / precision) + magic_offset).astype(np.int64) for p in polygons]
-        polygons = [normalize_polygon_start_point(p) for p in polygons]
-        polygon_hashes = np.sort([hashlib.sha1(p).hexdigest() for p in polygons])
+        final_hash = hashlib.sha1(layer_hashes[_cell.name])
 
-        if dbg:
-            _print(polygons)
-            _print(layer, layer_hash, polygon_hashes)
-
-        final_hash.update(layer_hash.encode())
-        for ph in polygon_hashes:
-            final_hash.update(ph.encode())
-
-    # Ref cell hashes
-    cell_ref_uids = []
-    for cell_ref in cell.references:
-        _cell = cell_ref.ref_cell
-        hash_cells(
-            _cell,
-            precision=precision,
-            dict_hashes=dict_hashes,
-            dbg_indent=dbg_indent + 2,
-            dbg=dbg,
+        # Sort hashes (for constant hash regardless of cell_ref ordering)
+        cell_ref_uids = sorted(
+            [
+                dict_hashes[cell_ref.ref_cell.name]
+                + "_"
+                + "x{}y{}R{}H{}".format(*get_transform(cell_ref, precision))
+                for cell_ref in _cell.references
+            ]
         )
-        cell_hash = dict_hashes[_cell.name]
-        tr_str = "x{}y{}R{}H{}".format(*get_transform(cell_ref, precision))
+        for _hash in cell_ref_uids:
+            final_hash.update(_hash.encode())
 
-        cell_ref_uid = cell_hash + "_" + tr_str
-        cell_ref_uids += [cell_ref_uid]
+        dict_hashes[_cell.name] = final_hash.hexdigest()
 
-    # Sort hashes (for constant hash regardless of cell_ref ordering)
-    cell_ref_uids = np.sort(cell_ref_uids)
-    for _hash in cell_ref_uids:
-        final_hash.update(_hash.encode())
-
-    dict_hashes[cell.name] = final_hash.hexdigest()
-    if dbg:
-        _print()
     return dict_hashes
 
 
+def hash_cell(cell, precision: float = 1e-4, max_workers: Optional[int] = None) -> str:
+    """Returns the geometry hash of cell (see hash_cells)."""
+    return hash_cells(cell, {}, precision=precision, max_workers=max_workers)[cell.name]
+
+
 def check_lib_consistency(lib_cells):
     """
     TODO: check that the library does not have a name collision (with different hashes)
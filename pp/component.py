@@ -1,9 +1,11 @@
 import copy as python_copy
 import itertools
 import uuid
+import weakref
 from pprint import pprint
 from typing import Any, Dict, List, Optional, Tuple, Union
 
+import gdspy
 import networkx as nx
 import numpy as np
 from numpy import cos, float64, int64, mod, ndarray, pi, sin
@@ -11,10 +13,36 @@ from omegaconf import OmegaConf
 from omegaconf.listconfig import ListConfig
 from phidl.device_layout import Device, DeviceReference, Label, _parse_layer
 
-from pp.compare_cells import hash_cells
+from pp.compare_cells import hash_cell
 from pp.config import conf
 from pp.get_netlist import get_netlist
-from pp.port import Port, select_ports
+from pp.netlist_hierarchical import get_netlist_hierarchical
+from pp.port import PORT_DTYPE, Port, Ports, select_ports
+
+
+_bb_valid = gdspy.Cell._bb_valid  # slot with the validity of the cached bbox
+
+
+def _transform_property(name: str) -> property:
+    """Returns a property for a gdspy.CellReference transform slot that
+    invalidates the Component owning the reference when it is set."""
+    slot = getattr(gdspy.CellReference, name)
+
+    def fset(self, value) -> None:
+        slot.__set__(self, value)
+        self._changed()
+
+    return property(slot.__get__, fset)
+
+
+_ELEMENT_TYPES = (
+    gdspy.PolygonSet,
+    gdspy.RobustPath,
+    gdspy.FlexPath,
+    gdspy.Label,
+    gdspy.CellReference,
+    gdspy.CellArray,
+)
 
 
 def copy(D):
@@ -130,7 +158,82 @@ def _rotate_points(
     return displacement * ca + perpendicular * sa + c0
 
 
+def _get_ports_key(ports: Dict[str, Port]) -> Tuple[Any, ...]:
+    return tuple(
+        (name, port, port.midpoint[0], port.midpoint[1], port.orientation, port.width)
+        for name, port in ports.items()
+    )
+
+
+def _get_ports_structured(key: Tuple[Any, ...]) -> Tuple[Tuple[str, ...], ndarray]:
+    """Returns names and structured array of ports from _get_ports_key."""
+    names = tuple(k[0] for k in key)
+    ports_array = np.zeros(len(names), dtype=PORT_DTYPE)
+    for i, (name, port, x, y, orientation, width) in enumerate(key):
+        ports_array[i] = (x, y, orientation, width)
+    return names, ports_array
+
+
+_mpone = np.array((-1.0, 1.0))
+
+
+def _transform_points(
+    points: ndarray,
+    origin: Optional[ndarray] = None,
+    rotation: Optional[float] = None,
+    magnification: Optional[float] = None,
+    x_reflection: bool = False,
+) -> ndarray:
+    """Returns (N, 2) points after a GDS reference transform,
+    with the same operations as gdspy.CellReference._transform_polygons"""
+    if x_reflection:
+        points = points * np.array((1, -1))
+    if magnification is not None:
+        points = points * np.array((magnification, magnification), dtype=float)
+    if rotation is not None:
+        ct = np.cos(rotation * np.pi / 180.0)
+        st = np.sin(rotation * np.pi / 180.0) * _mpone
+        points = points * ct + points[:, ::-1] * st
+    if origin is not None:
+        points = points + np.array(origin)
+    return points
+
+
+def _split(points: ndarray, sizes: ndarray) -> List[ndarray]:
+    """Returns a list of polygons (copies) from stacked points and sizes."""
+    return np.split(points.copy(), np.cumsum(sizes)[:-1])
+
+
+def _transform_ports(
+    ports_array: ndarray,
+    origin: Union[Tuple[float, float], ndarray, None],
+    rotation: Optional[float],
+    x_reflection: bool,
+) -> Tuple[ndarray, ndarray]:
+    """Returns midpoints (N, 2) and orientations (N,) of the ports in
+    ports_array (structured array) after a GDS transform (reflection, rotation,
+    translation) all at once."""
+    midpoints = np.column_stack([ports_array["x"], ports_array["y"]])
+    orientations = ports_array["orientation"]
+    if x_reflection:
+        midpoints[:, 1] = -midpoints[:, 1]
+        orientations = -orientations
+    if rotation is not None:
+        midpoints = _rotate_points(midpoints, angle=rotation, center=[0, 0])
+        orientations = orientations + rotation
+    if origin is not None:
+        midpoints = midpoints + np.array(origin)
+    return midpoints, mod(orientations, 360)
+
+
 class ComponentReference(DeviceReference):
+    # translate, move, rotate or setting the transform directly bumps the
+    # version of the owner, so the caches of its cell (and parents) are rebuilt
+    origin = _transform_property("origin")
+    rotation = _transform_property("rotation")
+    magnification = _transform_property("magnification")
+    x_reflection = _transform_property("x_reflection")
+
     def __init__(
         self,
         component,
@@ -140,20 +243,25 @@ class ComponentReference(DeviceReference):
         x_reflection: bool = False,
         visual_label: str = "",
     ) -> None:
-        super().__init__(
-            device=component,
+        # skip DeviceReference.__init__, as it copies all the ports
+        gdspy.CellReference.__init__(
+            self,
+            ref_cell=component,
             origin=origin,
             rotation=rotation,
             magnification=magnification,
             x_reflection=x_reflection,
+            ignore_missing=False,
         )
         self.parent = component
+        self.owner = None
         # The ports of a DeviceReference have their own unique id (uid),
         # since two DeviceReferences of the same parent Device can be
-        # in different locations and thus do not represent the same port
-        self._local_ports = {
-            name: port._copy(new_uid=True) for name, port in component.ports.items()
-        }
+        # in different locations and thus do not represent the same port.
+        # They are new Port objects at every access, built from the transformed
+        # midpoints and orientations cached in _ports_transformed
+        self._ports_transformed = None
+        self._ports_key = None
         self.visual_label = visual_label
         self.uid = str(uuid.uuid4())[:8]
 
@@ -241,28 +349,47 @@ class ComponentReference(DeviceReference):
     @property
     def ports(self) -> Dict[str, Port]:
         """This property allows you to access myref.ports, and receive a copy
-        of the ports dict which is correctly rotated and translated"""
-        for name, port in self.parent.ports.items():
-            port = self.parent.ports[name]
-            new_midpoint, new_orientation = self._transform_port(
-                port.midpoint,
-                port.orientation,
-                self.origin,
-                self.rotation,
-                self.x_reflection,
+        of the ports dict which is correctly rotated and translated.
+
+        All ports are transformed at once and the result is reused until the
+        reference transform or the ports of the parent change.
+        """
+        if isinstance(self.parent, Component):
+            names, ports_array = self.parent.get_ports_structured()
+        else:
+            names, ports_array = _get_ports_structured(
+                _get_ports_key(self.parent.ports)
+            )
+        key = (
+            ports_array,
+            tuple(np.asarray(self.origin).tolist()),
+            self.rotation,
+            self.x_reflection,
+        )
+        cached = self._ports_key
+        if cached is None or cached[0] is not ports_array or cached[1:] != key[1:]:
+            self._ports_transformed = _transform_ports(
+                ports_array, self.origin, self.rotation, self.x_reflection
+            )
+            self._ports_key = key
+
+        midpoints, orientations = self._ports_transformed
+        parent_ports = self.parent.ports
+        ports = {}
+        for i, name in enumerate(names):
+            port = parent_ports[name]
+            ports[name] = new_port = Port(
+                name=port.name,
+                midpoint=midpoints[i],
+                width=port.width,
+                orientation=orientations[i],
+                parent=self,
+                layer=getattr(port, "layer", (1, 0)),
+                port_type=getattr(port, "port_type", "optical"),
             )
-            if name not in self._local_ports:
-                self._local_ports[name] = port._copy(new_uid=True)
-            self._local_ports[name].midpoint = new_midpoint
-            self._local_ports[name].orientation = mod(new_orientation, 360)
-            self._local_ports[name].parent = self
-        # Remove any ports that no longer exist in the reference's parent
-        parent_names = self.parent.ports.keys()
-        local_names = list(self._local_ports.keys())
-        for name in local_names:
-            if name not in parent_names:
-                self._local_ports.pop(name)
-        return self._local_ports
+            if getattr(port, "info", None):
+                new_port.info = python_copy.deepcopy(port.info)
+        return ports
 
     @property
     def info(self) -> Dict[str, Union[float64, float]]:
@@ -270,7 +397,46 @@ class ComponentReference(DeviceReference):
 
     @property
     def size_info(self) -> SizeInfo:
-        return SizeInfo(self.bbox)
+        bbox = self.bbox
+        key = self.__dict__.get("_bbox_key")
+        if key is None:
+            return SizeInfo(bbox)
+        if self.__dict__.get("_size_info_key") != key:
+            self._size_info = SizeInfo(bbox)
+            self._size_info_key = key
+        return self._size_info
+
+    def _changed(self) -> None:
+        """Invalidates the bbox of the Component that owns the reference."""
+        owner = self.__dict__.get("owner")
+        # owners being copied (deepcopy sets the references first) have no caches
+        if owner is not None and "_version" in owner.__dict__:
+            owner._changed()
+
+    def get_bounding_box(self) -> Optional[ndarray]:
+        """Returns bounding box [[xmin, ymin], [xmax, ymax]] or None if empty.
+        For rotations multiple of 90 it transforms the cached bbox of the
+        referenced cell, and caches the result until the transform or the
+        cell change.
+        """
+        cell = self.ref_cell
+        key = (
+            id(cell),
+            getattr(cell, "_version", None),
+            tuple(np.asarray(self.origin).tolist()),
+            self.rotation,
+            self.magnification,
+            self.x_reflection,
+        )
+        if self.__dict__.get("_bbox_key") == key:
+            bbox = self._bbox
+        else:
+            bbox = super().get_bounding_box()
+            if key[1] is None:  # gdspy Cell, without version
+                return bbox
+            self._bbox_key = key
+            self._bbox = bbox
+        return None if bbox is None else np.array(bbox)
 
     def _transform_port(
         self,
@@ -371,7 +537,6 @@ class ComponentReference(DeviceReference):
         # This needs to be done in two steps otherwise floating point errors can accrue
         dxdy = np.array(d) - np.array(o)
         self.origin = np.array(self.origin) + dxdy
-        self._bb_valid = False
         return self
 
     def rotate(
@@ -393,7 +558,6 @@ class ComponentReference(DeviceReference):
         self.rotation += angle
         self.rotation = self.rotation % 360
         self.origin = _rotate_points(self.origin, angle, center)
-        self._bb_valid = False
         return self
 
     def reflect_h(self, port_name=None, x0=None):
@@ -447,8 +611,6 @@ class ComponentReference(DeviceReference):
         self.rotation += angle
         self.rotation = self.rotation % 360
         self.origin = self.origin + p1
-
-        self._bb_valid = False
         return self
 
     def connect(self, port: Union[str, Port], destination: Port, overlap: float = 0.0):
@@ -532,6 +694,15 @@ class Component(Device):
     def __init__(self, name: str = "Unnamed", *args, **kwargs,) -> None:
         # Allow name to be set like Component('arc') or Component(name = 'arc')
 
+        self._parents = weakref.WeakSet()  # cells that reference this one
+        self._version = 0  # increases every time the geometry changes
+        self._lists_key = None  # identity and length of the element lists
+        self._size_info = None
+        self._ports_structured = None
+        self._layers = None
+        self._polygons = None
+        self._geometry_hash = None
+        self._netlists = {}
         self.settings = kwargs
         self.settings_changed = kwargs
         self.__ports__ = {}
@@ -597,6 +768,15 @@ class Component(Device):
         """
         return get_netlist(component=self, full_settings=full_settings)
 
+    def get_netlist_hierarchical(self, full_settings=False):
+        """Returns the netlist graph of each unique cell in the hierarchy
+        dict(top, cells), see pp.netlist_hierarchical
+
+        Args:
+            full_settings: exports all the settings, when false only exports settings_changed
+        """
+        return get_netlist_hierarchical(component=self, full_settings=full_settings)
+
     def get_name_long(self):
         """ returns the long name if it's been truncated to MAX_NAME_LENGTH"""
         if self.name_long:
@@ -619,6 +799,28 @@ class Component(Device):
             select_ports(self.ports, port_type=port_type, prefix=prefix).values()
         )
 
+    @property
+    def ports(self) -> Ports:
+        return self._ports
+
+    @ports.setter
+    def ports(self, ports: Dict[str, Port]) -> None:
+        if "_ports" in self.__dict__:
+            Port._version += 1
+        self._ports = ports if isinstance(ports, Ports) else Ports(ports)
+
+    def get_ports_structured(self) -> Tuple[Tuple[str, ...], ndarray]:
+        """Returns port names and a structured array with fields
+        x, y, orientation and width (one row per port).
+        It is cached until a port is added, removed or changed
+        (see Port._version, in place edits of a midpoint array are not seen).
+        """
+        cached = self._ports_structured
+        if cached is None or cached[0] != Port._version:
+            names, ports_array = _get_ports_structured(_get_ports_key(self.ports))
+            cached = self._ports_structured = (Port._version, names, ports_array)
+        return cached[1], cached[2]
+
     def get_ports_array(self) -> Dict[str, ndarray]:
         """ returns ports as a dict of np arrays"""
         self.ports_on_grid()
@@ -831,10 +1033,14 @@ class Component(Device):
     #     h = dict2hash(**self.settings)
     #     return int(h, 16)
 
-    def hash_geometry(self) -> str:
-        """returns geometrical hash"""
+    def hash_geometry(self, max_workers: Optional[int] = None) -> str:
+        """returns geometrical hash (cached until the geometry changes)
+
+        Args:
+            max_workers: processes to hash the polygons of the cells
+        """
         if self.references or self.polygons:
-            h = hash_cells(self, {})[self.name]
+            h = hash_cell(self, max_workers=max_workers)
         else:
             h = "empty_geometry"
 
@@ -876,17 +1082,148 @@ class Component(Device):
                     if keep_layer:
                         new_labels += [label]
                 D.labels = new_labels
+            D._bb_valid = False
         return self
 
     def copy(self):
         return copy(self)
 
+    def remap_layers(
+        self, layermap: Optional[Dict[Any, Any]] = None, include_labels: bool = True
+    ):
+        """Moves all polygons from one layer to another according to the
+        layermap {layer_from: layer_to}."""
+        super().remap_layers(layermap=layermap or {}, include_labels=include_labels)
+        for D in list(self.get_dependencies(True)) + [self]:
+            D._bb_valid = False
+        return self
+
+    def flatten(self, single_layer: Optional[Tuple[int, int]] = None):
+        """Flattens the hierarchy, copying all polygons into this Component."""
+        super().flatten(single_layer=single_layer)
+        self._bb_valid = False
+        return self
+
+    is_lazy = False  # lazy components build their geometry only when needed
+
+    @property
+    def _bb_valid(self) -> bool:
+        return _bb_valid.__get__(self)
+
+    @_bb_valid.setter
+    def _bb_valid(self, valid: bool) -> None:
+        _bb_valid.__set__(self, valid)
+        if not valid:
+            self._changed()
+
+    def _changed(self) -> None:
+        """Bumps the version and invalidates the bbox of this Component
+        and all the cells that reference it (directly or not)."""
+        if not self._parents:
+            _bb_valid.__set__(self, False)
+            self._version += 1
+            return
+        cells = [self]
+        seen = {id(self)}
+        while cells:
+            cell = cells.pop()
+            _bb_valid.__set__(cell, False)
+            cell._version += 1
+            for parent in list(cell._parents):
+                if id(parent) not in seen:
+                    seen.add(id(parent))
+                    cells.append(parent)
+
+    def _check_lists(self) -> None:
+        """Calls _changed() if polygons, paths, references or labels were
+        edited directly (append, del, assignment) since the last check.
+
+        Only the identity and length of the lists are compared, so replacing
+        an element in place (`c.polygons[0] = p`) needs `c._changed()`.
+        """
+        key = (
+            id(self.polygons),
+            len(self.polygons),
+            id(self.paths),
+            len(self.paths),
+            id(self.references),
+            len(self.references),
+            id(self.labels),
+            len(self.labels),
+        )
+        if self._lists_key != key:
+            if self._lists_key is not None:
+                self._changed()
+            self._lists_key = key
+
+    def add(self, element):
+        """Adds a polygon, path, label, reference or a list of them.
+        References are owned by this Component, so moving them or changing
+        the geometry of their cell invalidates the bbox of this Component.
+        """
+        if not isinstance(element, _ELEMENT_TYPES):
+            element = list(element)
+        for e in element if isinstance(element, list) else [element]:
+            if isinstance(e, (gdspy.CellReference, gdspy.CellArray)):
+                if hasattr(e, "owner"):
+                    e.owner = self
+                parents = getattr(e.ref_cell, "_parents", None)
+                if parents is not None:
+                    parents.add(self)
+        return super().add(element)
+
+    def remove(self, items):
+        """Removes ports, polygons, references or labels.
+        Removed references no longer tie this Component to their cell.
+        """
+        items = list(items) if isinstance(items, (list, tuple, set)) else [items]
+        super().remove(items)
+        for item in items:
+            if not isinstance(item, (gdspy.CellReference, gdspy.CellArray)):
+                continue
+            if getattr(item, "owner", None) is self:
+                item.owner = None
+            cell = item.ref_cell
+            parents = getattr(cell, "_parents", None)
+            if parents is not None and all(
+                reference.ref_cell is not cell for reference in self.references
+            ):
+                parents.discard(self)
+        self._changed()
+        return self
+
+    def get_bounding_box(self) -> Optional[ndarray]:
+        """Returns bounding box [[xmin, ymin], [xmax, ymax]] or None if empty.
+        The bbox is cached until the Component or any of its references change
+        (see _check_lists for edits of the polygons and references lists).
+        """
+        self._check_lists()
+        if not self._bb_valid:
+            bboxes = [polygon.polygons for polygon in self.polygons]
+            bboxes += [path.to_polygonset().polygons for path in self.paths]
+            for reference in self.references:
+                bbox = reference.get_bounding_box()
+                if bbox is not None:
+                    bboxes.append([bbox])
+            points = [np.concatenate(polygons) for polygons in bboxes if polygons]
+            if points:
+                points = np.concatenate(points)
+                self._bounding_box = np.array([points.min(axis=0), points.max(axis=0)])
+            else:
+                self._bounding_box = None
+            self._bb_valid = True
+
+        if self._bounding_box is None:
+            return None
+        return np.array(self._bounding_box)
+
     @property
     def size_info(self) -> SizeInfo:
         """ size info of the component """
-        # if self.__size_info__ == None:
-        # self.__size_info__  = SizeInfo(self.bbox)
-        return SizeInfo(self.bbox)  # self.__size_info__
+        self._check_lists()
+        if self._size_info is None or self._size_info[0] != self._version:
+            self._size_info = (self._version, SizeInfo(self.bbox))
+        return self._size_info[1]
 
     def add_ref(self, D, alias: Optional[str] = None) -> ComponentReference:
         """Takes a Component and adds it as a ComponentReference to the current
@@ -915,16 +1252,92 @@ class Component(Device):
             pp.c.waveguide().get_layers() == {(1, 0), (111, 0)}
 
         """
-        layers = set()
-        for element in itertools.chain(self.polygons, self.paths):
-            for layer, datatype in zip(element.layers, element.datatypes):
-                layers.add((layer, datatype))
+        self._check_lists()
+        if self._layers is None or self._layers[0] != self._version:
+            layers = set()
+            for element in itertools.chain(self.polygons, self.paths):
+                for layer, datatype in zip(element.layers, element.datatypes):
+                    layers.add((layer, datatype))
+            for reference in self.references:
+                for layer, datatype in reference.ref_cell.get_layers():
+                    layers.add((layer, datatype))
+            for label in self.labels:
+                layers.add((label.layer, 0))
+            self._layers = (self._version, frozenset(layers))
+        return set(self._layers[1])
+
+    def get_polygons(
+        self, by_spec: Union[bool, Tuple[int, int]] = False, depth: Optional[int] = None
+    ):
+        """Returns a list of polygons, or a dict of lists of polygons
+        for each (layer, datatype) if by_spec is True.
+        If by_spec is a (layer, datatype) tuple returns only polygons in that layer.
+
+        The polygons by (layer, datatype) of each cell are flattened once and
+        cached until the cell changes. Each reference transforms all the
+        points of a layer in one operation.
+
+        Args:
+            by_spec: True, False or (layer, datatype)
+            depth: None for all levels, otherwise references below this level
+                are replaced by their bbox
+        """
+        if depth is not None or by_spec is False:
+            return super().get_polygons(by_spec=by_spec, depth=depth)
+        polygons = self._get_polygons_stacked()
+        if by_spec is True:
+            return {spec: _split(*polygons[spec]) for spec in polygons}
+        if by_spec in polygons:
+            return _split(*polygons[by_spec])
+        return []
+
+    def _get_polygons_stacked(self) -> Dict[Tuple[int, int], Tuple[ndarray, ndarray]]:
+        """Returns {(layer, datatype): (points, sizes)} with the points of all
+        polygons (flattened) stacked in a (N, 2) array and the number of points
+        of each polygon."""
+        self._check_lists()
+        if self._polygons is not None and self._polygons[0] == self._version:
+            return self._polygons[1]
+
+        chunks = {}
+        for polyset in self.polygons:
+            for points, layer, datatype in zip(
+                polyset.polygons, polyset.layers, polyset.datatypes
+            ):
+                points = np.asarray(points, dtype=float)
+                chunks.setdefault((layer, datatype), []).append((points, [len(points)]))
+        for path in self.paths:
+            for spec, path_polygons in path.get_polygons(True).items():
+                for points in path_polygons:
+                    chunks.setdefault(spec, []).append((points, [len(points)]))
         for reference in self.references:
-            for layer, datatype in reference.ref_cell.get_layers():
-                layers.add((layer, datatype))
-        for label in self.labels:
-            layers.add((label.layer, 0))
-        return layers
+            cell = reference.ref_cell
+            if isinstance(reference, gdspy.CellArray) or not isinstance(
+                cell, Component
+            ):
+                for spec, cell_polygons in reference.get_polygons(True).items():
+                    for points in cell_polygons:
+                        chunks.setdefault(spec, []).append((points, [len(points)]))
+                continue
+            for spec, (points, sizes) in cell._get_polygons_stacked().items():
+                points = _transform_points(
+                    points,
+                    origin=reference.origin,
+                    rotation=reference.rotation,
+                    magnification=reference.magnification,
+                    x_reflection=reference.x_reflection,
+                )
+                chunks.setdefault(spec, []).append((points, sizes))
+
+        polygons = {
+            spec: (
+                np.concatenate([points for points, sizes in spec_chunks]),
+                np.concatenate([sizes for points, sizes in spec_chunks]).astype(int),
+            )
+            for spec, spec_chunks in chunks.items()
+        }
+        self._polygons = (self._version, polygons)
+        return polygons
 
     def _repr_html_(self):
         """Print component, show geometry in matplotlib and in klayout
@@ -947,18 +1360,16 @@ class Component(Device):
         """
         from phidl import quickplot as qp
 
-        from pp.cell import clear_cache
+        from pp.cell import CACHE
 
         qp(self, **kwargs)
-        clear_cache()
+        CACHE.invalidate(self)
 
     def show(self) -> None:
         """Show component in klayout"""
-        from pp.cell import clear_cache
         from pp.write_component import show
 
         show(self)
-        clear_cache()
 
 
 def test_get_layers():
@@ -970,6 +1381,150 @@ def test_get_layers():
     assert c.get_layers() == {(1, 0)}
 
 
+def test_bbox_cache():
+    import pp
+
+    child = Component("bbox_child")
+    child.add_polygon([(0, 0), (1, 0), (1, 1)], layer=(1, 0))
+    parent = Component("bbox_parent")
+    ref = parent.add_ref(child)
+    assert parent.size_info is parent.size_info
+    assert np.allclose(parent.bbox, [[0, 0], [1, 1]])
+
+    child.add_polygon([(0, 0), (2, 0), (2, 1)], layer=(2, 0))
+    assert np.allclose(parent.bbox, [[0, 0], [2, 1]])
+    assert parent.size_info.width == 2
+
+    ref.movex(10)
+    assert np.allclose(parent.bbox, [[10, 0], [12, 1]])
+    ref.rotate(90)
+    assert np.allclose(parent.bbox, [[-1, 10], [0, 12]])
+
+    child.remove_layers([(2, 0)])
+    assert np.allclose(parent.bbox, [[-1, 10], [0, 11]])
+
+    top = Component("bbox_top")
+    top << pp.c.waveguide(length=5)
+    top << parent
+    version = top._version
+    child.add_polygon([(0, 0), (0, -3), (1, -3)], layer=(1, 0))
+    assert top._version > version
+    assert np.allclose(top.size_info.north, 11)
+
+    top.remove(top.references[1])
+    assert top not in parent._parents
+    assert np.allclose(top.bbox, [[0, -0.25], [5, 0.25]])
+
+    polygon = gdspy.Polygon([(0, 0), (0, 20), (1, 20)])
+    top.polygons.append(polygon)
+    assert top.size_info.north == 20
+    del top.polygons[-1]
+    assert np.allclose(top.bbox, [[0, -0.25], [5, 0.25]])
+    top.references = []
+    assert np.allclose(top.bbox, 0)
+
+
+def test_reference_ports():
+    import pp
+
+    c = pp.c.mmi2x2()
+    ref = ComponentReference(c)
+    ref.rotate(90)
+    ref.reflect()
+    ref.move((10, 5))
+
+    ports = ref.ports
+    assert ports["E0"].parent is ref
+    ports["E0"].midpoint = (100, 100)
+    ports["W0"].midpoint[0] = 100
+    ports = ref.ports
+    for name, port in c.ports.items():
+        midpoint, orientation = ref._transform_port(
+            port.midpoint, port.orientation, ref.origin, ref.rotation, ref.x_reflection
+        )
+        assert np.allclose(ports[name].midpoint, midpoint)
+        assert np.isclose(ports[name].orientation, orientation)
+
+    x = ports["E0"].x
+    ref.movex(1)
+    assert np.isclose(ref.ports["E0"].x, x + 1)
+
+
+def test_get_ports_structured():
+    c = Component("ports_structured")
+    c.add_port(name="W0", midpoint=(0, 0), orientation=180)
+    names, ports_array = c.get_ports_structured()
+    assert c.get_ports_structured()[1] is ports_array
+
+    c.ports["W0"].move((1, 2))
+    names, ports_array = c.get_ports_structured()
+    assert ports_array[["x", "y"]].tolist() == [(1, 2)]
+
+    c.ports["E0"] = c.ports.pop("W0")
+    assert c.get_ports_structured()[0] == ("E0",)
+
+
+def test_get_polygons_by_spec():
+    import pp
+
+    c = pp.Component("polygons_top")
+    mzi = c << pp.c.mzi()
+    mzi.rotate(90)
+    mzi.reflect()
+    c.add_array(pp.c.waveguide(), columns=2, rows=3)
+    polygons = c.get_polygons(by_spec=True)
+    polygons_gdspy = gdspy.Cell.get_polygons(c, by_spec=True)
+    assert polygons.keys() == polygons_gdspy.keys()
+    for spec, spec_polygons in polygons.items():
+        assert len(spec_polygons) == len(polygons_gdspy[spec])
+        for p1, p2 in zip(spec_polygons, polygons_gdspy[spec]):
+            assert np.array_equal(p1, p2)
+    assert len(c.get_polygons(by_spec=(1, 0))) == len(polygons[(1, 0)])
+
+    child = pp.Component("polygons_child")
+    child.add_polygon([(0, 0), (1, 0), (1, 1)], layer=(1, 0))
+    parent = pp.Component("polygons_parent")
+    parent << child
+    assert parent.get_layers() == {(1, 0)}
+    assert len(parent.get_polygons(by_spec=True)[(1, 0)]) == 1
+    child.add_polygon([(0, 0), (1, 0), (1, 1)], layer=(2, 0))
+    assert parent.get_layers() == {(1, 0), (2, 0)}
+    assert len(parent.get_polygons(by_spec=(2, 0))) == 1
+
+
+def test_get_polygons_list_edits():
+    c = Component("polygons_list_edits")
+    c.add_polygon([(0, 0), (1, 0), (1, 1)], layer=(1, 0))
+    assert len(c.get_polygons(by_spec=(1, 0))) == 1
+    assert c.get_layers() == {(1, 0)}
+
+    c.polygons.append(gdspy.Polygon([(0, 0), (2, 0), (2, 2)], layer=2))
+    assert len(c.get_polygons(by_spec=(2, 0))) == 1
+    assert c.get_layers() == {(1, 0), (2, 0)}
+    del c.polygons[0]
+    assert c.get_polygons(by_spec=(1, 0)) == []
+
+
+def test_get_polygons_reference_transforms():
+    child = Component("transforms_child")
+    child.add_polygon([(0, 0), (1, 0), (1, 1)], layer=(1, 0))
+    parent = Component("transforms_parent")
+    ref = parent << child
+    top = Component("transforms_top")
+    top << parent
+    assert np.allclose(top.get_polygons(by_spec=(1, 0))[0][:, 0].min(), 0)
+
+    ref.translate(3, 0)
+    assert np.allclose(parent.get_polygons(by_spec=(1, 0))[0][:, 0].min(), 3)
+    assert np.allclose(top.get_polygons(by_spec=(1, 0))[0][:, 0].min(), 3)
+    ref.origin = (5, 0)
+    assert np.allclose(top.bbox, [[5, 0], [6, 1]])
+    ref.rotation = 90
+    ref.x_reflection = True
+    polygons = gdspy.Cell.get_polygons(top, by_spec=True)[(1, 0)]
+    assert np.array_equal(top.get_polygons(by_spec=(1, 0))[0], polygons[0])
+
+
 def _filter_polys(polygons, layers_excl):
     return [
         p
@@ -1,15 +1,25 @@
 """Get Component from YAML file."""
 
-import io
+import copy as python_copy
+import hashlib
+import multiprocessing
 import pathlib
-from typing import IO, Any, Callable, Dict, List, Optional, Union
+import re
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import IO, Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import numpy as np
+import yaml
 from omegaconf import OmegaConf
 
+from pp import klive
 from pp.add_pins import _add_instance_label
+from pp.cell import CACHE
 from pp.component import Component, ComponentReference
 from pp.components import component_factory as component_factory_default
+from pp.disk_cache import canonicalize, component_from_dict, component_to_dict
 from pp.routing import link_factory, route_factory
 
 valid_placements = ["x", "y", "dx", "dy", "rotation", "mirror", "port"]
@@ -312,6 +322,484 @@ def make_connection(
     instance_src.connect(port=port_src_name, destination=port_dst)
 
 
+def get_route(
+    route_alias: str,
+    routes_dict: Dict[str, Any],
+    instances: Dict[str, ComponentReference],
+    route_factory: Dict[str, Callable] = route_factory,
+    link_factory: Dict[str, Callable] = link_factory,
+) -> Tuple[List[str], Union[List[Dict[str, Any]], Dict[str, Any]]]:
+    """Returns route names and routes (dict or list of dicts with references
+    and settings) of a YAML route definition."""
+    route_names = []
+    ports1 = []
+    ports2 = []
+    if not hasattr(routes_dict, "items"):
+        print(f"Unvalid syntax for {routes_dict}\n", sample_mmis)
+        raise ValueError(f"Unvalid syntax for {routes_dict}")
+    routes_dict = dict(routes_dict)
+    for key in routes_dict.keys():
+        if key not in valid_route_keys:
+            raise ValueError(
+                f"`{route_alias}` has a key=`{key}` not in valid {valid_route_keys}"
+            )
+
+    if "factory" not in routes_dict:
+        raise ValueError(
+            f"`{route_alias}` route needs `factory` : {list(route_factory.keys())}"
+        )
+    route_type = routes_dict.pop("factory")
+    assert isinstance(route_factory, dict), "route_factory needs to be a dict"
+    assert (
+        route_type in route_factory
+    ), f"factory `{route_type}` not in route_factory {list(route_factory.keys())}"
+    route_filter = route_factory[route_type]
+    route_settings = routes_dict.pop("settings", {})
+
+    link_function_name = routes_dict.pop("link_factory", "link_ports")
+    assert (
+        link_function_name in link_factory
+    ), f"function `{link_function_name}` not in link_factory {list(link_factory.keys())}"
+    link_function = link_factory[link_function_name]
+    link_settings = routes_dict.pop("link_settings", {})
+
+    if "links" not in routes_dict:
+        raise ValueError(f"You need to define links for the `{route_alias}` route")
+    links_dict = routes_dict["links"]
+
+    for port_src_string, port_dst_string in links_dict.items():
+        # print(port_src_string)
+
+        if ":" in port_src_string:
+            src, src0, src1 = [s.strip() for s in port_src_string.split(":")]
+            dst, dst0, dst1 = [s.strip() for s in port_dst_string.split(":")]
+            instance_src_name, port_src_name = [s.strip() for s in src.split(",")]
+            instance_dst_name, port_dst_name = [s.strip() for s in dst.split(",")]
+
+            src0 = int(src0)
+            src1 = int(src1)
+            dst0 = int(dst0)
+            dst1 = int(dst1)
+
+            if src1 > src0:
+                ports1names = [f"{port_src_name}{i}" for i in range(src0, src1 + 1, 1)]
+            else:
+                ports1names = [f"{port_src_name}{i}" for i in range(src0, src1 - 1, -1)]
+
+            if dst1 > dst0:
+                ports2names = [f"{port_dst_name}{i}" for i in range(dst0, dst1 + 1, 1)]
+            else:
+                ports2names = [f"{port_dst_name}{i}" for i in range(dst0, dst1 - 1, -1)]
+
+            # print(ports1names)
+            # print(ports2names)
+
+            assert len(ports1names) == len(ports2names)
+            route_names += [
+                f"{instance_src_name},{i}:{instance_dst_name},{j}"
+                for i, j in zip(ports1names, ports2names)
+            ]
+
+            instance_src = instances[instance_src_name]
+            instance_dst = instances[instance_dst_name]
+
+            for port_src_name in ports1names:
+                assert port_src_name in instance_src.ports, (
+                    f"{port_src_name} not in {list(instance_src.ports.keys())}"
+                    f"for {instance_src_name} "
+                )
+                ports1.append(instance_src.ports[port_src_name])
+
+            for port_dst_name in ports2names:
+                assert port_dst_name in instance_dst.ports, (
+                    f"{port_dst_name} not in {list(instance_dst.ports.keys())}"
+                    f"for {instance_dst_name}"
+                )
+                ports2.append(instance_dst.ports[port_dst_name])
+
+            # print(ports1)
+            # print(ports2)
+            # print(route_names)
+
+        else:
+            instance_src_name, port_src_name = port_src_string.split(",")
+            instance_dst_name, port_dst_name = port_dst_string.split(",")
+
+            instance_src_name = instance_src_name.strip()
+            instance_dst_name = instance_dst_name.strip()
+            port_src_name = port_src_name.strip()
+            port_dst_name = port_dst_name.strip()
+            assert (
+                instance_src_name in instances
+            ), f"{instance_src_name} not in {list(instances.keys())}"
+            assert (
+                instance_dst_name in instances
+            ), f"{instance_dst_name} not in {list(instances.keys())}"
+
+            instance_src = instances[instance_src_name]
+            instance_dst = instances[instance_dst_name]
+
+            assert port_src_name in instance_src.ports, (
+                f"{port_src_name} not in {list(instance_src.ports.keys())} for"
+                f" {instance_src_name} "
+            )
+            assert port_dst_name in instance_dst.ports, (
+                f"{port_dst_name} not in {list(instance_dst.ports.keys())} for"
+                f" {instance_dst_name}"
+            )
+
+            ports1.append(instance_src.ports[port_src_name])
+            ports2.append(instance_dst.ports[port_dst_name])
+            route_name = f"{port_src_string}:{port_dst_string}"
+            route_names.append(route_name)
+
+    if link_function_name in [
+        "link_electrical_waypoints",
+        "link_optical_waypoints",
+    ]:
+        route_dict_or_list = link_function(
+            route_filter=route_filter, **route_settings, **link_settings,
+        )
+
+    else:
+        route_dict_or_list = link_function(
+            ports1,
+            ports2,
+            route_filter=route_filter,
+            **route_settings,
+            **link_settings,
+        )
+    return route_names, route_dict_or_list
+
+
+def add_routes(
+    component: Component,
+    routes: Dict[str, Any],
+    route_names: List[str],
+    route_dict_or_list: Union[List[Dict[str, Any]], Dict[str, Any]],
+) -> None:
+    """Adds the references of routes to component and their settings to routes."""
+    # FIXME, make all routers to return lists
+    if isinstance(route_dict_or_list, list):
+        for route_name, route_dict in zip(route_names, route_dict_or_list):
+            component.add(route_dict["references"])
+            routes[route_name] = route_dict["settings"]
+    elif isinstance(route_dict_or_list, dict):
+        component.add(route_dict_or_list["references"])
+        routes[route_names[-1]] = route_dict_or_list["settings"]
+    else:
+        raise ValueError(f"{route_dict_or_list} needs to be dict or list")
+
+
+def get_route_instances(
+    routes_dict: Dict[str, Any], instance_names: Iterable[str]
+) -> Set[str]:
+    """Returns the instances linked by a YAML route definition
+    (`instance,port` or `instance,port:0:3` links)."""
+    links = routes_dict.get("links") if hasattr(routes_dict, "get") else None
+    if not hasattr(links, "items"):
+        return set()
+    names = set()
+    for port_src_string, port_dst_string in links.items():
+        for port_string in [port_src_string, port_dst_string]:
+            names.add(str(port_string).split(":")[0].split(",")[0].strip())
+    return names.intersection(instance_names)
+
+
+def get_placement_dependencies(
+    instance_names: Iterable[str],
+    placements_conf: Dict[str, Dict[str, Union[int, float, str]]],
+    connections_by_transformed_inst: Dict[str, Dict[str, str]],
+) -> Dict[str, Set[str]]:
+    """Returns the instances that need to be built to place each instance:
+    itself, the instances its x or y refer to and the instance it connects
+    to, and their dependencies."""
+    direct = {}
+    for instance_name in instance_names:
+        names = {instance_name}
+        placement_settings = placements_conf.get(instance_name) or {}
+        for key in ["x", "y"]:
+            value = placement_settings.get(key)
+            if isinstance(value, str):
+                names.add(value.split(",")[0])
+        if instance_name in connections_by_transformed_inst:
+            conn_info = connections_by_transformed_inst[instance_name]
+            names.add(conn_info["instance_dst_name"])
+        direct[instance_name] = names
+
+    dependencies = {}
+    for instance_name in direct:
+        names = set()
+        stack = [instance_name]
+        while stack:
+            name = stack.pop()
+            if name not in names:
+                names.add(name)
+                stack.extend(direct.get(name, ()))
+        dependencies[instance_name] = names
+    return dependencies
+
+
+class _YamlLoader(getattr(yaml, "CSafeLoader", yaml.SafeLoader)):
+    """Loads YAML like OmegaConf.load (floats such as `1e-3`, no timestamps,
+    no duplicated keys) with the C parser when available."""
+
+
+def _construct_mapping(loader: _YamlLoader, node: yaml.Node, deep: bool = False):
+    keys = set()
+    for key_node, _ in node.value:
+        key = loader.construct_object(key_node, deep=deep)
+        if key in keys:
+            raise yaml.constructor.ConstructorError(
+                "while constructing a mapping",
+                node.start_mark,
+                f"found duplicate key {key}",
+                key_node.start_mark,
+            )
+        keys.add(key)
+    return loader.construct_mapping(node, deep)
+
+
+_YamlLoader.add_implicit_resolver(
+    "tag:yaml.org,2002:float",
+    re.compile(
+        """^(?:
+     [-+]?(?:[0-9][0-9_]*)\\.[0-9_]*(?:[eE][-+]?[0-9]+)?
+    |[-+]?(?:[0-9][0-9_]*)(?:[eE][-+]?[0-9]+)
+    |\\.[0-9_]+(?:[eE][-+][0-9]+)?
+    |[-+]?[0-9][0-9_]*(?::[0-5]?[0-9])+\\.[0-9_]*
+    |[-+]?\\.(?:inf|Inf|INF)
+    |\\.(?:nan|NaN|NAN))$""",
+        re.X,
+    ),
+    list("-+0123456789."),
+)
+_YamlLoader.yaml_implicit_resolvers = {
+    key: [(tag, regexp) for tag, regexp in resolvers if not tag.endswith("timestamp")]
+    for key, resolvers in _YamlLoader.yaml_implicit_resolvers.items()
+}
+_YamlLoader.add_constructor(
+    yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, _construct_mapping
+)
+
+
+def _get_hash(value: Any) -> str:
+    return hashlib.sha1(repr(canonicalize(value)).encode()).hexdigest()
+
+
+class NetlistPlan:
+    """YAML netlist parsed, validated and analysed once (see compile_yaml).
+
+    Sections are plain Python containers, that builds never modify.
+    Keys tell which parts of a build can be reused after a YAML edit:
+
+    - build_keys: component and settings of each instance (same cell)
+    - instance_keys: build, placement and connection of each instance and of
+      the instances it is placed from (same cell at the same position)
+    - route_keys: route definition and instance_keys of the linked instances
+
+    Args:
+        data: YAML netlist as a dict
+        key: content hash of the YAML
+    """
+
+    def __init__(self, data: Dict[str, Any], key: str) -> None:
+        for section in data.keys():
+            assert section in valid_keys, f"{section} not in {list(valid_keys)}"
+        self.key = key
+        self.name = data.get("name", "Unnamed")
+        self.instances = data["instances"]
+        self.placements = data.get("placements") or {}
+        self.routes = data.get("routes") or {}
+        self.ports = data.get("ports")
+        self.connections_by_transformed_inst = transform_connections_dict(
+            data.get("connections")
+        )
+        self.placed = list(
+            dict.fromkeys(
+                list(self.placements) + list(self.connections_by_transformed_inst)
+            )
+        )
+        self.dependencies = get_placement_dependencies(
+            self.placed, self.placements, self.connections_by_transformed_inst
+        )
+        self.route_instances = {
+            route_alias: get_route_instances(self.routes[route_alias], self.instances)
+            for route_alias in self.routes
+        }
+        # what to check when an instance is built or placed
+        self.placement_waiters = {}
+        for instance_name, names in self.dependencies.items():
+            for name in names:
+                self.placement_waiters.setdefault(name, []).append(instance_name)
+        self.route_waiters = {}
+        for route_alias, names in self.route_instances.items():
+            for name in names:
+                self.route_waiters.setdefault(name, []).append(route_alias)
+
+        self.build_keys = {
+            instance_name: _get_hash(
+                [instance_conf["component"], instance_conf.get("settings")]
+            )
+            for instance_name, instance_conf in self.instances.items()
+        }
+        self.instance_keys = {}
+        for instance_name in self.instances:
+            names = self.dependencies.get(instance_name, {instance_name})
+            self.instance_keys[instance_name] = _get_hash(
+                [
+                    (
+                        name,
+                        self.build_keys.get(name),
+                        self.placements.get(name),
+                        self.connections_by_transformed_inst.get(name),
+                    )
+                    for name in sorted(names, key=str)
+                ]
+            )
+        self.route_keys = {
+            route_alias: _get_hash(
+                [
+                    self.routes[route_alias],
+                    [self.instance_keys[name] for name in sorted(instance_names)],
+                ]
+            )
+            for route_alias, instance_names in self.route_instances.items()
+        }
+
+
+PLANS: "OrderedDict[str, NetlistPlan]" = OrderedDict()
+MAX_PLANS = 128
+
+
+def compile_yaml(yaml_str: Union[str, pathlib.Path, IO[Any]]) -> NetlistPlan:
+    """Returns the NetlistPlan of a YAML netlist (file, IO or string with
+    newlines). Plans are cached by content hash, so the YAML is parsed and
+    validated once.
+    """
+    if isinstance(yaml_str, str) and "\n" in yaml_str:
+        text = yaml_str
+    elif hasattr(yaml_str, "read"):
+        text = yaml_str.read()
+    else:
+        text = pathlib.Path(yaml_str).read_text()
+    if isinstance(text, bytes):
+        text = text.decode()
+
+    key = hashlib.sha1(text.encode()).hexdigest()
+    plan = PLANS.get(key)
+    if plan is not None:
+        PLANS.move_to_end(key)
+        return plan
+
+    data = yaml.load(text, Loader=_YamlLoader)
+    if "${" in text:  # interpolations
+        data = OmegaConf.to_container(OmegaConf.create(data), resolve=True)
+    plan = NetlistPlan(data, key)
+    PLANS[key] = plan
+    if len(PLANS) > MAX_PLANS:
+        PLANS.popitem(last=False)
+    return plan
+
+
+# what component_from_yaml built, to reuse it when the YAML changes
+_YAML_BUILDS: "weakref.WeakKeyDictionary[Component, Dict[str, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _copy_reference(ref: ComponentReference) -> ComponentReference:
+    if not isinstance(ref, ComponentReference):
+        return python_copy.copy(ref)
+    return ComponentReference(
+        ref.parent,
+        origin=ref.origin,
+        rotation=ref.rotation,
+        magnification=ref.magnification,
+        x_reflection=ref.x_reflection,
+    )
+
+
+def _copy_route(route_dict: Dict[str, Any]) -> Dict[str, Any]:
+    references = route_dict["references"]
+    if isinstance(references, list):
+        references = [_copy_reference(ref) for ref in references]
+    else:
+        references = _copy_reference(references)
+    return dict(route_dict, references=references)
+
+
+def copy_routes(
+    route_dict_or_list: Union[List[Dict[str, Any]], Dict[str, Any]]
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+    """Returns routes with new references (to add them to another Component)."""
+    if isinstance(route_dict_or_list, list):
+        return [_copy_route(route_dict) for route_dict in route_dict_or_list]
+    return _copy_route(route_dict_or_list)
+
+
+_BUILDS = None  # (factory, settings, instance names), inherited by the forked workers
+
+
+def _build_to_dict(index: int) -> Dict[str, Any]:
+    factory, settings, _ = _BUILDS[index]
+    return component_to_dict(factory(**settings))
+
+
+def _load_component(data: Dict[str, Any]) -> Component:
+    """Returns the Component built by a worker, reusing the cells
+    that are already in the cell cache."""
+    component = CACHE.get(data["top"], count=False)
+    if component is not None:
+        return component
+    component = component_from_dict(data, cells=CACHE)
+    if hasattr(component, "function_name"):
+        CACHE[component.name] = component
+    return component
+
+
+def build_instances(
+    builds: List[Tuple[Callable, Dict[str, Any], List[str]]],
+    on_built: Callable[[List[str], Component], None],
+    workers: Optional[int] = None,
+) -> None:
+    """Builds a Component for each (factory, settings, instance_names) and
+    calls on_built(instance_names, component) as soon as each one is built.
+
+    With more than one worker the builds run in a pool of forked processes
+    and the Components come back as component_to_dict data (like the disk
+    cache), so cells shared by several builds are loaded once into the cell
+    cache. Enable the disk cache (`pp.cell.enable_disk_cache`) to also share
+    the cells that the workers build between them.
+
+    Args:
+        builds: list of (factory, settings, instance_names)
+        on_built: called in this thread, in the order the builds finish
+        workers: number of processes (None or 1 builds in this process)
+    """
+    global _BUILDS
+    if not workers or workers < 2 or len(builds) < 2 or not klive.can_fork():
+        for factory, settings, instance_names in builds:
+            on_built(instance_names, factory(**settings))
+        return
+
+    _BUILDS = builds
+    try:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(
+            min(workers, len(builds)), mp_context=context
+        ) as executor:
+            futures = {
+                executor.submit(_build_to_dict, index): index
+                for index in range(len(builds))
+            }
+            for future in as_completed(futures):
+                component = _load_component(future.result())
+                on_built(builds[futures[future]][2], component)
+    finally:
+        _BUILDS = None
+
+
 sample_mmis = """
 name:
     mmis
@@ -352,10 +840,17 @@ def component_from_yaml(
     route_factory: Dict[str, Callable] = route_factory,
     link_factory: Dict[str, Callable] = link_factory,
     label_instance_function: Callable = _add_instance_label,
+    workers: Optional[int] = None,
+    previous: Optional[Component] = None,
     **kwargs,
 ) -> Component:
     """Returns a Component defined in YAML file or string.
 
+    The YAML is compiled once into a NetlistPlan (cached by content hash).
+    When previous (built by component_from_yaml from an earlier version of
+    the YAML) is given, only the instances, placements and routes affected
+    by the changes are built again, the others are copied from previous.
+
     Args:
         yaml: YAML IO describing Component file or string (with newlines)
             (instances, placements, routes, ports, connections, names)
@@ -363,6 +858,8 @@ def component_from_yaml(
         route_factory: for routes
         link_factory: for links
         label_instance_function: to label each instance
+        workers: processes to build the instances (None or 1 builds them in this process)
+        previous: Component to reuse instances, placements and routes from
         kwargs: cache, pins ... to pass to all factories
 
     Returns:
@@ -423,42 +920,57 @@ def component_from_yaml(
                     mmi_top,E0: mmi_bot,W0
 
     """
-    yaml_str = (
-        io.StringIO(yaml_str)
-        if isinstance(yaml_str, str) and "\n" in yaml_str
-        else yaml_str
-    )
     component_factory = component_factory or component_factory_default
+    plan = compile_yaml(yaml_str)
+    context = (
+        component_factory,
+        route_factory,
+        link_factory,
+        label_instance_function,
+        canonicalize(kwargs),
+    )
+    previous_build = _YAML_BUILDS.get(previous) if previous is not None else None
+    if previous_build is not None and not (
+        all(a is b for a, b in zip(previous_build["context"][:4], context[:4]))
+        and previous_build["context"][4] == context[4]
+    ):
+        previous_build = None
+    previous_instances = previous_build["instances"] if previous_build else {}
+    previous_routes = previous_build["routes"] if previous_build else {}
 
-    conf = OmegaConf.load(yaml_str)  # nicer loader than conf = yaml.safe_load(yaml_str)
-    for key in conf.keys():
-        assert key in valid_keys, f"{key} not in {list(valid_keys)}"
-
-    instances = {}
     routes = {}
-    name = conf.get("name", "Unnamed")
-    c = Component(name)
-    placements_conf = conf.get("placements")
-    routes_conf = conf.get("routes")
-    ports_conf = conf.get("ports")
-    connections_conf = conf.get("connections")
-    instances_dict = conf["instances"]
-
+    c = Component(plan.name)
+    placements_conf = plan.placements
+    routes_conf = plan.routes
+    ports_conf = plan.ports
+    instances_dict = plan.instances
+
+    # instances with the same component and settings are built once
+    builds = {}
+    reused_cells = {}
     for instance_name in instances_dict:
         instance_conf = instances_dict[instance_name]
         component_type = instance_conf["component"]
         assert (
             component_type in component_factory
         ), f"{component_type} not in {list(component_factory.keys())}"
-        component_settings = instance_conf["settings"] or {}
+        component_settings = python_copy.deepcopy(instance_conf.get("settings") or {})
         component_settings.update(**kwargs)
-        ci = component_factory[component_type](**component_settings)
-        ref = c << ci
-        instances[instance_name] = ref
-
-    placements_conf = dict() if placements_conf is None else placements_conf
+        key = plan.build_keys[instance_name]
+        if component_settings.get("uid"):
+            key += instance_name
+        previous_instance = previous_instances.get(instance_name)
+        if previous_instance and previous_instance[1] == key:
+            reused_cells.setdefault(key, (previous_instance[2], []))[1].append(
+                instance_name
+            )
+        elif key not in builds:
+            factory = component_factory[component_type]
+            builds[key] = (factory, component_settings, [instance_name])
+        else:
+            builds[key][2].append(instance_name)
 
-    connections_by_transformed_inst = transform_connections_dict(connections_conf)
+    connections_by_transformed_inst = plan.connections_by_transformed_inst
     components_to_place = set(placements_conf.keys())
     components_with_placement_conflicts = components_to_place.intersection(
         connections_by_transformed_inst.keys()
@@ -471,10 +983,82 @@ def component_from_yaml(
                 + "with both connection and placement. Please use one or the other.",
             )
 
-    all_remaining_insts = list(
-        set(placements_conf.keys()).union(set(connections_by_transformed_inst.keys()))
-    )
+    all_remaining_insts = list(plan.placed)
 
+    # placements and routes run (in this thread) as soon as the instances
+    # they depend on are built
+    instances = {}
+    route_results = {}
+
+    def make_route(route_alias: str) -> None:
+        previous_route = previous_routes.get(route_alias)
+        if previous_route and previous_route[0] == plan.route_keys[route_alias]:
+            route_results[route_alias] = (
+                previous_route[1],
+                copy_routes(previous_route[2]),
+            )
+        else:
+            route_results[route_alias] = get_route(
+                route_alias,
+                routes_conf[route_alias],
+                instances=instances,
+                route_factory=route_factory,
+                link_factory=link_factory,
+            )
+
+    def on_built(instance_names: List[str], component: Component) -> None:
+        for instance_name in instance_names:
+            previous_instance = previous_instances.get(instance_name)
+            if (
+                previous_instance
+                and previous_instance[0] == plan.instance_keys[instance_name]
+            ):
+                # same cell and position: reuse the transformation
+                instances[instance_name] = _copy_reference(previous_instance[3])
+                if instance_name in all_remaining_insts:
+                    all_remaining_insts.remove(instance_name)
+            else:
+                instances[instance_name] = ComponentReference(component)
+        remaining = set(all_remaining_insts)
+        for waiter in dict.fromkeys(
+            waiter
+            for instance_name in instance_names
+            for waiter in plan.placement_waiters.get(instance_name, ())
+        ):
+            if waiter in all_remaining_insts and plan.dependencies[waiter].issubset(
+                instances
+            ):
+                place(
+                    placements_conf=placements_conf,
+                    connections_by_transformed_inst=connections_by_transformed_inst,
+                    instances=instances,
+                    encountered_insts=list(),
+                    instance_name=waiter,
+                    all_remaining_insts=all_remaining_insts,
+                )
+        placed = remaining.difference(all_remaining_insts)
+        remaining.difference_update(placed)
+        for route_alias in dict.fromkeys(
+            route_alias
+            for instance_name in placed.union(instance_names)
+            for route_alias in plan.route_waiters.get(instance_name, ())
+        ):
+            route_instances = plan.route_instances[route_alias]
+            if (
+                route_alias not in route_results
+                and route_instances.issubset(instances)
+                and route_instances.isdisjoint(remaining)
+            ):
+                make_route(route_alias)
+
+    for component, instance_names in reused_cells.values():
+        on_built(instance_names, component)
+    build_instances(list(builds.values()), on_built=on_built, workers=workers)
+    instances = {
+        instance_name: instances[instance_name] for instance_name in instances_dict
+    }
+
+    # raises for placements that refer to missing instances
     while all_remaining_insts:
         place(
             placements_conf=placements_conf,
@@ -485,175 +1069,15 @@ def component_from_yaml(
         )
 
     for instance_name in instances_dict:
+        c.add(instances[instance_name])
         label_instance_function(
             component=c, instance_name=instance_name, reference=instances[instance_name]
         )
 
-    if routes_conf:
-        for route_alias in routes_conf:
-            route_names = []
-            ports1 = []
-            ports2 = []
-            routes_dict = routes_conf[route_alias]
-            if not hasattr(routes_dict, "__items__"):
-                print(f"Unvalid syntax for {routes_dict}\n", sample_mmis)
-                raise ValueError(f"Unvalid syntax for {routes_dict}")
-            for key in routes_dict.keys():
-                if key not in valid_route_keys:
-                    raise ValueError(
-                        f"`{route_alias}` has a key=`{key}` not in valid {valid_route_keys}"
-                    )
-
-            if "factory" not in routes_dict:
-                raise ValueError(
-                    f"`{route_alias}` route needs `factory` : {list(route_factory.keys())}"
-                )
-            route_type = routes_dict.pop("factory")
-            assert isinstance(route_factory, dict), "route_factory needs to be a dict"
-            assert (
-                route_type in route_factory
-            ), f"factory `{route_type}` not in route_factory {list(route_factory.keys())}"
-            route_filter = route_factory[route_type]
-            route_settings = routes_dict.pop("settings", {})
-
-            link_function_name = routes_dict.pop("link_factory", "link_ports")
-            assert (
-                link_function_name in link_factory
-            ), f"function `{link_function_name}` not in link_factory {list(link_factory.keys())}"
-            link_function = link_factory[link_function_name]
-            link_settings = routes_dict.pop("link_settings", {})
-
-            if "links" not in routes_dict:
-                raise ValueError(
-                    f"You need to define links for the `{route_alias}` route"
-                )
-            links_dict = routes_dict["links"]
-
-            for port_src_string, port_dst_string in links_dict.items():
-                # print(port_src_string)
-
-                if ":" in port_src_string:
-                    src, src0, src1 = [s.strip() for s in port_src_string.split(":")]
-                    dst, dst0, dst1 = [s.strip() for s in port_dst_string.split(":")]
-                    instance_src_name, port_src_name = [
-                        s.strip() for s in src.split(",")
-                    ]
-                    instance_dst_name, port_dst_name = [
-                        s.strip() for s in dst.split(",")
-                    ]
-
-                    src0 = int(src0)
-                    src1 = int(src1)
-                    dst0 = int(dst0)
-                    dst1 = int(dst1)
-
-                    if src1 > src0:
-                        ports1names = [
-                            f"{port_src_name}{i}" for i in range(src0, src1 + 1, 1)
-                        ]
-                    else:
-                        ports1names = [
-                            f"{port_src_name}{i}" for i in range(src0, src1 - 1, -1)
-                        ]
-
-                    if dst1 > dst0:
-                        ports2names = [
-                            f"{port_dst_name}{i}" for i in range(dst0, dst1 + 1, 1)
-                        ]
-                    else:
-                        ports2names = [
-                            f"{port_dst_name}{i}" for i in range(dst0, dst1 - 1, -1)
-                        ]
-
-                    # print(ports1names)
-                    # print(ports2names)
-
-                    assert len(ports1names) == len(ports2names)
-                    route_names += [
-                        f"{instance_src_name},{i}:{instance_dst_name},{j}"
-                        for i, j in zip(ports1names, ports2names)
-                    ]
-
-                    instance_src = instances[instance_src_name]
-                    instance_dst = instances[instance_dst_name]
-
-                    for port_src_name in ports1names:
-                        assert port_src_name in instance_src.ports, (
-                            f"{port_src_name} not in {list(instance_src.ports.keys())}"
-                            f"for {instance_src_name} "
-                        )
-                        ports1.append(instance_src.ports[port_src_name])
-
-                    for port_dst_name in ports2names:
-                        assert port_dst_name in instance_dst.ports, (
-                            f"{port_dst_name} not in {list(instance_dst.ports.keys())}"
-                            f"for {instance_dst_name}"
-                        )
-                        ports2.append(instance_dst.ports[port_dst_name])
-
-                    # print(ports1)
-                    # print(ports2)
-                    # print(route_names)
-
-                else:
-                    instance_src_name, port_src_name = port_src_string.split(",")
-                    instance_dst_name, port_dst_name = port_dst_string.split(",")
-
-                    instance_src_name = instance_src_name.strip()
-                    instance_dst_name = instance_dst_name.strip()
-                    port_src_name = port_src_name.strip()
-                    port_dst_name = port_dst_name.strip()
-                    assert (
-                        instance_src_name in instances
-                    ), f"{instance_src_name} not in {list(instances.keys())}"
-                    assert (
-                        instance_dst_name in instances
-                    ), f"{instance_dst_name} not in {list(instances.keys())}"
-
-                    instance_src = instances[instance_src_name]
-                    instance_dst = instances[instance_dst_name]
-
-                    assert port_src_name in instance_src.ports, (
-                        f"{port_src_name} not in {list(instance_src.ports.keys())} for"
-                        f" {instance_src_name} "
-                    )
-                    assert port_dst_name in instance_dst.ports, (
-                        f"{port_dst_name} not in {list(instance_dst.ports.keys())} for"
-                        f" {instance_dst_name}"
-                    )
-
-                    ports1.append(instance_src.ports[port_src_name])
-                    ports2.append(instance_dst.ports[port_dst_name])
-                    route_name = f"{port_src_string}:{port_dst_string}"
-                    route_names.append(route_name)
-
-            if link_function_name in [
-                "link_electrical_waypoints",
-                "link_optical_waypoints",
-            ]:
-                route_dict_or_list = link_function(
-                    route_filter=route_filter, **route_settings, **link_settings,
-                )
-
-            else:
-                route_dict_or_list = link_function(
-                    ports1,
-                    ports2,
-                    route_filter=route_filter,
-                    **route_settings,
-                    **link_settings,
-                )
-
-            # FIXME, make all routers to return lists
-            if isinstance(route_dict_or_list, list):
-                for route_name, route_dict in zip(route_names, route_dict_or_list):
-                    c.add(route_dict["references"])
-                    routes[route_name] = route_dict["settings"]
-            elif isinstance(route_dict_or_list, dict):
-                c.add(route_dict_or_list["references"])
-                routes[route_name] = route_dict_or_list["settings"]
-            else:
-                raise ValueError(f"{route_dict_or_list} needs to be dict or list")
+    for route_alias in routes_conf:
+        if route_alias not in route_results:
+            make_route(route_alias)
+        add_routes(c, routes, *route_results[route_alias])
 
     if ports_conf:
         assert hasattr(ports_conf, "items"), f"{ports_conf} needs to be a dict"
@@ -672,6 +1096,29 @@ def component_from_yaml(
             c.add_port(port_name, port=instance.ports[instance_port_name])
     c.routes = routes
     c.instances = instances
+
+    build_keys = {}
+    for key, (factory, settings, instance_names) in builds.items():
+        build_keys.update(dict.fromkeys(instance_names, key))
+    for key, (component, instance_names) in reused_cells.items():
+        build_keys.update(dict.fromkeys(instance_names, key))
+    _YAML_BUILDS[c] = dict(
+        plan=plan.key,
+        context=context,
+        instances={
+            instance_name: (
+                plan.instance_keys[instance_name],
+                build_keys[instance_name],
+                ref.parent,
+                _copy_reference(ref),
+            )
+            for instance_name, ref in instances.items()
+        },
+        routes={
+            route_alias: (plan.route_keys[route_alias], *route_results[route_alias])
+            for route_alias in routes_conf
+        },
+    )
     return c
 
 
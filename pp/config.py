@@ -59,6 +59,22 @@ tech:
     grid_resolution: 1e-9
     bend_radius: 10.0
     cladding_offset: 0.0
+cell_cache:
+    max_entries:
+    max_bytes:
+    disk: false
+    disk_dirpath:
+    disk_max_bytes: 5e9
+    disk_salt:
+    lazy_dirpath:
+cell_profile: false
+sidecar_format: csv
+catalog: false
+import_cache:
+    enabled: false
+    max_entries:
+    max_bytes: 1e9
+    hash_content: false
 """
     )
 )
@@ -111,9 +127,19 @@ CONFIG["gdslib"] = conf.gdslib or repo_path / "gdslib"
 CONFIG["sp"] = CONFIG["gdslib"] / "sp"
 CONFIG["gds"] = CONFIG["gdslib"] / "gds"
 CONFIG["gdslib_test"] = dirpath_test
+CONFIG["cell_cache_directory"] = (
+    pathlib.Path(conf.cell_cache.disk_dirpath)
+    if conf.cell_cache.disk_dirpath
+    else home_path / "cell_cache"
+)
 
 CONFIG["build_directory"] = build_directory
 CONFIG["gds_directory"] = build_directory / "devices"
+CONFIG["lazy_directory"] = (
+    pathlib.Path(conf.cell_cache.lazy_dirpath)
+    if conf.cell_cache.lazy_dirpath
+    else CONFIG["gds_directory"]
+)
 CONFIG["cache_doe_directory"] = build_directory / "cache_doe"
 CONFIG["doe_directory"] = build_directory / "doe"
 CONFIG["mask_directory"] = build_directory / "mask"
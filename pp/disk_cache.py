@@ -0,0 +1,502 @@
+"""Persistent, content-addressed on-disk cache of Components.
+
+Lets different processes (generate_does workers, `pf` invocations ...)
+share the cells they build. Each entry is keyed by:
+
+- the qualified name of the cell function
+- a hash of the cell function source (or bytecode)
+- the canonicalized keyword arguments
+- the pp version and `conf.cell_cache.disk_salt`
+
+Only the source of the cell function itself is hashed, not the code it calls
+(other cells, routing or helper functions), so editing those keeps the old
+entries valid. Change `disk_salt` in your config (or `clear()` the cache)
+when you edit code the cells depend on.
+
+Entries are pickled dicts of numpy arrays (geometry, references, ports, labels,
+settings and info) written atomically (temporary file + rename),
+so many processes can share one cache directory.
+
+"""
+
+import hashlib
+import inspect
+import marshal
+import os
+import pathlib
+import pickle
+import tempfile
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import gdspy
+import numpy as np
+from phidl.device_layout import CellArray
+
+from pp.component import Component, ComponentReference, _clean_value
+from pp.config import __version__, conf
+
+FORMAT_VERSION = 1
+
+
+@lru_cache(maxsize=None)
+def get_source_hash(func: Callable) -> str:
+    """Returns a hash of the function source code (or bytecode if there is no source).
+
+    Functions called by func are not included.
+    """
+    try:
+        source = inspect.getsource(func).encode()
+    except (OSError, TypeError):
+        code = getattr(func, "__code__", None)
+        source = marshal.dumps(code) if code else repr(func).encode()
+    return hashlib.sha1(source).hexdigest()
+
+
+def canonicalize(value: Any) -> Any:
+    """Returns a hashable, process independent representation of a setting value."""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(canonicalize(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), canonicalize(v)) for k, v in value.items()))
+    if isinstance(value, Component):
+        return ("Component", value.name)
+    if hasattr(value, "func") and hasattr(value, "keywords"):  # functools.partial
+        return (
+            "partial",
+            canonicalize(value.func),
+            canonicalize(value.args),
+            canonicalize(value.keywords),
+        )
+    if callable(value):
+        return (
+            "function",
+            getattr(value, "__module__", None),
+            getattr(value, "__qualname__", repr(value)),
+        )
+    return repr(value)
+
+
+def get_key(func: Callable, name: str = "", **kwargs) -> str:
+    """Returns the disk cache key for a cell function called with kwargs.
+
+    Args:
+        func: cell function
+        name: cell name
+        kwargs: cell function keyword arguments
+    """
+    key = (
+        FORMAT_VERSION,
+        __version__,
+        conf.cell_cache.disk_salt,
+        f"{func.__module__}.{func.__qualname__}",
+        get_source_hash(func),
+        name,
+        canonicalize(kwargs),
+    )
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+_SIMPLE_TYPES = (bool, int, float, str, type(None), np.integer, np.floating)
+_RESERVED_ATTRIBUTES = set(vars(Component("_reserved"))).union(
+    {"name", "path", "polygons", "references", "labels", "paths"}
+)
+
+
+def _is_simple(value: Any) -> bool:
+    if isinstance(value, _SIMPLE_TYPES):
+        return True
+    if isinstance(value, np.ndarray):
+        return value.dtype != object
+    if isinstance(value, (list, tuple)):
+        return all(_is_simple(v) for v in value)
+    if isinstance(value, dict):
+        return all(_is_simple(v) for v in value.values())
+    return False
+
+
+def _clean(value: Any) -> Any:
+    """Returns value if it can be safely pickled, or its JSON serializable version."""
+    if _is_simple(value):
+        return value
+    if isinstance(value, dict):
+        return {k: _clean(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(v) for v in value]
+    return _clean_value(value)
+
+
+def _cell_to_dict(component: Component) -> Dict[str, Any]:
+    polygons = {}
+    for polygonset in component.polygons:
+        for points, layer, datatype in zip(
+            polygonset.polygons, polygonset.layers, polygonset.datatypes
+        ):
+            polygons.setdefault((layer, datatype), []).append(np.asarray(points))
+
+    references = []
+    for ref in component.references:
+        r = dict(
+            cell=ref.ref_cell.name,
+            origin=tuple(ref.origin),
+            rotation=ref.rotation,
+            magnification=ref.magnification,
+            x_reflection=ref.x_reflection,
+        )
+        if isinstance(ref, gdspy.CellArray):
+            r.update(columns=ref.columns, rows=ref.rows, spacing=tuple(ref.spacing))
+        references.append(r)
+
+    labels = [
+        dict(
+            text=label.text,
+            position=tuple(label.position),
+            anchor=label.anchor,
+            rotation=label.rotation,
+            magnification=label.magnification,
+            layer=label.layer,
+            texttype=label.texttype,
+        )
+        for label in component.labels
+    ]
+    ports = [
+        dict(
+            name=port.name,
+            midpoint=tuple(port.midpoint),
+            width=port.width,
+            orientation=port.orientation,
+            layer=tuple(port.layer),
+            port_type=port.port_type,
+        )
+        for port in component.ports.values()
+    ]
+    attributes = {
+        k: _clean(v)
+        for k, v in vars(component).items()
+        if k not in _RESERVED_ATTRIBUTES
+    }
+    for k in [
+        "settings",
+        "settings_changed",
+        "info",
+        "test_protocol",
+        "data_analysis_protocol",
+        "name_long",
+    ]:
+        attributes[k] = _clean(getattr(component, k, None))
+
+    return dict(
+        name=component.name,
+        polygons=polygons,
+        references=references,
+        labels=labels,
+        ports=ports,
+        attributes=attributes,
+    )
+
+
+def component_to_dict(component: Component) -> Dict[str, Any]:
+    """Returns a picklable dict with the component and all its dependencies.
+    Cells are sorted bottom-up, so each cell comes after the cells it references.
+    """
+    cells = []
+    visited = set()
+
+    def _visit(cell):
+        if cell.name in visited:
+            return
+        visited.add(cell.name)
+        for ref in cell.references:
+            _visit(ref.ref_cell)
+        cells.append(_cell_to_dict(cell))
+
+    _visit(component)
+    return dict(format_version=FORMAT_VERSION, top=component.name, cells=cells)
+
+
+def _cell_from_dict(data: Dict[str, Any], cells: Dict[str, Component]) -> Component:
+    c = Component(name=data["name"])
+    for (layer, datatype), polygons in data["polygons"].items():
+        c.add(gdspy.PolygonSet(polygons, layer=layer, datatype=datatype))
+
+    for r in data["references"]:
+        parent = cells[r["cell"]]
+        if "columns" in r:
+            ref = CellArray(
+                device=parent,
+                columns=r["columns"],
+                rows=r["rows"],
+                spacing=r["spacing"],
+                origin=r["origin"],
+                rotation=r["rotation"],
+                magnification=r["magnification"],
+                x_reflection=r["x_reflection"],
+            )
+        else:
+            ref = ComponentReference(
+                parent,
+                origin=r["origin"],
+                rotation=r["rotation"],
+                magnification=r["magnification"],
+                x_reflection=r["x_reflection"],
+            )
+        ref.owner = c
+        c.add(ref)
+
+    for label in data["labels"]:
+        c.add_label(
+            text=label["text"],
+            position=label["position"],
+            anchor=label["anchor"],
+            rotation=label["rotation"] or 0,
+            magnification=label["magnification"],
+            layer=(label["layer"], label["texttype"]),
+        )
+    for port in data["ports"]:
+        c.add_port(**port)
+
+    for k, v in data["attributes"].items():
+        setattr(c, k, v)
+    return c
+
+
+def component_from_dict(
+    data: Dict[str, Any], cells: Optional[Dict[str, Component]] = None
+) -> Component:
+    """Returns a Component from a dict created by component_to_dict.
+
+    Args:
+        data: dict with the cells
+        cells: name to Component dict. Used to reuse existing cells with the same
+            name (avoids duplicated cells) and updated with the new cells.
+    """
+    cells = {} if cells is None else cells
+    loaded = {}
+    for cell_data in data["cells"]:
+        name = cell_data["name"]
+        if name != data["top"] and name in cells:
+            loaded[name] = cells[name]
+            continue
+        loaded[name] = _cell_from_dict(cell_data, loaded)
+        if name != data["top"] and "function_name" in cell_data["attributes"]:
+            cells[name] = loaded[name]
+    return loaded[data["top"]]
+
+
+def _atomic_write(filepath: pathlib.Path, data: bytes) -> None:
+    """Writes data into a temporary file of the same directory and renames it,
+    so concurrent readers either see the full file or no file at all."""
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmppath = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmppath, filepath)
+    except BaseException:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+        raise
+
+
+class DiskCache:
+    """Content-addressed Component store shared across processes.
+
+    Args:
+        dirpath: cache directory
+        max_bytes: size cap. Least recently used entries are deleted when exceeded,
+            down to gc_ratio * max_bytes so that saves do not scan the directory
+            each time.
+    """
+
+    suffix = ".pkl"
+    gc_ratio = 0.8
+
+    def __init__(
+        self, dirpath: Union[str, pathlib.Path], max_bytes: Optional[int] = None
+    ) -> None:
+        self.dirpath = pathlib.Path(dirpath)
+        self.dirpath.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes: Optional[int] = None
+
+    def get_path(self, key: str) -> pathlib.Path:
+        return self.dirpath / key[:2] / f"{key}{self.suffix}"
+
+    def load(
+        self, key: str, cells: Optional[Dict[str, Component]] = None
+    ) -> Optional[Component]:
+        """Returns the Component stored under key or None."""
+        filepath = self.get_path(key)
+        try:
+            with open(filepath, "rb") as f:
+                data = pickle.load(f)
+            os.utime(filepath)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # corrupted or stale entry, rebuild it
+            self.remove(key)
+            self.misses += 1
+            return None
+
+        if data.get("format_version") != FORMAT_VERSION:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return component_from_dict(data, cells=cells)
+
+    def save(self, key: str, component: Component) -> Optional[pathlib.Path]:
+        """Stores a Component under key. Returns None if it can not be pickled."""
+        try:
+            data = pickle.dumps(
+                component_to_dict(component), protocol=pickle.HIGHEST_PROTOCOL
+            )
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return None
+        filepath = self.get_path(key)
+        if self.max_bytes is not None:
+            if self.nbytes is None:
+                self.nbytes = self.get_nbytes()
+            try:
+                self.nbytes -= filepath.stat().st_size
+            except FileNotFoundError:
+                pass
+        _atomic_write(filepath, data)
+        if self.max_bytes is not None:
+            # other processes sharing the directory are only counted by gc
+            self.nbytes += len(data)
+            if self.nbytes > self.max_bytes:
+                self.gc(int(self.max_bytes * self.gc_ratio))
+        return filepath
+
+    def remove(self, key: str) -> None:
+        try:
+            os.remove(self.get_path(key))
+        except FileNotFoundError:
+            pass
+
+    def get_entries(self) -> List[os.DirEntry]:
+        entries = []
+        for subdir in os.scandir(self.dirpath):
+            if subdir.is_dir():
+                entries += [
+                    e for e in os.scandir(subdir.path) if e.name.endswith(self.suffix)
+                ]
+        return entries
+
+    def get_nbytes(self) -> int:
+        return sum(e.stat().st_size for e in self.get_entries())
+
+    def gc(self, max_bytes: Optional[int] = None) -> int:
+        """Deletes least recently used entries until the cache is below max_bytes.
+        Returns the number of deleted entries.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        if max_bytes is None:
+            return 0
+        stats = []
+        for entry in self.get_entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            stats.append((stat.st_mtime, stat.st_size, entry.path))
+
+        nbytes = sum(size for _, size, _ in stats)
+        deleted = 0
+        for _, size, path in sorted(stats):
+            if nbytes <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+            nbytes -= size
+        self.nbytes = nbytes
+        return deleted
+
+    def clear(self) -> None:
+        for entry in self.get_entries():
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+        self.nbytes = 0
+
+
+def test_component_to_dict_roundtrip():
+    import pp
+    from pp.compare_cells import hash_cells
+
+    c1 = pp.c.mzi()
+    c2 = component_from_dict(pickle.loads(pickle.dumps(component_to_dict(c1))))
+    assert c2.name == c1.name
+    assert hash_cells(c2)[c2.name] == hash_cells(c1)[c1.name]
+    assert list(c2.ports.keys()) == list(c1.ports.keys())
+    assert c2.get_settings() == c1.get_settings()
+
+
+def test_disk_cache(tmp_path):
+    import pp
+
+    cache = DiskCache(tmp_path)
+    key = get_key(pp.c.waveguide.__wrapped__, length=3)
+    assert cache.load(key) is None
+    c1 = pp.c.waveguide(length=3)
+    cache.save(key, c1)
+    c2 = cache.load(key)
+    assert c2.name == c1.name
+    assert np.allclose(c2.ports["E0"].midpoint, c1.ports["E0"].midpoint)
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_disk_cache_gc(tmp_path):
+    import pp
+
+    cache = DiskCache(tmp_path)
+    for length in range(5):
+        cache.save(f"{length:040d}", pp.c.waveguide(length=length + 1))
+    assert len(cache.get_entries()) == 5
+    cache.gc(max_bytes=0)
+    assert len(cache.get_entries()) == 0
+
+
+def test_disk_cache_save_gc(tmp_path):
+    import pp
+
+    c = pp.c.waveguide(length=1)
+    size = len(pickle.dumps(component_to_dict(c), protocol=pickle.HIGHEST_PROTOCOL))
+    cache = DiskCache(tmp_path, max_bytes=int(3.5 * size))
+    for i in range(3):
+        cache.save(f"{i:040d}", c)
+    assert len(cache.get_entries()) == 3
+    assert cache.nbytes == cache.get_nbytes()
+    cache.save(f"{0:040d}", c)  # overwrite does not grow the cache
+    assert len(cache.get_entries()) == 3
+    cache.save(f"{3:040d}", c)
+    assert cache.get_nbytes() <= cache.gc_ratio * cache.max_bytes
+    assert cache.nbytes == cache.get_nbytes()
+
+
+def test_get_key():
+    import pp
+
+    func = pp.c.waveguide.__wrapped__
+    assert get_key(func, length=3) == get_key(func, length=3.0)
+    assert get_key(func, length=3) != get_key(func, length=4)
+    assert get_key(func, length=3, width=1) == get_key(func, width=1, length=3)
+
+
+if __name__ == "__main__":
+    test_component_to_dict_roundtrip()
@@ -0,0 +1,227 @@
+"""Port connectivity report for a Component and all the cells it references.
+
+`get_netlist` connects ports that share a position, raises for more than 2
+ports at one position and ignores the ports that are not connected.
+`check_connectivity` reports, for each unique cell with references:
+
+- dangling: ports of references connected to nothing (neither to another
+  reference nor to a port of the cell)
+- overlapping: more than 2 ports at the same position
+- width_mismatch: connected ports with different widths
+- orientation_mismatch: connected ports that do not face each other
+  (or a reference port with a different orientation than the cell port at
+  the same position). Only checked for `orientation_port_types`
+- port_type_mismatch: connected ports with different port_type
+- near_miss: a port connected to nothing closer than tolerance to other
+  ports (not on the same position)
+
+Positions are snapped to 1nm and near misses are found with a KD-tree over
+the unique positions, so each cell takes O(n log n) for n ports. A cell is
+checked once in its own coordinates whatever the number of instances.
+
+.. code::
+
+    import pp
+    from pp.drc.check_connectivity import check_connectivity
+
+    report = check_connectivity(pp.c.mzi())
+    assert not any(report.values())
+"""
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from pp.get_netlist import get_instance_name, get_labels_index, get_references_ports
+from pp.layers import LAYER
+from pp.netlist_hierarchical import get_cells
+
+ERRORS = [
+    "dangling",
+    "overlapping",
+    "width_mismatch",
+    "orientation_mismatch",
+    "port_type_mismatch",
+    "near_miss",
+]
+
+
+def get_cell_ports(
+    cell, layer_label: Tuple[int, int] = LAYER.LABEL_INSTANCE
+) -> Dict[str, Any]:
+    """Returns the ports of a cell and of its references, in cell coordinates.
+
+    Returns:
+        names: `port` for the cell ports, `instance,port` for references
+        own: bool array, True for the cell ports
+        xy: (N, 2) float array
+        orientation: N orientations in degrees (nan if the port has none)
+        width: N widths
+        port_type: list of N port types
+    """
+    names = list(cell.ports)
+    ports = list(cell.ports.values())
+    orientations = [port.orientation for port in ports]
+    widths = [port.width for port in ports]
+    port_types = [getattr(port, "port_type", None) for port in ports]
+    xy = [np.array([port.midpoint for port in ports], dtype=float).reshape(-1, 2)]
+    own = len(names)
+
+    references = list(cell.references)
+    labels_index = get_labels_index(cell, layer_label=layer_label)
+    instances = [
+        get_instance_name(cell, ref, layer_label=layer_label, labels_index=labels_index)
+        for ref in references
+    ]
+    ref_names, midpoints = get_references_ports(references)
+    xy.append(midpoints)
+    for i, port_name in ref_names:
+        ref = references[i]
+        port = ref.parent.ports[port_name]
+        orientation = port.orientation
+        if orientation is not None:
+            orientation = -orientation if ref.x_reflection else orientation
+            orientation += ref.rotation or 0
+        names.append(f"{instances[i]},{port_name}")
+        orientations.append(orientation)
+        widths.append(port.width)
+        port_types.append(getattr(port, "port_type", None))
+
+    return dict(
+        names=names,
+        own=np.arange(len(names)) < own,
+        xy=np.concatenate(xy),
+        orientation=np.array(orientations, dtype=float) % 360,
+        width=np.array(widths, dtype=float),
+        port_type=port_types,
+    )
+
+
+def _angle_difference(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.abs((a - b + 180) % 360 - 180)
+
+
+def check_cell_connectivity(
+    cell,
+    tolerance: float = 0.01,
+    width_tolerance: float = 1e-3,
+    angle_tolerance: float = 1e-2,
+    orientation_port_types: Tuple[str, ...] = ("optical",),
+    layer_label: Tuple[int, int] = LAYER.LABEL_INSTANCE,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Returns the connectivity errors of one level of hierarchy of a cell,
+    see check_connectivity."""
+    report = {error: [] for error in ERRORS}
+    if not cell.references:
+        return report
+
+    ports = get_cell_ports(cell, layer_label=layer_label)
+    names = ports["names"]
+    own = ports["own"]
+    xy_nm = np.round(ports["xy"] * 1e3).astype(np.int64)
+    positions, inverse, counts = np.unique(
+        xy_nm, axis=0, return_inverse=True, return_counts=True
+    )
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind="stable")
+    groups = np.split(order, np.cumsum(counts)[:-1])
+
+    def entry(indices, **kwargs):
+        indices = list(indices)
+        return dict(
+            cell=cell.name,
+            ports=[names[i] for i in indices],
+            xy=[tuple(ports["xy"][i].tolist()) for i in indices],
+            **kwargs,
+        )
+
+    for group in groups:
+        if len(group) == 1:
+            if not own[group[0]]:
+                report["dangling"].append(
+                    entry(group, port_type=ports["port_type"][group[0]])
+                )
+            continue
+        if len(group) > 2:
+            report["overlapping"].append(entry(group))
+            continue
+
+        i, j = group
+        widths = ports["width"][group]
+        if abs(widths[0] - widths[1]) > width_tolerance:
+            report["width_mismatch"].append(entry(group, width=widths.tolist()))
+        port_types = [ports["port_type"][i], ports["port_type"][j]]
+        if port_types[0] != port_types[1]:
+            report["port_type_mismatch"].append(entry(group, port_type=port_types))
+        elif port_types[0] in orientation_port_types:
+            orientations = ports["orientation"][group]
+            # exported ports face the same way, connected ports face each other
+            expected = 0 if own[i] or own[j] else 180
+            difference = _angle_difference(orientations[0], orientations[1])
+            if abs(difference - expected) > angle_tolerance:
+                report["orientation_mismatch"].append(
+                    entry(group, orientation=orientations.tolist())
+                )
+
+    if tolerance > 0 and len(positions) > 1:
+        tree = cKDTree(positions)
+        pairs = tree.query_pairs(r=tolerance * 1e3, output_type="ndarray")
+        # positions with connected pairs on both can be close (short waveguides)
+        pairs = pairs[(counts[pairs[:, 0]] == 1) | (counts[pairs[:, 1]] == 1)]
+        for a, b in pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]:
+            near = np.concatenate([groups[a], groups[b]])
+            distance = float(np.hypot(*(positions[a] - positions[b]))) * 1e-3
+            report["near_miss"].append(entry(near, distance=distance))
+    return report
+
+
+def check_connectivity(
+    component,
+    tolerance: float = 0.01,
+    width_tolerance: float = 1e-3,
+    angle_tolerance: float = 1e-2,
+    orientation_port_types: Tuple[str, ...] = ("optical",),
+    layer_label: Tuple[int, int] = LAYER.LABEL_INSTANCE,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Returns the port connectivity errors of component and the cells it
+    references (each unique cell once).
+
+    Args:
+        component: to check
+        tolerance: unconnected ports closer than this (um) to other ports
+            are reported as near_miss (0 skips the near miss search)
+        width_tolerance: max width difference (um) of connected ports
+        angle_tolerance: max orientation error (degrees) of connected ports
+        orientation_port_types: port_types that must face each other
+        layer_label: label to read instanceNames from (if any)
+
+    Returns:
+        {error: [dict(cell, ports, xy, ...)]} for each error in ERRORS.
+        Ports are named `port` for the ports of the cell and
+        `instance,port` for the ports of its references (as in get_netlist).
+    """
+    report = {error: [] for error in ERRORS}
+    for cell in get_cells(component):
+        cell_report = check_cell_connectivity(
+            cell,
+            tolerance=tolerance,
+            width_tolerance=width_tolerance,
+            angle_tolerance=angle_tolerance,
+            orientation_port_types=orientation_port_types,
+            layer_label=layer_label,
+        )
+        for error, entries in cell_report.items():
+            report[error].extend(entries)
+    return report
+
+
+if __name__ == "__main__":
+    import pp
+
+    c = pp.Component("check_connectivity")
+    wg1 = c << pp.c.waveguide()
+    wg2 = c << pp.c.waveguide(width=0.6)
+    wg2.connect("W0", wg1.ports["E0"])
+    wg2.movex(0.002)
+    for error, entries in check_connectivity(c).items():
+        print(error, entries)
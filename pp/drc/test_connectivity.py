@@ -0,0 +1,81 @@
+import numpy as np
+
+import pp
+from pp.drc.check_connectivity import check_connectivity, get_cell_ports
+from pp.test.test_netlist_benchmark import get_grid
+
+
+def get_errors(report):
+    return {error: len(entries) for error, entries in report.items() if entries}
+
+
+def test_connectivity_clean():
+    for component in [pp.c.mzi(), pp.c.mzi_lattice(), pp.c.ring_single_array()]:
+        assert get_errors(check_connectivity(component)) == {}
+
+
+def test_connectivity_errors():
+    c = pp.Component("connectivity_errors")
+    wg1 = c << pp.c.waveguide()
+    wg2 = c << pp.c.waveguide(width=0.6)
+    wg2.connect("W0", wg1.ports["E0"])
+    wg3 = c << pp.c.waveguide()
+    wg3.connect("W0", wg2.ports["E0"]).movex(0.002)
+    bend = c << pp.c.bend_circular()
+    bend.move(bend.ports["W0"].midpoint, wg1.ports["W0"].midpoint)
+    via = pp.Component("connectivity_via")
+    via.add_port("W0", width=0.5, orientation=180, port_type="dc")
+    via.add_port("E0", midpoint=(10, 0), width=0.5, orientation=0, port_type="dc")
+    via = c << via
+    via.connect("W0", wg3.ports["E0"])
+    c.add_port("W0", port=wg1.ports["W0"])
+
+    report = check_connectivity(c)
+    assert get_errors(report) == {
+        "dangling": 4,
+        "overlapping": 1,
+        "width_mismatch": 1,
+        "port_type_mismatch": 1,
+        "near_miss": 1,
+    }
+    assert report["width_mismatch"][0]["width"] == [0.5, 0.6]
+    assert len(report["overlapping"][0]["ports"]) == 3
+    (near_miss,) = report["near_miss"]
+    assert np.isclose(near_miss["distance"], 0.002)
+    assert {port.split(",")[1] for port in near_miss["ports"]} == {"E0", "W0"}
+
+    bend.rotate(90, center=bend.ports["W0"].midpoint)
+    report = check_connectivity(c)
+    assert len(report["orientation_mismatch"]) == 0  # 3 ports: overlapping only
+    assert check_connectivity(c, tolerance=0)["near_miss"] == []
+
+
+def test_connectivity_orientation():
+    c = pp.Component("connectivity_orientation")
+    wg1 = c << pp.c.waveguide()
+    wg2 = c << pp.c.waveguide()
+    wg2.move(wg2.ports["W0"].midpoint, wg1.ports["E0"].midpoint)
+    wg2.rotate(90, center=wg2.ports["W0"].midpoint)
+    report = check_connectivity(c)
+    assert len(report["orientation_mismatch"]) == 1
+    assert report["orientation_mismatch"][0]["orientation"] == [0.0, 270.0]
+
+
+def test_cell_ports_match_reference_ports():
+    c = pp.Component("connectivity_cell_ports")
+    mmi = pp.c.mmi1x2()
+    for i, (rotation, mirror) in enumerate([(0, False), (90, True), (270, False)]):
+        ref = c.add_ref(mmi).rotate(rotation).move((i * 20.0, 3.0))
+        if mirror:
+            ref.reflect()
+    ports = get_cell_ports(c)
+    expected = [port for ref in c.references for port in ref.ports.values()]
+    assert np.allclose(ports["xy"], [port.midpoint for port in expected])
+    assert np.allclose(
+        ports["orientation"], [port.orientation % 360 for port in expected]
+    )
+
+
+def test_connectivity_benchmark():
+    report = check_connectivity(get_grid(2000))
+    assert len(report["dangling"]) == 2 * 2000
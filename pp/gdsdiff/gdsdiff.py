@@ -58,6 +58,9 @@ def gdsdiff(cellA, cellB):
     old_only = Component(name="only_in_old")
     new_only = Component(name="only_in_new")
 
+    # rename copies, as cellA and cellB can be cached cells
+    cellA = cellA.copy()
+    cellB = cellB.copy()
     cellA.name = "old"
     cellB.name = "new"
     top << cellA
@@ -14,14 +14,42 @@
 
 """
 
-from typing import Dict, Tuple
+import copy
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from numpy import cos, pi, sin
 
 from pp.drc import snap_to_1nm_grid
 from pp.layers import LAYER
 
 
+def get_labels_index(
+    component, layer_label: Tuple[int, int] = LAYER.LABEL_INSTANCE
+) -> Dict[Tuple[float, float], str]:
+    """Returns {(x, y): text} of the labels in layer_label, snapped to 1nm.
+    The first label wins when several labels share a position.
+
+    Args:
+        component: with labels
+        layer_label: layer of the label (ignores layer_label[1]). Phidl ignores purpose of labels.
+    """
+    labels = [label for label in component.labels if label.layer == layer_label[0]]
+    if not labels:
+        return {}
+    xy = np.array([label.position for label in labels], dtype=float)
+    xy = snap_to_1nm_grid(xy).tolist()
+    index = {}
+    for (x, y), label in zip(xy, labels):
+        index.setdefault((x, y), label.text)
+    return index
+
+
 def get_instance_name(
-    component, reference, layer_label: Tuple[int, int] = LAYER.LABEL_INSTANCE
+    component,
+    reference,
+    layer_label: Tuple[int, int] = LAYER.LABEL_INSTANCE,
+    labels_index: Optional[Dict[Tuple[float, float], str]] = None,
 ) -> str:
     """Takes a component names the instance based on its XY location or a label in layer_label
     Loop over references and find the reference under and associate reference with instance label
@@ -32,11 +60,15 @@ def get_instance_name(
         component: with labels
         reference: reference that needs naming
         layer_label: layer of the label (ignores layer_label[1]). Phidl ignores purpose of labels.
+        labels_index: from get_labels_index(component, layer_label),
+            to name many references of the same component
     """
+    if labels_index is None:
+        labels_index = get_labels_index(component, layer_label=layer_label)
 
-    x = snap_to_1nm_grid(reference.x)
-    y = snap_to_1nm_grid(reference.y)
-    labels = component.labels
+    center = reference.center
+    x = snap_to_1nm_grid(float(center[0]))
+    y = snap_to_1nm_grid(float(center[1]))
 
     # default instance name follows componetName_x_y
     text = f"{reference.parent.name}_{x}_{y}"
@@ -44,14 +76,61 @@ def get_instance_name(
     # text = f"{reference.parent.name}_{reference.uid}"
 
     # try to get the instance name from a label
-    for label in labels:
-        xl = snap_to_1nm_grid(label.x)
-        yl = snap_to_1nm_grid(label.y)
-        if x == xl and y == yl and label.layer == layer_label[0]:
-            # print(label.text, xl, yl, x, y)
-            return label.text
+    return labels_index.get((x, y), text)
+
 
-    return text
+def get_references_ports(references) -> Tuple[List[Tuple[int, str]], np.ndarray]:
+    """Returns the (reference index, port name) and the (N, 2) midpoints of
+    the ports of all references, transformed as one array.
+
+    Uses the same operations as ComponentReference.ports, so the midpoints
+    match the ones of each reference.
+    """
+    names = []
+    points = []
+    origins = []
+    rotations = []
+    reflections = []
+    for i, reference in enumerate(references):
+        parent = reference.parent
+        if hasattr(parent, "get_ports_structured"):
+            port_names, ports_array = parent.get_ports_structured()
+            points.append(np.column_stack([ports_array["x"], ports_array["y"]]))
+            origin = reference.origin
+            rotation = reference.rotation
+            x_reflection = reference.x_reflection
+        else:
+            ports = reference.ports
+            port_names = list(ports)
+            points.append(np.array([p.midpoint for p in ports.values()], dtype=float))
+            origin, rotation, x_reflection = (0, 0), None, False
+        n = len(port_names)
+        names.extend((i, name) for name in port_names)
+        origins.append(np.broadcast_to(np.asarray(origin, dtype=float), (n, 2)))
+        rotations.append(np.full(n, 0 if rotation is None else rotation, dtype=float))
+        reflections.append(np.full(n, bool(x_reflection)))
+
+    if not names:
+        return names, np.zeros((0, 2))
+
+    points = np.concatenate([p.reshape(-1, 2) for p in points])
+    rotations = np.concatenate(rotations)
+    reflections = np.concatenate(reflections)
+    points[reflections, 1] = -points[reflections, 1]
+    for rotation in np.unique(rotations):
+        if rotation == 0:
+            continue
+        rows = rotations == rotation
+        displacement = points[rows]
+        if rotation == 180:
+            points[rows] = np.zeros(2) - displacement
+            continue
+        angle = rotation * pi / 180
+        ca = cos(angle)
+        sa = sin(angle)
+        sa = np.array((-sa, sa))
+        points[rows] = displacement * ca + displacement[:, ::-1] * sa + np.zeros(2)
+    return names, points + np.concatenate(origins)
 
 
 def get_netlist(
@@ -71,31 +150,42 @@ def get_netlist(
         port: Dict portName: CompoentName,port
         name: name of component
 
+    Labels are indexed by position and the ports of all references
+    are transformed and snapped as one array, so the netlist of N references
+    takes O(N) time.
     """
     placements = {}
     instances = {}
     connections = {}
     top_ports = {}
+    references = list(component.references)
+    labels_index = get_labels_index(component, layer_label=layer_label)
+    reference_names = []
+    settings_by_parent = {}
 
-    for reference in component.references:
+    for reference in references:
         c = reference.parent
         origin = snap_to_1nm_grid(reference.origin)
         x = snap_to_1nm_grid(origin[0])
         y = snap_to_1nm_grid(origin[1])
         reference_name = get_instance_name(
-            component, reference, layer_label=layer_label
+            component, reference, layer_label=layer_label, labels_index=labels_index
         )
+        reference_names.append(reference_name)
 
-        settings = c.get_settings(full_settings=full_settings)
+        if id(c) not in settings_by_parent:
+            settings = c.get_settings(full_settings=full_settings)
+            settings_by_parent[id(c)] = settings["settings"]
         instances[reference_name] = dict(
-            component=c.function_name, settings=settings["settings"],
+            component=c.function_name,
+            settings=copy.deepcopy(settings_by_parent[id(c)]),
         )
         placements[reference_name] = dict(
             x=x, y=y, rotation=int(reference.rotation), mirror=reference.x_reflection,
         )
 
     # store where ports are located
-    name2port = {}
+    name2xy = {}
 
     # Initialize a dict of port locations to Instance1Name,PortNames
     port_locations = {}
@@ -105,21 +195,16 @@ def get_netlist(
     top_ports_list = set()
     for port in ports:
         src = port.name
-        name2port[src] = port
+        name2xy[src] = snap_to_1nm_grid((port.x, port.y))
         top_ports_list.add(src)
 
-    # lower level ports
-    for reference in component.references:
-        for port in reference.ports.values():
-            reference_name = get_instance_name(
-                component, reference, layer_label=layer_label
-            )
-            src = f"{reference_name},{port.name}"
-            name2port[src] = port
+    # lower level ports, snapped all at once
+    names, midpoints = get_references_ports(references)
+    for (i, port_name), xy in zip(names, snap_to_1nm_grid(midpoints).tolist()):
+        name2xy[f"{reference_names[i]},{port_name}"] = tuple(xy)
 
     # build connectivity port_locations = Dict[Tuple(x,y), set of portNames]
-    for name, port in name2port.items():
-        xy = snap_to_1nm_grid((port.x, port.y))
+    for name, xy in name2xy.items():
         if xy not in port_locations:
             port_locations[xy] = set()
         port_locations[xy].add(name)
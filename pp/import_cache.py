@@ -0,0 +1,241 @@
+"""Cache of imported GDS files.
+
+With `cache=True` (or `enabled: true` in the `import_cache` config section)
+`import_gds` parses each file once per session and returns a copy-on-write
+clone of the cached Component tree: new Components, references, polygon sets
+and labels that share the (read only) polygon point arrays with the cache.
+Replace the point arrays of a clone (`points = points + dx`) instead of
+editing them in place, or import without the cache (the default).
+
+Files are keyed by path, size and modification time (or by a hash of their
+contents with `hash_content: true` in the `import_cache` config section),
+so an updated file is imported again.
+
+.. code::
+
+    import pp
+
+    c1 = pp.import_gds(gdspath, cache=True)  # parses the file
+    c2 = pp.import_gds(gdspath, cache=True)  # clones the cached tree
+    pp.clear_import_cache()
+
+"""
+import copy
+import hashlib
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import gdspy
+import numpy as np
+from phidl.device_layout import CellArray, DeviceReference
+
+from pp.component import Component
+from pp.config import conf
+
+
+def get_file_key(gdspath: pathlib.Path, hash_content: bool = False) -> Tuple[Any, ...]:
+    """Returns (path, size, mtime) or (path, size, sha1 of the contents)."""
+    gdspath = pathlib.Path(gdspath).resolve()
+    stat = os.stat(gdspath)
+    if hash_content:
+        return (str(gdspath), stat.st_size, hashlib.sha1(gdspath.read_bytes()).digest())
+    return (str(gdspath), stat.st_size, stat.st_mtime_ns)
+
+
+def _get_cells(component: Component) -> Dict[str, Component]:
+    """Returns {name: cell} for component and all the cells it references."""
+    cells = {}
+    stack = [component]
+    while stack:
+        cell = stack.pop()
+        if cell.name in cells:
+            continue
+        cells[cell.name] = cell
+        stack.extend(reference.ref_cell for reference in cell.references)
+    return cells
+
+
+def freeze(component: Component) -> int:
+    """Makes the polygon arrays of a Component tree read only.
+    Returns their memory in bytes."""
+    nbytes = 0
+    for cell in _get_cells(component).values():
+        for polygonset in cell.polygons:
+            for points in polygonset.polygons:
+                points.flags.writeable = False
+                nbytes += points.nbytes
+    return nbytes
+
+
+def _clone_polygonset(polygonset: gdspy.PolygonSet, parent: Component):
+    clone = polygonset.__class__.__new__(polygonset.__class__)
+    clone.polygons = list(polygonset.polygons)
+    clone.layers = list(polygonset.layers)
+    clone.datatypes = list(polygonset.datatypes)
+    clone.properties = dict(polygonset.properties)
+    if hasattr(polygonset, "parent"):
+        clone.parent = parent
+    return clone
+
+
+def _clone_reference(reference, ref_cell: Component):
+    settings = dict(
+        origin=np.array(reference.origin),
+        rotation=reference.rotation,
+        magnification=reference.magnification,
+        x_reflection=reference.x_reflection,
+    )
+    if isinstance(reference, gdspy.CellArray):
+        return CellArray(
+            device=ref_cell,
+            columns=reference.columns,
+            rows=reference.rows,
+            spacing=np.array(reference.spacing),
+            **settings,
+        )
+    return DeviceReference(device=ref_cell, **settings)
+
+
+def clone(component: Component) -> Component:
+    """Returns a copy of a Component tree that shares the polygon point
+    arrays (read only after freeze) with component.
+
+    Changing the clone (moving references, adding or removing polygons
+    and layers) does not change component, as gdspy and phidl
+    transformations create new point arrays.
+    """
+    clones = {}
+    stack = [(component, False)]
+    while stack:
+        cell, expanded = stack.pop()
+        if id(cell) in clones:
+            continue
+        if not expanded:
+            stack.append((cell, True))
+            stack.extend((reference.ref_cell, False) for reference in cell.references)
+            continue
+
+        new = Component(name=cell.name)
+        new.name = cell.name
+        new.settings = copy.deepcopy(cell.settings)
+        new.info = copy.deepcopy(cell.info)
+        new.polygons = [_clone_polygonset(p, new) for p in cell.polygons]
+        new.labels = copy.deepcopy(cell.labels)
+        new.add(
+            [
+                _clone_reference(reference, clones[id(reference.ref_cell)])
+                for reference in cell.references
+            ]
+        )
+        for port in cell.ports.values():
+            new.add_port(port=port)
+        new._bb_valid = False
+        clones[id(cell)] = new
+    return clones[id(component)]
+
+
+class ImportCache:
+    """Least recently used (LRU) cache of imported Component trees.
+
+    Args:
+        max_entries: maximum number of imports (None for unbounded)
+        max_bytes: maximum polygon memory in bytes (None for unbounded)
+        hash_content: keys files by a hash of their contents instead of mtime
+
+    All methods are thread safe.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        hash_content: bool = False,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hash_content = hash_content
+        self._components: "OrderedDict[Hashable, Component]" = OrderedDict()
+        self._nbytes: Dict[Hashable, int] = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._components)
+
+    def get_key(self, gdspath: pathlib.Path, **kwargs) -> Tuple[Any, ...]:
+        """Returns the key of a file imported with kwargs."""
+        return get_file_key(gdspath, hash_content=self.hash_content) + tuple(
+            sorted(kwargs.items())
+        )
+
+    def get(self, key: Hashable) -> Optional[Component]:
+        """Returns a clone of the cached import (None if not cached)."""
+        with self._lock:
+            component = self._components.get(key)
+            if component is None:
+                self.misses += 1
+                return None
+            self._components.move_to_end(key)
+            self.hits += 1
+        return clone(component)
+
+    def add(self, key: Hashable, component: Component) -> Component:
+        """Caches component (and makes its polygons read only).
+        Returns a clone of it."""
+        nbytes = freeze(component)
+        with self._lock:
+            self.pop(key)
+            self._components[key] = component
+            self._nbytes[key] = nbytes
+            self.nbytes += nbytes
+            self.evict()
+        return clone(component)
+
+    def pop(self, key: Hashable) -> Optional[Component]:
+        with self._lock:
+            if key not in self._components:
+                return None
+            self.nbytes -= self._nbytes.pop(key)
+            return self._components.pop(key)
+
+    def invalidate(self, gdspath: pathlib.Path) -> None:
+        """Removes all the cached imports of gdspath."""
+        path = str(pathlib.Path(gdspath).resolve())
+        with self._lock:
+            for key in [key for key in self._components if key[0] == path]:
+                self.pop(key)
+
+    def clear(self) -> None:
+        """Removes all the imports and resets the counters."""
+        with self._lock:
+            self._components.clear()
+            self._nbytes.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def evict(self) -> None:
+        """Removes least recently used imports until the cache fits its budget."""
+        with self._lock:
+            while self._components and (
+                (self.max_entries is not None and len(self) > self.max_entries)
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                self.pop(next(iter(self._components)))
+
+
+IMPORT_CACHE = ImportCache(
+    max_entries=conf.import_cache.max_entries,
+    max_bytes=int(conf.import_cache.max_bytes) if conf.import_cache.max_bytes else None,
+    hash_content=conf.import_cache.hash_content,
+)
+
+
+def clear_import_cache() -> None:
+    """Clears the cache of imported GDS files."""
+    IMPORT_CACHE.clear()
@@ -1,14 +1,19 @@
+import io
 import json
 from pathlib import Path
-from typing import Dict, Iterable, Optional, Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import gdspy
+import klayout.db as pya
 import numpy as np
-from phidl.device_layout import CellArray, DeviceReference
+from phidl.device_layout import CellArray, DeviceReference, Polygon
 
 import pp
 from pp.component import Component
-from pp.drc import snap_to_1nm_grid
+from pp.compression import get_format_suffix, open_compressed, read_layout
+from pp.config import conf
+from pp.drc import snap_to_1nm_grid, snap_to_grid
+from pp.import_cache import IMPORT_CACHE
 from pp.layers import port_layer2type as port_layer2type_default
 from pp.layers import port_type2layer as port_type2layer_default
 from pp.port import auto_rename_ports, read_port_markers
@@ -209,10 +214,25 @@ def add_ports_from_markers_center(
             i += 1
 
 
+def read_gds_library(gdspath: Union[str, Path]) -> gdspy.GdsLibrary:
+    """Returns a gdspy library from a GDS or an OASIS (`.oas`) file,
+    decompressing `.gz` and `.zst` files as a stream."""
+    gdsii_lib = gdspy.GdsLibrary()
+    if get_format_suffix(gdspath) == ".oas":
+        layout = read_layout(gdspath)
+        options = pya.SaveLayoutOptions()
+        options.format = "GDS2"
+        options.write_context_info = False
+        gdsii_lib.read_gds(io.BytesIO(layout.write_bytes(options)))
+    else:
+        with open_compressed(gdspath, "rb") as f:
+            gdsii_lib.read_gds(f)
+    return gdsii_lib
+
+
 def import_gds_cells(gdspath):
     """ returns top cells from GDS"""
-    gdsii_lib = gdspy.GdsLibrary()
-    gdsii_lib.read_gds(gdspath)
+    gdsii_lib = read_gds_library(gdspath)
     top_level_cells = gdsii_lib.top_level()
     return top_level_cells
 
@@ -222,20 +242,57 @@ def import_gds(
     cellname: None = None,
     flatten: bool = False,
     snap_to_grid_nm: Optional[int] = None,
+    engine: str = "gdspy",
+    cache: Optional[bool] = None,
 ) -> Component:
-    """Returns a Componenent from a GDS file.
+    """Returns a Componenent from a GDS (or OASIS `.oas`) file.
 
     Adapted from phidl/geometry.py
 
     Args:
-        gdspath: path of GDS file
+        gdspath: path of GDS or OASIS file
         cellname: cell of the name to import (None) imports top cell
         flatten: if True returns flattened (no hierarchy)
         snap_to_grid_nm: snap to different nm grid (does not snap if False)
+        engine: `gdspy` or `klayout` (faster for large files, only imports
+            the cells that cellname references, see import_gds_klayout)
+        cache: returns a copy of a previous import of the same file
+            (see pp.import_cache), defaults to conf.import_cache.enabled
 
     """
-    gdsii_lib = gdspy.GdsLibrary()
-    gdsii_lib.read_gds(gdspath)
+    if cache is None:
+        cache = conf.import_cache.enabled
+    kwargs = dict(
+        cellname=cellname,
+        flatten=flatten,
+        snap_to_grid_nm=snap_to_grid_nm,
+        engine=engine,
+    )
+    if not cache:
+        return _import_gds(gdspath, **kwargs)
+
+    key = IMPORT_CACHE.get_key(gdspath, **kwargs)
+    component = IMPORT_CACHE.get(key)
+    if component is None:
+        component = IMPORT_CACHE.add(key, _import_gds(gdspath, **kwargs))
+    return component
+
+
+def _import_gds(
+    gdspath: Union[str, Path],
+    cellname: Optional[str] = None,
+    flatten: bool = False,
+    snap_to_grid_nm: Optional[int] = None,
+    engine: str = "gdspy",
+) -> Component:
+    if engine == "klayout":
+        return import_gds_klayout(
+            gdspath, cellname=cellname, flatten=flatten, snap_to_grid_nm=snap_to_grid_nm
+        )
+    elif engine != "gdspy":
+        raise ValueError(f"engine = {engine!r} must be 'gdspy' or 'klayout'")
+
+    gdsii_lib = read_gds_library(gdspath)
     top_level_cells = gdsii_lib.top_level()
     cellnames = [c.name for c in top_level_cells]
 
@@ -304,7 +361,8 @@ def import_gds(
                     )
                     dr.owner = D
                     converted_references.append(dr)
-            D.references = converted_references
+            D.references = []
+            D.add(converted_references)
 
             # Next convert each Polygon
             # temp_polygons = list(D.polygons)
@@ -335,6 +393,177 @@ def import_gds(
         return D
 
 
+def _get_polygon_points(
+    shapes: pya.Shapes, dbu: float, snap_to_grid_nm: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (N, 2) points (um) of all the polygons, boxes and paths
+    of shapes, one polygon after the other, and the number of points
+    of each polygon."""
+    region = pya.Region(shapes)
+    sizes = np.array([p.num_points_hull() for p in region.each()], dtype=np.int64)
+    if len(sizes) == 0:
+        return np.zeros((0, 2)), sizes
+
+    text = region.to_s(len(sizes))
+    if "/" in text:  # polygons with holes
+        polygons = [polygon.resolved_holes() for polygon in region.each()]
+        sizes = np.array([p.num_points_hull() for p in polygons], dtype=np.int64)
+        text = ";".join(polygon.to_s() for polygon in polygons)
+    text = text.replace("(", "").replace(")", "").replace(";", ",")
+    points = np.fromstring(text, dtype=np.int64, sep=",").reshape(-1, 2) * dbu
+    if snap_to_grid_nm:
+        points = snap_to_grid(points, nm=snap_to_grid_nm)
+    return points, sizes
+
+
+def _new_polygon(
+    points: np.ndarray, sizes: np.ndarray, layer: Layer, parent: Component
+) -> Polygon:
+    """Returns a phidl Polygon with all the polygons of one layer."""
+    stops = np.cumsum(sizes).tolist()
+    starts = [0] + stops[:-1]
+    polygon = Polygon.__new__(Polygon)
+    polygon.polygons = [points[start:stop] for start, stop in zip(starts, stops)]
+    polygon.layers = [layer[0]] * len(sizes)
+    polygon.datatypes = [layer[1]] * len(sizes)
+    polygon.properties = {}
+    polygon.parent = parent
+    return polygon
+
+
+def _is_zero(value: float) -> bool:
+    return abs(value) < 1e-9
+
+
+def _get_references(
+    cell: pya.Cell, components: Dict[int, Component]
+) -> List[DeviceReference]:
+    """Returns references for the instances of cell."""
+    references = []
+    for instance in cell.each_inst():
+        device = components[instance.cell_index]
+        trans = instance.dcplx_trans
+        settings = dict(
+            rotation=trans.angle,
+            magnification=None if trans.mag == 1 else trans.mag,
+            x_reflection=trans.is_mirror(),
+        )
+        origin = np.array([trans.disp.x, trans.disp.y])
+        if not instance.is_regular_array():
+            references.append(DeviceReference(device=device, origin=origin, **settings))
+            continue
+
+        a, b = instance.da, instance.db
+        na, nb = instance.na, instance.nb
+        # CellArray spacing is in the frame of the cell, before mirror and rotation
+        local = pya.DCplxTrans(1, trans.angle, trans.is_mirror(), 0, 0).inverted()
+        la, lb = local * a, local * b
+        array = None
+        if _is_zero(la.y) and _is_zero(lb.x):
+            array = dict(columns=na, rows=nb, spacing=(la.x, lb.y))
+        elif _is_zero(la.x) and _is_zero(lb.y):
+            array = dict(columns=nb, rows=na, spacing=(lb.x, la.y))
+        if array and settings["magnification"] is None:
+            references.append(
+                CellArray(device=device, origin=origin, **array, **settings)
+            )
+            continue
+        for i in range(na):
+            for j in range(nb):
+                references.append(
+                    DeviceReference(
+                        device=device,
+                        origin=origin + [i * a.x + j * b.x, i * a.y + j * b.y],
+                        **settings,
+                    )
+                )
+    return references
+
+
+def import_gds_klayout(
+    gdspath: Union[str, Path],
+    cellname: Optional[str] = None,
+    flatten: bool = False,
+    snap_to_grid_nm: Optional[int] = None,
+) -> Component:
+    """Returns a Componenent from a GDS or OASIS file read with klayout.
+
+    Only builds the cells that the imported cell references.
+    The polygons of each cell and layer are read and snapped to grid
+    as one array of points, and added as a single Polygon per layer.
+    Klayout normalizes polygons, so the first point and winding of
+    polygons can change.
+
+    Args:
+        gdspath: path of GDS or OASIS file
+        cellname: cell of the name to import (None) imports top cell
+        flatten: if True returns flattened (no hierarchy)
+        snap_to_grid_nm: snap to different nm grid (does not snap if False)
+    """
+    layout = read_layout(gdspath)
+    top_level_cells = layout.top_cells()
+    cellnames = [c.name for c in top_level_cells]
+
+    if cellname is not None:
+        if not layout.has_cell(cellname):
+            raise ValueError(
+                f"cell {cellname} is not in file {gdspath} with cells {cellnames}"
+            )
+        topcell = layout.cell(cellname)
+    elif len(top_level_cells) == 1:
+        topcell = top_level_cells[0]
+    else:
+        raise ValueError(
+            f"import_gds() There are multiple top-level cells in {gdspath}, "
+            f"you must specify `cellname` to select of one of them among {cellnames}"
+        )
+
+    if flatten:
+        topcell.flatten(True)
+    dbu = layout.dbu
+    layers = {
+        index: (layout.get_info(index).layer, layout.get_info(index).datatype)
+        for index in layout.layer_indexes()
+    }
+    cell_indexes = set(topcell.called_cells()) | {topcell.cell_index()}
+
+    components = {}
+    for cell_index in layout.each_cell_bottom_up():
+        if cell_index not in cell_indexes:
+            continue
+        cell = layout.cell(cell_index)
+        D = Component() if flatten else Component(name=cell.name)
+        if not flatten:
+            D.name = cell.name
+
+        polygons = []
+        for layer_index, layer in layers.items():
+            shapes = cell.shapes(layer_index)
+            if shapes.is_empty():
+                continue
+            points, sizes = _get_polygon_points(shapes, dbu, snap_to_grid_nm)
+            if len(sizes):
+                polygons.append(_new_polygon(points, sizes, layer, D))
+
+            for shape in shapes.each(pya.Shapes.STexts):
+                text = shape.text
+                halign = 1 if text.halign < 0 else int(text.halign)
+                valign = 1 if text.valign < 0 else int(text.valign)
+                label = D.add_label(
+                    text=text.string,
+                    position=(text.x * dbu, text.y * dbu),
+                    rotation=text.trans.angle * 90,
+                    layer=layer,
+                )
+                label.anchor = halign + 4 * valign
+
+        D.polygons = polygons
+        D.add(_get_references(cell, components))
+        D._bb_valid = False
+        components[cell_index] = D
+    return components[topcell.cell_index()]
+
+
 def test_import_gds_snap_to_grid():
     gdspath = pp.CONFIG["gdsdir"] / "mmi1x2.gds"
     c = import_gds(gdspath, snap_to_grid_nm=5)
@@ -353,6 +582,74 @@ def test_import_gds_hierarchy():
     assert len(c.get_dependencies()) == 3
 
 
+def test_import_gds_klayout():
+    c0 = pp.c.mzi2x2(with_elec_connections=True)
+    gdspath = pp.write_gds(c0)
+    c1 = import_gds(gdspath)
+    c2 = import_gds(gdspath, engine="klayout")
+    assert np.allclose(c2.bbox, c1.bbox)
+    assert len(c2.labels) == len(c1.labels)
+
+    cells1 = {c.name: c for c in c1.get_dependencies(recursive=True)}
+    cells2 = {c.name: c for c in c2.get_dependencies(recursive=True)}
+    assert cells1.keys() == cells2.keys()
+    for name, cell in cells1.items():
+        area1 = cell.area(by_spec=True)
+        area2 = cells2[name].area(by_spec=True)
+        assert area1.keys() == area2.keys()
+        assert np.allclose([area1[k] for k in area1], [area2[k] for k in area1])
+        assert len(cell.references) == len(cells2[name].references)
+
+
+def test_import_gds_klayout_snap_to_grid_and_cellname(tmp_path):
+    gdspath = pp.CONFIG["gdsdir"] / "mmi1x2.gds"
+    c = import_gds(gdspath, snap_to_grid_nm=5, engine="klayout")
+    assert len(c.get_polygons()) == 8
+    for x, y in c.get_polygons()[0]:
+        assert pp.drc.on_grid(x, 5)
+        assert pp.drc.on_grid(y, 5)
+
+    gdspath = pp.write_gds_stream(
+        [pp.c.mzi(), pp.c.waveguide(length=7)], tmp_path / "tops.gds"
+    )
+    c = import_gds(gdspath, cellname="waveguide_L7", engine="klayout")
+    assert c.name == "waveguide_L7"
+    assert not c.references
+
+
+def test_import_gds_klayout_arrays(tmp_path):
+    layout = pya.Layout()
+    layout.dbu = 1e-3
+    child = layout.create_cell("child")
+    child.shapes(layout.layer(1, 0)).insert(pya.DBox(0, 0, 1, 2))
+    top = layout.create_cell("arrays")
+    arrays = [
+        (pya.DTrans(), pya.DVector(5, 0), pya.DVector(0, 7)),
+        (pya.DTrans(pya.DVector(100, 0)), pya.DVector(0, 7), pya.DVector(5, 0)),
+        (pya.DTrans(1, True, 0, 100), pya.DVector(0, 5), pya.DVector(-7, 0)),
+        (pya.DTrans(pya.DVector(200, 0)), pya.DVector(5, 1), pya.DVector(0, 7)),
+    ]
+    for trans, a, b in arrays:
+        top.insert(pya.DCellInstArray(child.cell_index(), trans, a, b, 2, 3))
+    gdspath = tmp_path / "arrays.gds"
+    layout.write(str(gdspath))
+
+    c = import_gds(gdspath, engine="klayout")
+    assert len(c.references) == 3 + 6
+    assert sum(isinstance(ref, CellArray) for ref in c.references) == 3
+    boxes = []
+    shapes = top.begin_shapes_rec(layout.layer(1, 0))
+    while not shapes.at_end():
+        box = shapes.shape().dbbox().transformed(shapes.dtrans())
+        boxes.append((box.left, box.bottom, box.right, box.top))
+        shapes.next()
+    polygons = c.get_polygons(by_spec=(1, 0))
+    assert len(polygons) == 4 * 6
+    assert sorted(boxes) == sorted(
+        tuple(np.round([*p.min(axis=0), *p.max(axis=0)], 3).tolist()) for p in polygons
+    )
+
+
 def demo_optical():
     """Demo. See equivalent test in tests/import_gds_markers.py"""
     # c  =  pp.c.mmi1x2()
@@ -1,36 +1,216 @@
 """ updates GDS view in Klayout dynamically.
 Requires the Klayout plugin installed in Klayout.
 This happens when you run `bash install.sh` from the top of the gdsfactory package
+
+`show` returns immediately: a background thread keeps one connection open
+to the klive server and sends the latest request only, so a loop that shows
+many layouts does not wait for (or queue up) the ones KLayout never displays.
+
+Protocol: the server greets each connection with `klive <version>`, then
+reads one JSON object per line (`{"gds": path, "keep_position": bool}`) and
+answers each with `Loaded <path>`. klive servers before v0.0.7 do not greet
+and only read the request when the client closes the connection, so the
+client falls back to one connection per request.
 """
 
+import atexit
 import json
+import multiprocessing
 import os
 import socket
+import threading
 from pathlib import PosixPath
-from typing import Union
+from typing import Callable, Optional, Union
 
+HOST = "127.0.0.1"
+PORT = 8082
 
-def show(gds_filename: Union[PosixPath, str], keep_position: bool = True) -> None:
-    """ Show GDS in klayout """
-    if not os.path.isfile(gds_filename):
-        raise ValueError(f"{gds_filename} does not exist")
+ERROR_MESSAGE = "error sending GDS to klayout. Make sure have Klayout opened and that you have installed klive with `pf install`"
+
+
+def get_request(gds_filename: Union[PosixPath, str], keep_position: bool = True):
+    """Returns the protocol line for a GDS file."""
     data = {
         "gds": os.path.abspath(gds_filename),
         "keep_position": keep_position,
     }
-    data_string = json.dumps(data)
-    try:
-        conn = socket.create_connection(("127.0.0.1", 8082), timeout=1.0)
-        data_string = data_string + "\n"
-        data_string = (
-            data_string.encode() if hasattr(data_string, "encode") else data_string
-        )
-        conn.sendall(data_string)
-        conn.close()
-    except socket.error:
-        print(
-            "error sending GDS to klayout. Make sure have Klayout opened and that you have installed klive with `pf install`"
-        )
+    return (json.dumps(data) + "\n").encode()
+
+
+class KliveClient:
+    """Sends GDS files to the klive server from a background thread.
+
+    Only the latest request is kept: `submit` replaces the pending request
+    (if the sender thread did not take it yet), so KLayout only loads the
+    latest layout.
+
+    Args:
+        host: klive server host
+        port: klive server port
+        timeout: seconds to connect and to wait for the server greeting
+        load_timeout: seconds to wait for KLayout to load each GDS
+    """
+
+    def __init__(
+        self,
+        host: str = HOST,
+        port: int = PORT,
+        timeout: float = 1.0,
+        load_timeout: float = 60.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.load_timeout = load_timeout
+        self.persistent: Optional[bool] = None
+        self.sent = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._pending: Optional[Callable[[], bytes]] = None
+        self._busy = False
+        self._stopping = False
+        self._socket: Optional[socket.socket] = None
+        self._reader = None
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, make_request: Callable[[], bytes]) -> None:
+        """Queues a request. make_request runs in the sender thread and
+        returns the protocol line (for example after writing the GDS)."""
+        with self._condition:
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = make_request
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="klive", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until the queued request is sent.
+        Returns False if timeout expired before."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._pending is None and not self._busy, timeout=timeout
+            )
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """Sends the queued request and stops the sender thread (the next
+        submit starts it again). Returns False if it is still running."""
+        with self._condition:
+            thread = self._thread
+            if thread is None:
+                return True
+            self._stopping = True
+            self._condition.notify_all()
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def close(self) -> None:
+        """Closes the connection to the server."""
+        if self._socket is not None:
+            self._reader.close()
+            self._socket.close()
+            self._socket = None
+            self._reader = None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._pending is not None or self._stopping, timeout=60
+                )
+                if self._pending is None:
+                    self._thread = None
+                    self._stopping = False
+                    return
+                make_request, self._pending = self._pending, None
+                self._busy = True
+            try:
+                self._send(make_request())
+                self.sent += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"{ERROR_MESSAGE} ({e})")
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _open(self) -> None:
+        """Connects to the server, which greets with its version
+        if it keeps connections open."""
+        conn = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        reader = conn.makefile("rb")
+        if self.persistent is not False:
+            try:
+                self.persistent = reader.readline().startswith(b"klive")
+            except socket.timeout:
+                self.persistent = False
+        conn.settimeout(self.load_timeout)
+        self._socket, self._reader = conn, reader
+
+    def _send(self, request: bytes) -> None:
+        for retry in [True, False]:
+            if self._socket is None:
+                self._open()
+            if not self.persistent:
+                # servers before v0.0.7 read the request when the client closes
+                self._socket.sendall(request)
+                self.close()
+                return
+            try:
+                self._socket.sendall(request)
+                answer = self._reader.readline()
+            except socket.timeout:
+                self.close()
+                raise
+            except OSError:
+                answer = b""
+            if answer.startswith(b"Loaded"):
+                return
+            if answer:
+                # KLayout could not load the file (ERROR ...), do not send it again
+                raise RuntimeError(f"klive answered {answer.decode().strip()!r}")
+            # the server closed the connection (KLayout restarted ...)
+            self.close()
+            if not retry:
+                raise ConnectionError("klive closed the connection")
+
+
+CLIENT = KliveClient()
+atexit.register(CLIENT.flush, timeout=5)
+
+
+def can_fork(timeout: float = 5) -> bool:
+    """Returns True if a pool of forked workers can be used: the platform
+    forks and the klive sender thread is stopped (forking while it holds a
+    lock could deadlock the workers)."""
+    return "fork" in multiprocessing.get_all_start_methods() and CLIENT.stop(
+        timeout=timeout
+    )
+
+
+def show(
+    gds_filename: Union[PosixPath, str],
+    keep_position: bool = True,
+    block: bool = False,
+) -> None:
+    """ Show GDS in klayout
+
+    Args:
+        gds_filename: GDS file path
+        keep_position: keeps the current view position
+        block: waits until the request is sent
+    """
+    if not os.path.isfile(gds_filename):
+        raise ValueError(f"{gds_filename} does not exist")
+    request = get_request(gds_filename, keep_position=keep_position)
+    CLIENT.submit(lambda: request)
+    if block:
+        CLIENT.flush()
 
 
 if __name__ == "__main__":
@@ -38,4 +218,4 @@ if __name__ == "__main__":
 
     c = pp.c.waveguide()
     gdspath = pp.write_gds(c)
-    show(gdspath)
+    show(gdspath, block=True)
@@ -0,0 +1,215 @@
+"""Lazy components have ports, bbox and settings but build their geometry
+only when something needs it (write_gds, get_polygons, references ...).
+
+Placement and routing only need ports and bbox, so they can work with the
+abstract view of a component loaded from the `.ports` and `.json` sidecars
+that `write_component` writes next to the GDS.
+
+.. code::
+
+    import pp
+
+    pp.write_component(pp.c.mmi1x2(), gdsdir=pp.CONFIG["lazy_directory"])
+    pp.clear_cache()
+
+    c = pp.c.mmi1x2(lazy=True)  # reads the sidecars, no geometry yet
+    c.ports  # available
+    c.bbox  # available
+    c.write_gds()  # builds the geometry
+
+"""
+import csv
+import json
+import pathlib
+from typing import Callable, Optional
+
+import gdspy
+import numpy as np
+
+from pp.component import Component
+from pp.sidecar import add_ports, read_sidecar
+
+
+def _lazy_slot(name: str) -> property:
+    """Returns a property over a gdspy.Cell slot that builds the geometry on get."""
+    slot = getattr(gdspy.Cell, name)
+
+    def getter(self):
+        if self._factory is not None:
+            self.materialize()
+        return slot.__get__(self)
+
+    def setter(self, value):
+        slot.__set__(self, value)
+
+    return property(getter, setter, doc=f"{name} (builds the geometry if needed)")
+
+
+class LazyComponent(Component):
+    """Component with ports, bbox and settings that calls factory
+    to build its geometry the first time it is needed.
+
+    Args:
+        name: cell name
+        factory: function that returns a Component with the geometry
+        bbox: [[xmin, ymin], [xmax, ymax]], None for an empty Component
+    """
+
+    _factory = None
+    is_lazy = property(lambda self: self._factory is not None)
+    polygons = _lazy_slot("polygons")
+    paths = _lazy_slot("paths")
+    labels = _lazy_slot("labels")
+    references = _lazy_slot("references")
+
+    def __init__(
+        self, name: str, factory: Callable[[], Component], bbox: Optional[np.ndarray]
+    ) -> None:
+        super().__init__(name=name)
+        self.ignore.update(["is_lazy", "_factory", "_lazy_bbox"])
+        self._lazy_bbox = None if bbox is None else np.array(bbox, dtype=float)
+        self._factory = factory
+        self._bb_valid = True
+
+    def materialize(self) -> None:
+        """Builds the geometry (if it is not built yet)."""
+        factory = self._factory
+        if factory is None:
+            return
+        self._factory = None
+        component = factory()
+
+        self.polygons = list(component.polygons)
+        self.paths = list(component.paths)
+        self.labels = list(component.labels)
+        self.add(list(component.references))
+        self.aliases.update(component.aliases)
+        # the ports of the geometry replace the ones read from the sidecar
+        self.ports = {}
+        for port in component.ports.values():
+            self.add_port(port=port)
+        self._bb_valid = False
+
+        # update the polygon memory of the cell in the cache
+        from pp.cell import CACHE
+
+        if CACHE.get(self.name, count=False) is self:
+            CACHE[self.name] = self
+
+    def get_bounding_box(self) -> Optional[np.ndarray]:
+        if self._factory is not None:
+            return None if self._lazy_bbox is None else np.array(self._lazy_bbox)
+        return super().get_bounding_box()
+
+    def get_dependencies(self, recursive: bool = False):
+        self.materialize()
+        return super().get_dependencies(recursive=recursive)
+
+    def __repr__(self) -> str:
+        if self._factory is None:
+            return super().__repr__()
+        return f"{self.name}: uid {self.uid}, ports {list(self.ports.keys())}, lazy"
+
+
+def read_ports(component: Component, ports_path: pathlib.Path) -> None:
+    """Adds the ports from a `.ports` CSV file written by write_component."""
+    with open(ports_path, newline="") as csvfile:
+        reader = csv.reader(csvfile, delimiter=",", quotechar="|")
+        for r in reader:
+            component.add_port(
+                name=r[0],
+                midpoint=[float(r[1]), float(r[2])],
+                orientation=int(r[3]),
+                width=float(r[4]),
+                layer=(int(r[5]), int(r[6])),
+            )
+
+
+def load_lazy_component(
+    gdspath: pathlib.Path,
+    factory: Optional[Callable[[], Component]] = None,
+    key: Optional[str] = None,
+) -> Optional[LazyComponent]:
+    """Returns a LazyComponent from the `.json` and `.ports` (or `.npz`)
+    next to gdspath.
+    Returns None if there is no metadata with the bbox of the component,
+    or if it was written for a different cell key.
+
+    Args:
+        gdspath: GDS written by write_component
+        factory: builds the geometry (defaults to importing gdspath)
+        key: cell key (see pp.cell.get_cell_key) that the sidecar must have
+    """
+    gdspath = pathlib.Path(gdspath)
+    json_path = gdspath.with_suffix(".json")
+    ports_path = gdspath.with_suffix(".ports")
+    sidecar_path = gdspath.with_suffix(".npz")
+    ports_array = None
+    if sidecar_path.exists():
+        ports_array, data = read_sidecar(sidecar_path)
+    elif json_path.exists():
+        data = json.loads(json_path.read_text())
+    else:
+        return None
+    if "bbox" not in data:
+        return None
+    if key is not None and data.get("cell_key") != key:
+        return None
+
+    if factory is None:
+
+        def factory():
+            from pp.import_gds import import_gds
+
+            return import_gds(gdspath)
+
+    name = gdspath.stem
+    component = LazyComponent(name=name, factory=factory, bbox=data["bbox"])
+    component.name = name
+    if ports_array is not None:
+        add_ports(component, ports_array)
+    elif ports_path.exists():
+        read_ports(component, ports_path)
+
+    settings = data.get("cells", {}).get(name, {})
+    component.settings.update(settings.get("settings", {}))
+    for key in ["function_name", "module", "name_long"]:
+        if key in settings:
+            setattr(component, key, settings[key])
+    return component
+
+
+def test_lazy_component(tmp_path):
+    import pp
+
+    c = pp.c.mzi()
+    gdspath = pp.write_component(c, gdsdir=tmp_path)
+    lazy = load_lazy_component(gdspath, factory=pp.c.mzi)
+
+    assert lazy.is_lazy
+    assert np.allclose(lazy.bbox, c.bbox)
+    assert list(lazy.ports) == list(c.ports)
+    assert np.allclose(lazy.ports["E0"].midpoint, c.ports["E0"].midpoint)
+
+    parent = pp.Component("lazy_parent")
+    ref = parent.add_ref(lazy)
+    ref.movex(10)
+    assert np.allclose(parent.bbox, c.bbox + [10, 0])
+    assert lazy.is_lazy
+
+    lazy.ports["E0"].move((1, 0))
+    parent.write_gds(str(tmp_path / "parent.gds"))
+    assert not lazy.is_lazy
+    assert np.allclose(lazy.ports["E0"].midpoint, c.ports["E0"].midpoint)
+    assert len(lazy.references) == len(c.references)
+    assert np.allclose(lazy.bbox, c.bbox)
+
+
+def test_lazy_component_import_gds(tmp_path):
+    import pp
+
+    c = pp.c.waveguide()
+    gdspath = pp.write_component(c, gdsdir=tmp_path)
+    lazy = load_lazy_component(gdspath)
+    assert lazy.settings["length"] == c.settings["length"]
+    assert len(lazy.get_polygons()) == len(c.get_polygons())
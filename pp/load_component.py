@@ -8,6 +8,8 @@ from pathlib import PosixPath
 import pp
 from pp import CONFIG
 from pp.component import Component
+from pp.compression import strip_compression
+from pp.sidecar import add_ports, read_sidecar
 
 
 def get_component_path(name, dirpath=CONFIG["gdslib"]):
@@ -40,16 +42,25 @@ def remove_gds_labels(component: Component, layer=pp.LAYER.LABEL_SETTINGS) -> No
 
 
 def load_component(gdspath: PosixPath) -> Component:
-    """Returns Component from gdspath, with ports (CSV) and metadata (JSON) info (if any)"""
+    """Returns Component from gdspath, with ports (CSV) and metadata (JSON) info (if any)
+    or both from a binary `.npz` sidecar (see pp.sidecar)"""
 
     if not gdspath.exists():
         raise FileNotFoundError(f"No such file '{gdspath}'")
 
-    ports_filepath = gdspath.with_suffix(".ports")
-    metadata_filepath = gdspath.with_suffix(".json")
+    sidecar_path = strip_compression(gdspath)
+    ports_filepath = sidecar_path.with_suffix(".ports")
+    metadata_filepath = sidecar_path.with_suffix(".json")
+    sidecar_filepath = sidecar_path.with_suffix(".npz")
 
     c = pp.import_gds(gdspath)
 
+    if sidecar_filepath.exists():
+        ports_array, data = read_sidecar(sidecar_filepath)
+        add_ports(c, ports_array)
+        c.settings.update(data["cells"][c.name])
+        return c
+
     if ports_filepath.exists():
         with open(str(ports_filepath), newline="") as csvfile:
             reader = csv.reader(csvfile, delimiter=",", quotechar="|")
@@ -9,6 +9,7 @@ from git import Repo
 from omegaconf import OmegaConf
 
 from pp.config import CONFIG, conf, get_git_hash, logging, write_config
+from pp.sidecar import read_index
 
 
 def update_config_modules(config=conf):
@@ -51,11 +52,19 @@ def merge_json(
 
     for directory in extra_directories + [doe_directory]:
         for filename in directory.glob("*/*.json"):
+            if filename.with_suffix(".npz").exists():
+                continue
             logging.debug(filename)
             with open(filename, "r") as f:
                 data = json.load(f)
                 cells.update(data.get("cells"))
 
+        # binary sidecars, read from one index file per directory
+        dirpaths = directory.iterdir() if directory.exists() else []
+        for dirpath in [dirpath for dirpath in dirpaths if dirpath.is_dir()]:
+            for data in read_index(dirpath).values():
+                cells.update(data.get("cells"))
+
     does = {d.stem: json.loads(open(d).read()) for d in doe_directory.glob("*.json")}
     metadata = dict(
         json_version=json_version,
@@ -0,0 +1,343 @@
+"""Hierarchical netlist: the netlist of each unique cell, extracted once and
+shared by all its instances.
+
+Each cell netlist is a graph with integer node ids:
+
+- nodes: (N, 2) int array of (instance index, port index), instance -1 for
+  the ports of the cell itself, which are always nodes 0 to P-1
+- edges: (E, 2) int array of connected node ids (ports at the same
+  position, 1nm grid)
+
+together with the port names, instance names (as in get_netlist), the cell
+of each instance and their placements.
+
+`flatten_netlist` joins the cell graphs into one graph for the whole
+hierarchy with instance paths (`mzi_1/coupler_2,E0`) as node names, and
+`get_nets` labels the connected nodes.
+
+.. code::
+
+    import pp
+    from pp.netlist_hierarchical import (
+        flatten_netlist,
+        get_netlist_hierarchical,
+        get_nets,
+    )
+
+    netlist = get_netlist_hierarchical(pp.c.mzi_lattice())
+    flat = flatten_netlist(netlist)
+    nets = get_nets(flat)
+
+Components keep their cell netlist until their geometry, ports, the
+transforms of their references or the ports of the cells they reference
+change. The same dict (with read-only
+arrays) is returned for every instance of the cell, so do not modify it.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from pp.compare_cells import hash_cell
+from pp.drc import snap_to_1nm_grid
+from pp.get_netlist import get_instance_name, get_labels_index, get_references_ports
+from pp.layers import LAYER
+
+
+def _get_ports(cell) -> Tuple[Tuple[str, ...], Any]:
+    """Returns port names and ports array (or None for non Components)."""
+    if hasattr(cell, "get_ports_structured"):
+        return cell.get_ports_structured()
+    return tuple(cell.ports), None
+
+
+def _get_midpoints(cell) -> np.ndarray:
+    _, ports_array = _get_ports(cell)
+    if ports_array is None:
+        points = [port.midpoint for port in cell.ports.values()]
+        return np.array(points, dtype=float).reshape(-1, 2)
+    return np.column_stack([ports_array["x"], ports_array["y"]])
+
+
+def get_edges(points: np.ndarray) -> np.ndarray:
+    """Returns (E, 2) edges that connect the points at the same position,
+    from the first point of each position to the others."""
+    if len(points) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    _, inverse = np.unique(points, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind="stable")
+    groups = inverse[order]
+    starts = np.r_[True, groups[1:] != groups[:-1]]
+    first = order[np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))]
+    edges = np.column_stack([first, order])[~starts]
+    return edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+
+
+def _get_key(cell, full_settings, layer_label) -> Tuple[Any, ...]:
+    """Returns what the netlist of a Component depends on."""
+    cell._check_lists()
+    children = {id(ref.parent): ref.parent for ref in cell.references}
+    transforms = tuple(
+        (
+            tuple(np.asarray(ref.origin, dtype=float).tolist()),
+            ref.rotation,
+            ref.magnification,
+            bool(ref.x_reflection),
+        )
+        for ref in cell.references
+    )
+    return (
+        cell._version,
+        _get_ports(cell)[1],
+        tuple(_get_ports(child)[1] for child in children.values()),
+        transforms,
+        full_settings,
+        tuple(layer_label),
+    )
+
+
+def _is_same_key(key1, key2) -> bool:
+    return (
+        key1[0] == key2[0]
+        and key1[1] is key2[1]
+        and len(key1[2]) == len(key2[2])
+        and all(a is b for a, b in zip(key1[2], key2[2]))
+        and key1[3:] == key2[3:]
+    )
+
+
+def get_cell_netlist(
+    cell,
+    full_settings: bool = False,
+    layer_label: Tuple[int, int] = LAYER.LABEL_INSTANCE,
+) -> Dict[str, Any]:
+    """Returns the netlist graph of a cell (one level of hierarchy).
+
+    Args:
+        cell: Component
+        full_settings: True returns all settings, false only the ones that have changed
+        layer_label: label to read instanceNames from (if any)
+    """
+    is_component = hasattr(cell, "_netlists")
+    if is_component:
+        key = _get_key(cell, full_settings, layer_label)
+        cached = cell._netlists.get((full_settings, tuple(layer_label)))
+        if cached is not None and _is_same_key(cached[0], key):
+            return cached[1]
+
+    references = list(cell.references)
+    labels_index = get_labels_index(cell, layer_label=layer_label)
+    port_names = list(_get_ports(cell)[0])
+    instances = []
+    for reference in references:
+        instances.append(
+            get_instance_name(
+                cell, reference, layer_label=layer_label, labels_index=labels_index
+            )
+        )
+
+    names, midpoints = get_references_ports(references)
+    ports_index = {}
+    for reference in references:
+        parent = reference.parent
+        if id(parent) not in ports_index:
+            child_ports = _get_ports(parent)[0]
+            ports_index[id(parent)] = {name: i for i, name in enumerate(child_ports)}
+    nodes = np.array(
+        [(-1, i) for i in range(len(port_names))]
+        + [(i, ports_index[id(references[i].parent)][name]) for i, name in names],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    points = np.concatenate([_get_midpoints(cell), midpoints])
+    edges = get_edges(snap_to_1nm_grid(points))
+
+    placements = np.array(
+        [
+            snap_to_1nm_grid(np.asarray(ref.origin, dtype=float)).tolist()
+            + [int(ref.rotation or 0)]
+            for ref in references
+        ],
+        dtype=float,
+    ).reshape(-1, 3)
+    settings = (
+        cell.get_settings(full_settings=full_settings)["settings"]
+        if hasattr(cell, "get_settings")
+        else {}
+    )
+    netlist = dict(
+        name=cell.name,
+        component=getattr(cell, "function_name", None),
+        settings=settings,
+        ports=port_names,
+        instances=instances,
+        cells=[ref.parent.name for ref in references],
+        placements=placements,
+        mirror=np.array([bool(ref.x_reflection) for ref in references], dtype=bool),
+        nodes=nodes,
+        edges=edges,
+    )
+    for value in netlist.values():
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+    if is_component:
+        cell._netlists[(full_settings, tuple(layer_label))] = (key, netlist)
+    return netlist
+
+
+def get_cells(component) -> List[Any]:
+    """Returns the cells in the hierarchy of component (itself included),
+    one per name, children before parents.
+
+    Cells are tracked by identity, so each cell object is visited once.
+    A different cell object with the name of a visited one (for example
+    rebuilt after clearing the cache) is compared once, and raises
+    ValueError if its geometry or ports are different.
+    """
+    cells = []
+    names = {}  # name: first cell with that name
+    visited = set()  # id of the cell objects already seen
+    stack = [(component, False)]
+    while stack:
+        cell, expanded = stack.pop()
+        if expanded:
+            cells.append(cell)
+            continue
+        if id(cell) in visited:
+            continue
+        visited.add(id(cell))
+        other = names.get(cell.name)
+        if other is not None:
+            if (
+                hash_cell(other) != hash_cell(cell)
+                or _get_ports(other)[0] != _get_ports(cell)[0]
+                or not np.array_equal(_get_midpoints(other), _get_midpoints(cell))
+            ):
+                raise ValueError(f"Two different cells are named {cell.name!r}")
+            continue
+        names[cell.name] = cell
+        stack.append((cell, True))
+        for reference in reversed(cell.references):
+            stack.append((reference.parent, False))
+    return cells
+
+
+def get_netlist_hierarchical(
+    component,
+    full_settings: bool = False,
+    layer_label: Tuple[int, int] = LAYER.LABEL_INSTANCE,
+) -> Dict[str, Any]:
+    """Returns the netlist graph of each unique cell in the hierarchy
+    of component (children before parents), extracted once per cell.
+
+    Args:
+        component: top cell
+        full_settings: True returns all settings, false only the ones that have changed
+        layer_label: label to read instanceNames from (if any)
+
+    Returns:
+        top: name of component
+        cells: {cell name: get_cell_netlist(cell)}
+    """
+    cells = {
+        cell.name: get_cell_netlist(
+            cell, full_settings=full_settings, layer_label=layer_label
+        )
+        for cell in get_cells(component)
+    }
+    return dict(top=component.name, cells=cells)
+
+
+def flatten_netlist(netlist: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns one graph for the whole hierarchy.
+
+    The ports of an instance and the ports of its cell are the same nodes,
+    named by instance path: `port` for the top ports, `instance,port` for
+    the ports of top instances and `instance/subinstance,port` below.
+
+    Returns:
+        nodes: list of node names
+        edges: (E, 2) int array of connected node ids
+    """
+    cells = netlist["cells"]
+    flat = {}
+    for name, cell in cells.items():  # children first
+        nodes = list(cell["ports"])
+        edges = []
+        offsets = np.zeros(len(cell["cells"]), dtype=np.int64)
+        for i, (instance, child_name) in enumerate(
+            zip(cell["instances"], cell["cells"])
+        ):
+            child_nodes, child_edges = flat[child_name]
+            num_ports = len(cells[child_name]["ports"])
+            offsets[i] = len(nodes)
+            nodes.extend(f"{instance},{port}" for port in child_nodes[:num_ports])
+            nodes.extend(f"{instance}/{node}" for node in child_nodes[num_ports:])
+            edges.append(child_edges + offsets[i])
+
+        instance, port = cell["nodes"].T
+        ids = np.append(offsets, 0)[instance] + port  # instance -1: own ports
+        edges.append(ids[cell["edges"]])
+        flat[name] = (nodes, np.concatenate(edges).reshape(-1, 2))
+
+    nodes, edges = flat[netlist["top"]]
+    return dict(nodes=nodes, edges=edges)
+
+
+def get_nets(flat: Dict[str, Any]) -> np.ndarray:
+    """Returns the net id of each node of a flat netlist
+    (connected nodes have the same id)."""
+    n = len(flat["nodes"])
+    edges = flat["edges"]
+    graph = coo_matrix(
+        (np.ones(len(edges), dtype=np.int8), (edges[:, 0], edges[:, 1])), shape=(n, n)
+    )
+    return connected_components(graph, directed=False)[1]
+
+
+def to_dict(netlist: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the netlist with lists instead of arrays, for YAML or JSON."""
+    return json.loads(json.dumps(netlist, default=lambda array: array.tolist()))
+
+
+def from_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns a netlist from to_dict (with arrays)."""
+    cells = {}
+    for name, cell in data["cells"].items():
+        cell = dict(cell)
+        cell["placements"] = np.array(cell["placements"], dtype=float).reshape(-1, 3)
+        cell["mirror"] = np.array(cell["mirror"], dtype=bool)
+        cell["nodes"] = np.array(cell["nodes"], dtype=np.int64).reshape(-1, 2)
+        cell["edges"] = np.array(cell["edges"], dtype=np.int64).reshape(-1, 2)
+        cells[name] = cell
+    return dict(top=data["top"], cells=cells)
+
+
+def get_connections(
+    netlist: Dict[str, Any], cell_name: Optional[str] = None
+) -> List[Tuple[str, str]]:
+    """Returns the edges of a cell (defaults to top) as pairs of
+    `instance,port` names (`port` for the ports of the cell)."""
+    cells = netlist["cells"]
+    cell = cells[cell_name or netlist["top"]]
+    names = []
+    for instance, port in cell["nodes"].tolist():
+        if instance < 0:
+            names.append(cell["ports"][port])
+        else:
+            child_ports = cells[cell["cells"][instance]]["ports"]
+            names.append(f"{cell['instances'][instance]},{child_ports[port]}")
+    return [(names[a], names[b]) for a, b in cell["edges"].tolist()]
+
+
+if __name__ == "__main__":
+    import pp
+
+    c = pp.c.mzi_lattice()
+    netlist = get_netlist_hierarchical(c)
+    for name in netlist["cells"]:
+        print(name, get_connections(netlist, name))
+    flat = flatten_netlist(netlist)
+    print(len(flat["nodes"]), "nodes", get_nets(flat).max() + 1, "nets")
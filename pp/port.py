@@ -27,6 +27,10 @@ from pp.drc import snap_to_grid
 
 port_types = ["optical", "rf", "dc", "heater"]
 
+PORT_DTYPE = np.dtype(
+    [("x", "f8"), ("y", "f8"), ("orientation", "f8"), ("width", "f8")]
+)  # ports as a structured array
+
 
 class Port(PortPhidl):
     """Ports are useful to connect Components with each other.
@@ -57,6 +61,7 @@ class Port(PortPhidl):
     """
 
     _next_uid = 0
+    _version = 0  # increases every time a port or a Ports dict changes
 
     def __init__(
         self,
@@ -69,9 +74,9 @@ class Port(PortPhidl):
         port_type: str = "optical",
     ) -> None:
         self.name = name
-        self.midpoint = np.array(midpoint, dtype="float64")
-        self.width = width
-        self.orientation = np.mod(orientation, 360)
+        self._midpoint = np.array(midpoint, dtype="float64")
+        self._width = width
+        self._orientation = np.mod(orientation, 360)
         self.parent = parent
         self.info = {}
         self.uid = Port._next_uid
@@ -95,6 +100,33 @@ class Port(PortPhidl):
             )
         )
 
+    @property
+    def midpoint(self):
+        return self._midpoint
+
+    @midpoint.setter
+    def midpoint(self, midpoint):
+        self._midpoint = midpoint
+        Port._version += 1
+
+    @property
+    def orientation(self):
+        return self._orientation
+
+    @orientation.setter
+    def orientation(self, orientation):
+        self._orientation = orientation
+        Port._version += 1
+
+    @property
+    def width(self):
+        return self._width
+
+    @width.setter
+    def width(self, width):
+        self._width = width
+        Port._version += 1
+
     @property
     def angle(self):
         """convenient alias"""
@@ -138,7 +170,7 @@ class Port(PortPhidl):
             layer=self.layer,
             port_type=self.port_type,
         )
-        new_port.info = deepcopy(self.info)
+        new_port.info = deepcopy(self.info) if self.info else {}
         if not new_uid:
             new_port.uid = self.uid
             Port._next_uid -= 1
@@ -165,6 +197,41 @@ class Port(PortPhidl):
             )
 
 
+class Ports(dict):
+    """Ports of a Component by name, bumps Port._version when it changes"""
+
+    def __setitem__(self, name: str, port: Port) -> None:
+        super().__setitem__(name, port)
+        Port._version += 1
+
+    def __delitem__(self, name: str) -> None:
+        super().__delitem__(name)
+        Port._version += 1
+
+    def pop(self, *args):
+        Port._version += 1
+        return super().pop(*args)
+
+    def popitem(self):
+        Port._version += 1
+        return super().popitem()
+
+    def setdefault(self, *args):
+        Port._version += 1
+        return super().setdefault(*args)
+
+    def update(self, *args, **kwargs) -> None:
+        super().update(*args, **kwargs)
+        Port._version += 1
+
+    def clear(self) -> None:
+        super().clear()
+        Port._version += 1
+
+    def __reduce__(self):
+        return Ports, (dict(self),)
+
+
 def port_array(midpoint=(0, 0), width=0.5, orientation=0, delta=(10, 0), n=2):
     """ returns list of ports """
     return [
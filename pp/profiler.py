@@ -0,0 +1,247 @@
+"""Profiles the time spent building each parametric cell.
+
+.. code::
+
+    import pp
+
+    with pp.profile() as prof:
+        c = pp.c.mzi()
+
+    print(prof)
+    prof.write("profile")  # profile.json, profile.txt and profile_trace.json
+
+Open the `_trace.json` file in chrome://tracing or https://ui.perfetto.dev
+to see the nested cell hierarchy as a flamegraph.
+
+You can also profile a whole session with `cell_profile: true` in config.yml,
+the report is written to `build_directory/profile` when python exits.
+"""
+import atexit
+import json
+import os
+import pathlib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from pp.config import CONFIG, conf
+
+PROFILER = None  # active CellProfiler, checked by every @cell call
+
+COLUMNS = ("calls", "hits", "self_time", "time", "polygons", "vertices")
+
+
+class _Frame:
+    """One @cell call in the stack of calls."""
+
+    __slots__ = ("function_name", "start", "children_time", "component")
+
+    def __init__(self, function_name: str) -> None:
+        self.function_name = function_name
+        self.start = time.perf_counter()
+        self.children_time = 0.0
+        self.component = None
+
+
+class CellProfiler:
+    """Records calls, cache hits, self and inclusive time for each cell function.
+
+    Self time excludes the time spent building other cells.
+    Polygon and vertex counts are for the polygons of the built cells
+    (not their references).
+
+    Args:
+        trace: records every call to export a Chrome trace
+    """
+
+    def __init__(self, trace: bool = True) -> None:
+        self.trace = trace
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = time.perf_counter()
+
+    def _get_stack(self) -> List[_Frame]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def record(self, function_name: str) -> Iterator[_Frame]:
+        """Records one call to a cell function."""
+        stack = self._get_stack()
+        frame = _Frame(function_name)
+        stack.append(frame)
+        try:
+            yield frame
+        finally:
+            stack.pop()
+            end = time.perf_counter()
+            duration = end - frame.start
+            if stack:
+                stack[-1].children_time += duration
+            self._add(frame, duration)
+
+    def add_component(self, component) -> None:
+        """Marks the current call as a build (not a cache hit) of component."""
+        stack = self._get_stack()
+        if stack:
+            stack[-1].component = component
+
+    def _add(self, frame: _Frame, duration: float) -> None:
+        component = frame.component
+        polygons = vertices = 0
+        if component is not None:
+            for polygonset in component.polygons:
+                polygons += len(polygonset.polygons)
+                vertices += sum(len(points) for points in polygonset.polygons)
+
+        with self._lock:
+            stats = self.stats.get(frame.function_name)
+            if stats is None:
+                stats = self.stats[frame.function_name] = dict.fromkeys(COLUMNS, 0)
+            stats["calls"] += 1
+            stats["hits"] += component is None
+            stats["self_time"] += duration - frame.children_time
+            stats["time"] += duration
+            stats["polygons"] += polygons
+            stats["vertices"] += vertices
+
+            if self.trace:
+                self.events.append(
+                    dict(
+                        name=frame.function_name,
+                        cat="cell" if component is not None else "hit",
+                        ph="X",
+                        ts=(frame.start - self._start) * 1e6,
+                        dur=duration * 1e6,
+                        pid=os.getpid(),
+                        tid=threading.get_ident(),
+                        args=dict(polygons=polygons, vertices=vertices),
+                    )
+                )
+
+    def clear(self) -> None:
+        with self._lock:
+            self.stats.clear()
+            self.events.clear()
+
+    def to_dict(self, sort_by: str = "self_time") -> Dict[str, Dict[str, Any]]:
+        """Returns stats for each function, sorted by decreasing sort_by."""
+        with self._lock:
+            items = sorted(
+                self.stats.items(), key=lambda item: item[1][sort_by], reverse=True
+            )
+            return {function_name: dict(stats) for function_name, stats in items}
+
+    def table(self, sort_by: str = "self_time") -> str:
+        """Returns a text table with the stats sorted by decreasing sort_by."""
+        stats = self.to_dict(sort_by=sort_by)
+        width = max([len("function")] + [len(name) for name in stats])
+        lines = [
+            f"{'function':<{width}} {'calls':>8} {'hits':>8} {'self_time':>10} "
+            f"{'time':>10} {'polygons':>10} {'vertices':>10}"
+        ]
+        for function_name, s in stats.items():
+            lines.append(
+                f"{function_name:<{width}} {s['calls']:>8} {s['hits']:>8} "
+                f"{s['self_time']:>10.4f} {s['time']:>10.4f} "
+                f"{s['polygons']:>10} {s['vertices']:>10}"
+            )
+        return "\n".join(lines)
+
+    def __str__(self) -> str:
+        return self.table()
+
+    def get_chrome_trace(self) -> Dict[str, Any]:
+        """Returns trace in the Chrome Trace Event format."""
+        with self._lock:
+            return dict(traceEvents=list(self.events), displayTimeUnit="ms")
+
+    def write_json(self, filepath) -> None:
+        filepath = pathlib.Path(filepath)
+        filepath.write_text(json.dumps(self.to_dict(), indent=2))
+
+    def write_table(self, filepath) -> None:
+        filepath = pathlib.Path(filepath)
+        filepath.write_text(self.table() + "\n")
+
+    def write_chrome_trace(self, filepath) -> None:
+        filepath = pathlib.Path(filepath)
+        filepath.write_text(json.dumps(self.get_chrome_trace()))
+
+    def write(self, filepath) -> None:
+        """Writes filepath.json, filepath.txt and filepath_trace.json"""
+        filepath = pathlib.Path(filepath)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        self.write_json(filepath.with_suffix(".json"))
+        self.write_table(filepath.with_suffix(".txt"))
+        if self.trace:
+            self.write_chrome_trace(
+                filepath.with_name(f"{filepath.stem}_trace").with_suffix(".json")
+            )
+
+
+@contextmanager
+def profile(trace: bool = True) -> Iterator[CellProfiler]:
+    """Profiles all @cell calls inside the context.
+
+    Args:
+        trace: records every call to export a Chrome trace
+    """
+    global PROFILER
+    previous = PROFILER
+    profiler = CellProfiler(trace=trace)
+    PROFILER = profiler
+    try:
+        yield profiler
+    finally:
+        PROFILER = previous
+
+
+def enable_profiler(filepath: Optional[pathlib.Path] = None) -> CellProfiler:
+    """Profiles all @cell calls until python exits and then writes the report."""
+    global PROFILER
+    filepath = filepath or CONFIG["build_directory"] / "profile"
+    PROFILER = CellProfiler()
+    atexit.register(PROFILER.write, filepath)
+    return PROFILER
+
+
+if conf.cell_profile:
+    enable_profiler()
+
+
+def test_profile(tmp_path):
+    import pp
+
+    pp.clear_cache()
+    with profile() as prof:
+        pp.c.mzi()
+        pp.c.mzi()
+
+    stats = prof.to_dict()
+    assert stats["mzi"]["calls"] == 2
+    assert stats["mzi"]["hits"] == 1
+    assert stats["mzi"]["time"] >= stats["mzi"]["self_time"] >= 0
+    assert stats["mzi"]["time"] > stats["mmi1x2"]["time"]
+    assert stats["mmi1x2"]["polygons"] > 0
+    assert stats["mmi1x2"]["vertices"] >= 3 * stats["mmi1x2"]["polygons"]
+    assert "mzi" in prof.table()
+    assert PROFILER is None
+
+    prof.write(tmp_path / "profile")
+    assert json.loads((tmp_path / "profile.json").read_text()) == stats
+    trace = json.loads((tmp_path / "profile_trace.json").read_text())
+    assert len(trace["traceEvents"]) == sum(s["calls"] for s in stats.values())
+
+
+if __name__ == "__main__":
+    import pp
+
+    with pp.profile() as prof:
+        c = pp.c.mzi()
+    print(prof)
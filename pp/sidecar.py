@@ -0,0 +1,148 @@
+"""Binary sidecars: one `.npz` next to each GDS with the ports as a
+structured array and the metadata as compact JSON, instead of the `.ports`
+CSV and the indented `.json`.
+
+`write_component(..., sidecar="npz")` (or `sidecar_format: npz` in
+config.yml) writes them, and `load_component`, `load_lazy_component` and
+`merge_json` read them transparently.
+
+`read_index(dirpath)` returns the metadata of all the sidecars of a directory
+from a single index file, which it updates with the sidecars that changed.
+
+`export_sidecar(npzpath)` writes the `.ports` CSV and `.json` of a sidecar.
+"""
+import io
+import json
+import os
+import pathlib
+from typing import Any, Dict, Tuple
+
+import numpy as np
+from phidl import device_layout as pd
+
+from pp.component import Component
+from pp.disk_cache import _atomic_write
+
+INDEX_NAME = "sidecars.index"
+
+
+def get_ports_array(component: Component) -> np.ndarray:
+    """Returns the ports of component as a structured array with fields
+    name, x, y, orientation, width, layer, purpose and port_type."""
+    ports = list(component.ports.values())
+    name_length = max([1] + [len(port.name) for port in ports])
+    type_length = max([1] + [len(port.port_type) for port in ports])
+    dtype = np.dtype(
+        [
+            ("name", f"U{name_length}"),
+            ("x", "f8"),
+            ("y", "f8"),
+            ("orientation", "f8"),
+            ("width", "f8"),
+            ("layer", "i4"),
+            ("purpose", "i4"),
+            ("port_type", f"U{type_length}"),
+        ]
+    )
+    ports_array = np.zeros(len(ports), dtype=dtype)
+    for i, port in enumerate(ports):
+        layer, purpose = pd._parse_layer(port.layer)
+        ports_array[i] = (
+            port.name,
+            port.x,
+            port.y,
+            port.orientation,
+            port.width,
+            layer,
+            purpose,
+            port.port_type,
+        )
+    return ports_array
+
+
+def add_ports(component: Component, ports_array: np.ndarray) -> None:
+    """Adds the ports from a structured array of get_ports_array."""
+    for port in ports_array:
+        component.add_port(
+            name=str(port["name"]),
+            midpoint=[float(port["x"]), float(port["y"])],
+            orientation=float(port["orientation"]),
+            width=float(port["width"]),
+            layer=(int(port["layer"]), int(port["purpose"])),
+            port_type=str(port["port_type"]),
+        )
+
+
+def get_sidecar(ports_array: np.ndarray, metadata: Dict[str, Any]) -> bytes:
+    """Returns the sidecar file contents."""
+    data = json.dumps(metadata, separators=(",", ":")).encode()
+    f = io.BytesIO()
+    np.savez(f, ports=ports_array, metadata=np.frombuffer(data, dtype=np.uint8))
+    return f.getvalue()
+
+
+def write_sidecar(
+    npzpath: pathlib.Path, ports_array: np.ndarray, metadata: Dict[str, Any]
+) -> pathlib.Path:
+    """Writes the sidecar (atomically)."""
+    npzpath = pathlib.Path(npzpath)
+    _atomic_write(npzpath, get_sidecar(ports_array, metadata))
+    return npzpath
+
+
+def read_sidecar(npzpath: pathlib.Path) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Returns ports structured array and metadata dict of a sidecar."""
+    with np.load(npzpath, allow_pickle=False) as data:
+        return data["ports"], json.loads(data["metadata"].tobytes())
+
+
+def read_index(dirpath: pathlib.Path) -> Dict[str, Dict[str, Any]]:
+    """Returns {name: metadata} for the sidecars of dirpath.
+
+    Keeps the metadata in a single compact JSON index file, and only reads
+    the sidecars added or modified since the index was written.
+    """
+    dirpath = pathlib.Path(dirpath)
+    index_path = dirpath / INDEX_NAME
+    try:
+        index = json.loads(index_path.read_bytes())
+    except (FileNotFoundError, ValueError):
+        index = {}
+
+    entries = {}
+    changed = False
+    with os.scandir(dirpath) as it:
+        for entry in it:
+            if not entry.name.endswith(".npz"):
+                continue
+            mtime = entry.stat().st_mtime_ns
+            cached = index.get(entry.name)
+            if cached is None or cached[0] != mtime:
+                cached = [mtime, read_sidecar(entry.path)[1]]
+                changed = True
+            entries[entry.name] = cached
+
+    if changed or entries.keys() != index.keys():
+        _atomic_write(index_path, json.dumps(entries, separators=(",", ":")).encode())
+    return {name[: -len(".npz")]: metadata for name, (_, metadata) in entries.items()}
+
+
+def export_sidecar(npzpath: pathlib.Path) -> Tuple[pathlib.Path, pathlib.Path]:
+    """Writes the `.ports` CSV and `.json` metadata of a sidecar.
+    Returns their paths."""
+    npzpath = pathlib.Path(npzpath)
+    ports_array, metadata = read_sidecar(npzpath)
+    ports_path = npzpath.with_suffix(".ports")
+    json_path = npzpath.with_suffix(".json")
+    _atomic_write(ports_path, get_ports_csv(ports_array).encode())
+    _atomic_write(json_path, json.dumps(metadata, indent=2).encode())
+    return ports_path, json_path
+
+
+def get_ports_csv(ports_array: np.ndarray) -> str:
+    """Returns the `.ports` CSV of a ports structured array."""
+    return "".join(
+        f"{p['name']}, {p['x']:.3f}, {p['y']:.3f}, {int(p['orientation'])}, "
+        f"{p['width']:.3f}, {p['layer']}, {p['purpose']}\n"
+        for p in ports_array
+    )
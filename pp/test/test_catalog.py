@@ -0,0 +1,71 @@
+import os
+
+import pp
+from pp.autoplacer.functions import WORKING_MEMORY
+from pp.autoplacer.library import Library
+from pp.catalog import Catalog, update_catalog
+from pp.write_doe import write_doe_metadata
+
+
+def test_catalog_write_component(tmp_path):
+    c = pp.c.mmi1x2()
+    gdspath = pp.write_component(c, gdsdir=tmp_path, catalog=True)
+    with Catalog(tmp_path) as catalog:
+        entry = catalog.get(c.name)
+        assert entry["gdspath"] == gdspath
+        assert entry["function_name"] == "mmi1x2"
+        assert [port["name"] for port in entry["ports"]] == list(c.ports)
+        assert set(entry["layers"]) == c.get_layers()
+        assert entry["hash"]
+
+        catalog.update()
+        assert catalog.get(c.name)["hash"] == entry["hash"]
+
+
+def test_catalog_query(tmp_path):
+    for length in [1, 2, 3]:
+        pp.write_component(pp.c.waveguide(length=length), gdsdir=tmp_path)
+    pp.write_component(pp.c.mmi1x2(), gdsdir=tmp_path, sidecar="npz")
+    write_doe_metadata(
+        doe_name="wg_short",
+        cell_names=["waveguide_L1", "waveguide_L2"],
+        list_settings=[dict(length=1), dict(length=2)],
+        doe_metadata_path=tmp_path,
+    )
+
+    catalog = update_catalog(tmp_path)
+    assert len(catalog) == 4
+    assert catalog.names("WAVEGUIDE_L[12]") == ["waveguide_L1", "waveguide_L2"]
+    assert catalog.names(function_name="waveguide", length=3) == ["waveguide_L3"]
+    assert catalog.names(layer=(1, 0), width=0.5, length=2) == ["waveguide_L2"]
+    assert catalog.names(doe="wg_short") == ["waveguide_L1", "waveguide_L2"]
+    assert catalog.does() == {"wg_short": ["waveguide_L1", "waveguide_L2"]}
+    assert catalog.get("mmi1x2")["settings"]["settings"]["width_mmi"] == 2.5
+    assert catalog.get("waveguide_L3")["bbox"] == [[0.0, -0.25], [3.0, 0.25]]
+    assert list(catalog.load("mmi1x2").ports) == list(pp.c.mmi1x2().ports)
+
+    (tmp_path / "waveguide_L3.gds").unlink()
+    pp.write_gds(pp.c.waveguide(length=4), tmp_path / "waveguide_L1.gds")
+    os.utime(tmp_path / "waveguide_L1.gds", ns=(0, 1))
+    catalog.update()
+    assert catalog.names("waveguide") == ["waveguide_L2", "waveguide_L4"]
+
+
+def test_catalog_library(tmp_path):
+    for length in [1, 2]:
+        pp.write_component(pp.c.waveguide(length=length), gdsdir=tmp_path)
+    pp.write_component(pp.c.mmi1x2(), gdsdir=tmp_path)
+
+    lib = Library(str(tmp_path))
+    assert sorted(lib.cells) == ["mmi1x2", "waveguide_L1", "waveguide_L2"]
+    assert not (tmp_path / "catalog.db").exists()
+
+    WORKING_MEMORY.clear()
+    lib = Library(str(tmp_path), catalog=True)
+    assert not lib.cells.loaded
+    cells = lib.pop("waveguide").cells
+    assert [cell.name for cell in cells] == ["waveguide_L2", "waveguide_L1"]
+    assert lib.names == {"mmi1x2"}
+    loaded = {str(filename) for filename in WORKING_MEMORY}
+    assert str(tmp_path / "waveguide_L1.gds") in loaded
+    assert str(tmp_path / "mmi1x2.gds") not in loaded
@@ -0,0 +1,38 @@
+"""Micro-benchmark for the cached-hit latency of `@cell` functions.
+
+Routing-heavy layouts call cells like `waveguide(length=...)` many times,
+so getting a Component from the cache has to stay cheap.
+
+Wall-clock timings depend on the machine, so the test only runs with
+`PP_BENCHMARK=1 pytest pp/test/test_cell_benchmark.py`.
+"""
+import os
+import timeit
+
+import pytest
+
+import pp
+
+MAX_CACHED_HIT_LATENCY = 50e-6  # seconds per call
+
+
+def get_cached_hit_latency(number: int = 10000) -> float:
+    """Returns the mean time in seconds to get a cached waveguide."""
+    pp.c.waveguide(length=3.0, width=0.5)
+    timer = timeit.Timer(lambda: pp.c.waveguide(length=3.0, width=0.5))
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+@pytest.mark.skipif(
+    not os.environ.get("PP_BENCHMARK"), reason="benchmark, set PP_BENCHMARK=1"
+)
+def test_cached_hit_latency(record_property):
+    latency = get_cached_hit_latency()
+    record_property("cached_hit_latency_us", latency * 1e6)
+    assert (
+        latency < MAX_CACHED_HIT_LATENCY
+    ), f"cached @cell call takes {latency*1e6:.1f}us > {MAX_CACHED_HIT_LATENCY*1e6}us"
+
+
+if __name__ == "__main__":
+    print(f"{get_cached_hit_latency()*1e6:.2f} us per cached call")
@@ -0,0 +1,144 @@
+"""component_from_yaml compiles the YAML once and, given the previous
+Component, only rebuilds what a YAML edit changes."""
+import sys
+
+import pytest
+
+import pp
+from pp.component_from_yaml import compile_yaml, component_from_yaml
+from pp.components import component_factory
+
+
+def get_yaml(n: int = 6, dx: float = 50, length_mmi: float = 5) -> str:
+    """Returns n mmis in pairs, the second of each pair placed from the first
+    one and routed to it."""
+    instances = "\n".join(
+        f"""
+    mmi{i}:
+      component: mmi1x2
+      settings:
+        length_mmi: {length_mmi if i == 0 else 5 + i}"""
+        for i in range(n)
+    )
+    placements = "\n".join(
+        f"""
+    mmi{i}:
+        x: 0
+        y: {i * 100}"""
+        if i % 2 == 0
+        else f"""
+    mmi{i}:
+        x: mmi{i - 1},east
+        y: mmi{i - 1},north
+        dx: {dx if i == 3 else 50}
+        dy: 20
+        rotation: 180"""
+        for i in range(n)
+    )
+    routes = "\n".join(
+        f"""
+    r{i}:
+        factory: optical
+        links:
+            mmi{i - 1},E0: mmi{i},E0"""
+        for i in range(1, n, 2)
+    )
+    return f"""
+name: incremental
+instances:{instances}
+placements:{placements}
+routes:{routes}
+"""
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Counts the instances and routes that are built."""
+    module = sys.modules["pp.component_from_yaml"]
+    calls = dict(instances=0, routes=0)
+
+    def mmi1x2(**settings):
+        calls["instances"] += 1
+        return pp.c.mmi1x2(**settings)
+
+    get_route = module.get_route
+
+    def get_route_counted(*args, **kwargs):
+        calls["routes"] += 1
+        return get_route(*args, **kwargs)
+
+    monkeypatch.setattr(module, "get_route", get_route_counted)
+    calls["factory"] = dict(component_factory, mmi1x2=mmi1x2)
+    return calls
+
+
+def assert_same(c1, c2):
+    assert c1.hash_geometry() == c2.hash_geometry()
+    assert c1.get_netlist() == c2.get_netlist()
+    assert list(c1.routes) == list(c2.routes)
+    assert len(c1.references) == len(c2.references)
+
+
+def build(calls, yaml_str, previous=None):
+    calls["instances"] = calls["routes"] = 0
+    return component_from_yaml(
+        yaml_str, component_factory=calls["factory"], previous=previous
+    )
+
+
+def test_compile_yaml_cached(tmp_path):
+    yaml_str = get_yaml()
+    plan = compile_yaml(yaml_str)
+    assert compile_yaml(yaml_str) is plan
+    yaml_path = tmp_path / "incremental.yml"
+    yaml_path.write_text(yaml_str)
+    assert compile_yaml(yaml_path) is plan
+
+    plan2 = compile_yaml(get_yaml(dx=60))
+    changed = {
+        name
+        for name in plan.instance_keys
+        if plan.instance_keys[name] != plan2.instance_keys[name]
+    }
+    assert changed == {"mmi3"}
+    assert plan.build_keys == plan2.build_keys
+
+
+def test_rebuild_placement(calls):
+    c1 = build(calls, get_yaml())
+    assert calls == dict(calls, instances=6, routes=3)
+
+    c2 = build(calls, get_yaml(dx=60), previous=c1)
+    assert calls == dict(calls, instances=0, routes=1)
+    assert_same(c2, build(calls, get_yaml(dx=60)))
+    assert c2.instances["mmi3"].x == c1.instances["mmi3"].x + 10
+
+    # previous is not modified
+    assert_same(c1, build(calls, get_yaml()))
+
+
+def test_rebuild_settings(calls):
+    c1 = build(calls, get_yaml())
+    c2 = build(calls, get_yaml(length_mmi=7), previous=c1)
+    assert calls == dict(calls, instances=1, routes=1)
+    assert_same(c2, build(calls, get_yaml(length_mmi=7)))
+
+    # unchanged YAML reuses everything
+    c3 = build(calls, get_yaml(length_mmi=7), previous=c2)
+    assert calls == dict(calls, instances=0, routes=0)
+    assert_same(c3, c2)
+
+
+if __name__ == "__main__":
+    import time
+
+    yaml1, yaml2 = get_yaml(500), get_yaml(500, dx=60)
+    c1 = component_from_yaml(yaml1)
+    t0 = time.perf_counter()
+    component_from_yaml(yaml2)
+    t1 = time.perf_counter()
+    component_from_yaml(yaml2, previous=c1)
+    t2 = time.perf_counter()
+    print(
+        f"500 instances, one dx changed: {t1 - t0:.2f} s, incremental {t2 - t1:.2f} s"
+    )
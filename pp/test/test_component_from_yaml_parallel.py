@@ -0,0 +1,121 @@
+"""component_from_yaml builds instances in a process pool and places and
+routes them as soon as the instances they depend on are built.
+
+Run this file to compare serial and parallel build times of a netlist
+with many heavy instances.
+"""
+import time
+
+import pytest
+
+import pp
+from pp.component_from_yaml import (
+    build_instances,
+    component_from_yaml,
+    get_placement_dependencies,
+    get_route_instances,
+)
+from pp.test_component_from_yaml import sample_mmis, yaml_strings
+
+yaml_missing = """
+instances:
+    mmi1:
+      component: mmi1x2
+    mmi2:
+      component: mmi1x2
+      settings:
+        length_mmi: 10
+placements:
+    mmi1:
+        x: mmi3,E0
+"""
+
+
+def get_yaml_spirals(n: int = 8) -> str:
+    """Returns a YAML netlist of n spirals chained by connections."""
+    instances = "\n".join(
+        f"""
+    s{i}:
+      component: spiral_inner_io
+      settings:
+        N: {6 + i}"""
+        for i in range(n)
+    )
+    placements = "\n".join(
+        f"""
+    s{i}:
+        x: s{i - 1},east
+        dx: 100"""
+        for i in range(1, n)
+    )
+    return f"""
+name: spirals_{n}
+instances:{instances}
+placements:{placements}
+"""
+
+
+@pytest.mark.parametrize("yaml_key", ["yaml_anchor", "sample_connections"])
+def test_component_from_yaml_parallel(yaml_key):
+    pp.clear_cache()
+    c1 = component_from_yaml(yaml_strings[yaml_key])
+    netlist1 = c1.get_netlist()
+    hash1 = c1.hash_geometry()
+
+    pp.clear_cache()
+    c2 = component_from_yaml(yaml_strings[yaml_key], workers=2)
+    assert c2.hash_geometry() == hash1
+    assert c2.get_netlist() == netlist1
+    assert list(c2.instances) == list(c1.instances)
+    assert list(c2.routes) == list(c1.routes)
+
+
+def test_build_instances_shared():
+    pp.clear_cache()
+    c = component_from_yaml(sample_mmis.replace("length_mmi: 5", "length_mmi: 10"))
+    assert c.instances["mmi_long"].parent is c.instances["mmi_short"].parent
+
+
+def test_dependencies():
+    placements = {"a": {"x": "b,E0"}, "b": {"y": "c,E0"}, "c": {"x": 1}}
+    connections = {"d": {"instance_dst_name": "a"}}
+    dependencies = get_placement_dependencies(
+        ["a", "b", "c", "d"], placements, connections
+    )
+    assert dependencies["a"] == {"a", "b", "c"}
+    assert dependencies["d"] == {"a", "b", "c", "d"}
+    assert dependencies["c"] == {"c"}
+
+    routes = dict(links={"a,E0": "b,W0", "c,E:0:3": "d,W:3:0"})
+    assert get_route_instances(routes, ["a", "b", "c", "d", "e"]) == {
+        "a",
+        "b",
+        "c",
+        "d",
+    }
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_build_instances(workers):
+    builds = [
+        (pp.c.waveguide, dict(length=length), [f"wg{length}"]) for length in [1, 2, 3]
+    ]
+    built = {}
+    build_instances(builds, lambda names, c: built.update({names[0]: c}), workers)
+    assert sorted(built) == ["wg1", "wg2", "wg3"]
+    assert built["wg2"].xsize == 2
+    assert built["wg2"] is pp.c.waveguide(length=2)
+
+
+def test_missing_instance_parallel():
+    with pytest.raises(ValueError, match="mmi3"):
+        component_from_yaml(yaml_missing, workers=2)
+
+
+if __name__ == "__main__":
+    yaml_spirals = get_yaml_spirals()
+    for workers in [None, 4]:
+        pp.clear_cache()
+        t0 = time.perf_counter()
+        c = component_from_yaml(yaml_spirals, workers=workers)
+        print(f"workers={workers}: {time.perf_counter() - t0:.2f} s")
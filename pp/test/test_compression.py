@@ -0,0 +1,129 @@
+"""Compressed GDS files (`.gds.gz`, `.gds.zst`) are written and read by
+file extension.
+
+Run this file to compare size and write/read throughput of each compression
+and level for a set of typical devices (used to choose COMPRESSION_LEVELS).
+"""
+import datetime
+import time
+
+import numpy as np
+import pytest
+
+import pp
+from pp.catalog import update_catalog
+from pp.compression import COMPRESSION_LEVELS, get_suffix, strip_compression
+from pp.load_component import load_component
+
+
+def get_devices():
+    """Returns typical devices, as written to build/devices."""
+    return [
+        pp.c.waveguide(),
+        pp.c.mmi1x2(),
+        pp.c.mzi(),
+        pp.c.ring_single(),
+        pp.c.spiral_inner_io(),
+        pp.routing.add_fiber_array(pp.c.mmi1x2()),
+    ]
+
+
+def benchmark(components, dirpath, levels=None) -> dict:
+    """Returns {(compression, level): (bytes, write MB/s, read MB/s)}
+    with the uncompressed size for the throughputs."""
+    levels = levels or [(None, None), ("gzip", 1), ("gzip", 6), ("gzip", 9)]
+    results = {}
+    for compression, level in levels:
+        suffix = {None: ".gds", "gzip": ".gds.gz", "zstd": ".gds.zst"}[compression]
+        default_level = COMPRESSION_LEVELS.get(compression)
+        if compression:
+            COMPRESSION_LEVELS[compression] = level
+        try:
+            t0 = time.perf_counter()
+            paths = [
+                pp.write_gds(c, dirpath / f"{c.name}_{level}{suffix}")
+                for c in components
+            ]
+            t1 = time.perf_counter()
+            for path in paths:
+                pp.import_gds(path, cache=False)
+            t2 = time.perf_counter()
+        finally:
+            if compression:
+                COMPRESSION_LEVELS[compression] = default_level
+        results[(compression, level)] = (
+            sum(path.stat().st_size for path in paths),
+            t1 - t0,
+            t2 - t1,
+        )
+    size = results[(None, None)][0] / 1e6
+    return {
+        key: (nbytes, size / write_time, size / read_time)
+        for key, (nbytes, write_time, read_time) in results.items()
+    }
+
+
+def test_compression_suffix():
+    assert str(strip_compression("a/mzi.gds.gz")) == "a/mzi.gds"
+    assert str(strip_compression("a/mzi.gds")) == "a/mzi.gds"
+    assert get_suffix("a/mzi.oas.zst") == ".oas.zst"
+
+
+def test_compression_roundtrip(tmp_path):
+    c = pp.c.mzi()
+    gdspath = pp.write_component(c, gdspath=tmp_path / "mzi.gds.gz")
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "mzi.gds.gz",
+        "mzi.json",
+        "mzi.ports",
+    ]
+    assert gdspath.read_bytes()[:2] == b"\x1f\x8b"
+    timestamp = datetime.datetime(2021, 1, 1)
+    gz = [pp.write_gds(c, tmp_path / f"{i}.gds.gz", timestamp=timestamp) for i in "ab"]
+    gds = pp.write_gds(c, tmp_path / "c.gds", timestamp=timestamp)
+    assert gz[0].read_bytes() == gz[1].read_bytes()
+    assert gz[0].stat().st_size < gds.stat().st_size
+
+    for engine in ["gdspy", "klayout"]:
+        c1 = pp.import_gds(gdspath, engine=engine, cache=False)
+        assert np.allclose(c1.bbox, c.bbox)
+        assert c1.area(by_spec=True).keys() == c.area(by_spec=True).keys()
+
+    c3 = load_component(gdspath)
+    assert list(c3.ports) == list(c.ports)
+    assert c3.settings["settings"]["delta_length"] == c.settings["delta_length"]
+
+    for path in gz + [gds]:
+        path.unlink()
+    catalog = update_catalog(tmp_path)
+    assert catalog.get("mzi")["filename"] == "mzi.gds.gz"
+    assert catalog.get("mzi")["function_name"] == "mzi"
+
+
+def test_compression_zstd(tmp_path):
+    pytest.importorskip("zstandard")
+    c = pp.c.mzi()
+    c1 = load_component(pp.write_component(c, gdspath=tmp_path / "mzi.gds.zst"))
+    assert np.allclose(c1.bbox, c.bbox)
+    assert list(c1.ports) == list(c.ports)
+    c2 = pp.import_gds(pp.write_gds(c, tmp_path / "mzi.oas.zst"), cache=False)
+    assert np.allclose(c2.bbox, c.bbox)
+
+
+if __name__ == "__main__":
+    levels = [(None, None)] + [("gzip", level) for level in [1, 3, 6, 9]]
+    try:
+        import zstandard  # noqa: F401
+
+        levels += [("zstd", level) for level in [1, 3, 9, 19]]
+    except ImportError:
+        pass
+    results = benchmark(get_devices() * 20, pp.CONFIG["build_directory"], levels)
+    print(
+        f"{'compression':<12} {'level':>6} {'MB':>8} {'write MB/s':>11} {'read MB/s':>10}"
+    )
+    for (compression, level), (size, write_speed, read_speed) in results.items():
+        print(
+            f"{str(compression):<12} {str(level):>6} {size/1e6:>8.3f} "
+            f"{write_speed:>11.1f} {read_speed:>10.1f}"
+        )
@@ -1,7 +1,15 @@
+import hashlib
+
 import gdspy
+import numpy as np
 
 import pp
-from pp.compare_cells import hash_cells
+from pp.compare_cells import (
+    MAGIC_OFFSET,
+    hash_cells,
+    hash_polygons,
+    normalize_polygon_start_point,
+)
 from pp.components.mzi2x2 import mzi2x2
 
 
@@ -46,5 +54,59 @@ def test_hash():
     assert h1 != h2
 
 
+def test_hash_polygons():
+    precision = 1e-4
+    polygons = [
+        np.array([(1, 0), (0, 1), (0, 0), (1, 1)], dtype=float),
+        np.array([(2, 0), (3, 1), (2, -1)], dtype=float),
+        np.array([(5, 5), (4, 4), (4, 4), (6, 4)], dtype=float),
+    ]
+    expected = sorted(
+        hashlib.sha1(
+            normalize_polygon_start_point(
+                ((p / precision) + MAGIC_OFFSET).astype(np.int64)
+            )
+        ).hexdigest()
+        for p in polygons
+    )
+    points = np.concatenate(polygons)
+    sizes = [len(p) for p in polygons]
+    assert hash_polygons(points, sizes, precision=precision) == expected
+
+
+def test_hash_memo():
+    c = pp.Component("hash_memo")
+    ref = c.add_ref(pp.c.waveguide(length=10))
+    h1 = c.hash_geometry()
+    assert c.hash_geometry() == h1
+    assert hash_cells(c, {}, max_workers=2)[c.name] == h1
+
+    ref.movex(1)
+    h2 = c.hash_geometry()
+    assert h2 != h1
+    ref.movex(-1)
+    assert c.hash_geometry() == h1
+
+
+def test_hash_memo_reference_transforms():
+    child = pp.Component("hash_memo_child")
+    ref = child.add_ref(pp.c.waveguide(length=10))
+    top = pp.Component("hash_memo_top")
+    top.add_ref(child)
+    h1 = top.hash_geometry()
+
+    ref.translate(3, 0)
+    h2 = top.hash_geometry()
+    assert h2 != h1
+
+    # references that the cell does not own do not change its version
+    unowned = gdspy.CellReference(pp.c.waveguide(length=10))
+    child.references.append(unowned)
+    h3 = top.hash_geometry()
+    assert h3 != h2
+    unowned.translate(0, 5)
+    assert top.hash_geometry() != h3
+
+
 if __name__ == "__main__":
     debug()
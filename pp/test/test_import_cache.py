@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+import pp
+from pp.import_cache import IMPORT_CACHE, ImportCache
+
+
+def test_import_cache_hit(tmp_path):
+    gdspath = pp.write_gds(pp.c.mzi(), tmp_path / "mzi.gds")
+    IMPORT_CACHE.clear()
+    c1 = pp.import_gds(gdspath, cache=True)
+    c2 = pp.import_gds(gdspath, cache=True)
+    assert (IMPORT_CACHE.hits, IMPORT_CACHE.misses) == (1, 1)
+    assert c1 is not c2
+    assert np.allclose(c1.bbox, c2.bbox)
+
+    c3 = pp.import_gds(gdspath, cache=False)
+    assert np.allclose(c1.bbox, c3.bbox)
+    assert (IMPORT_CACHE.hits, IMPORT_CACHE.misses) == (1, 1)
+
+
+def test_import_cache_copy_on_write(tmp_path):
+    gdspath = pp.write_gds(pp.c.mzi(), tmp_path / "mzi.gds")
+    IMPORT_CACHE.invalidate(gdspath)
+    c1 = pp.import_gds(gdspath, cache=True)
+    bbox = c1.bbox
+    area = c1.area(by_spec=True)
+
+    c1.references[0].move((100, 100))
+    c1.add_polygon([(0, 0), (1e3, 0), (1e3, 1e3)], layer=pp.LAYER.WG)
+    c1.references[0].ref_cell.remove_layers([pp.LAYER.WG])
+
+    c2 = pp.import_gds(gdspath, cache=True)
+    assert np.allclose(c2.bbox, bbox)
+    assert c2.area(by_spec=True) == area
+
+
+def test_import_cache_invalidate(tmp_path):
+    gdspath = tmp_path / "c.gds"
+    pp.write_gds(pp.c.waveguide(length=1), gdspath)
+    c1 = pp.import_gds(gdspath, cache=True)
+
+    pp.write_gds(pp.c.waveguide(length=2), gdspath)
+    assert pp.import_gds(gdspath, cache=True).xsize > c1.xsize
+
+    stat = gdspath.stat()
+    os.utime(gdspath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    misses = IMPORT_CACHE.misses
+    pp.import_gds(gdspath, cache=True)
+    assert IMPORT_CACHE.misses == misses + 1
+
+
+def test_import_cache_evict(tmp_path):
+    cache = ImportCache(max_entries=2)
+    for length in [1, 2, 3]:
+        gdspath = pp.write_gds(
+            pp.c.waveguide(length=length), tmp_path / f"{length}.gds"
+        )
+        cache.add(cache.get_key(gdspath), pp.import_gds(gdspath, cache=False))
+    assert len(cache) == 2
+    assert cache.get(cache.get_key(tmp_path / "1.gds")) is None
+
+    cache = ImportCache(max_bytes=1)
+    cache.add(cache.get_key(gdspath), pp.import_gds(gdspath, cache=False))
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_import_gds_editable(tmp_path):
+    gdspath = pp.write_gds(pp.c.waveguide(length=2), tmp_path / "wg.gds")
+    for _ in range(2):
+        c = pp.import_gds(gdspath)
+        points = c.polygons[0].polygons[0]
+        x = points[:, 0].copy()
+        points[:, 0] += 10
+        assert np.allclose(pp.import_gds(gdspath).polygons[0].polygons[0][:, 0], x)
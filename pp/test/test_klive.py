@@ -0,0 +1,162 @@
+"""klive client against a stub server that validates the protocol."""
+import json
+import os
+import socketserver
+import threading
+
+import pytest
+
+import pp
+from pp import klive
+from pp.klive import KliveClient
+
+
+class StubHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        if server.legacy:
+            # klive < 0.0.7: loads the last line when the client closes
+            lines = self.rfile.read().splitlines()
+            server.requests.append(self.validate(lines[-1]))
+            return
+
+        self.wfile.write(b"klive stub\n")
+        for line in self.rfile:
+            gds = self.validate(line)
+            server.requests.append(gds)
+            if server.error:
+                self.wfile.write(b"ERROR cannot load\n")
+                continue
+            self.wfile.write(f"Loaded {gds}\n".encode())
+            if len(server.requests) == server.close_after:
+                return
+
+    def validate(self, line: bytes) -> str:
+        assert line.endswith(b"\n") or self.server.legacy
+        data = json.loads(line)
+        assert sorted(data) == ["gds", "keep_position"]
+        assert isinstance(data["keep_position"], bool)
+        assert os.path.isabs(data["gds"]) and os.path.isfile(data["gds"])
+        return data["gds"]
+
+
+@pytest.fixture
+def server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.legacy = False
+    server.error = False
+    server.close_after = None
+    server.connections = 0
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_paths(tmp_path, n):
+    paths = [tmp_path / f"{i}.gds" for i in range(n)]
+    for path in paths:
+        path.write_bytes(b"")
+    return paths
+
+
+def test_klive_persistent_coalesced(server, tmp_path):
+    client = KliveClient(port=server.server_address[1])
+    paths = get_paths(tmp_path, 4)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_request():
+        started.set()
+        release.wait(5)
+        return klive.get_request(paths[0])
+
+    client.submit(slow_request)
+    started.wait(5)
+    for path in paths[1:]:
+        client.submit(lambda path=path: klive.get_request(path))
+    release.set()
+    assert client.flush(timeout=5)
+
+    assert server.requests == [str(paths[0]), str(paths[-1])]
+    assert server.connections == 1 and client.persistent
+    assert (client.sent, client.coalesced, client.errors) == (2, 2, 0)
+
+    # reconnects when the server closes the connection
+    server.close_after = 3
+    for path in paths[1:3]:
+        client.submit(lambda path=path: klive.get_request(path))
+        client.flush(timeout=5)
+    assert server.requests[2:] == [str(paths[1]), str(paths[2])]
+    assert server.connections == 2 and client.errors == 0
+
+
+def test_klive_error(server, tmp_path):
+    server.error = True
+    client = KliveClient(port=server.server_address[1])
+    path = get_paths(tmp_path, 1)[0]
+    client.submit(lambda: klive.get_request(path))
+    assert client.flush(timeout=5)
+    assert server.requests == [str(path)]
+    assert (client.sent, client.errors) == (0, 1)
+    assert server.connections == 1
+
+
+def test_klive_stop(server, tmp_path):
+    client = KliveClient(port=server.server_address[1])
+    paths = get_paths(tmp_path, 2)
+    client.submit(lambda: klive.get_request(paths[0]))
+    assert client.stop(timeout=5)
+    assert client._thread is None and server.requests == [str(paths[0])]
+
+    client.submit(lambda: klive.get_request(paths[1]))
+    assert client.flush(timeout=5) and client.stop(timeout=5)
+    assert server.requests == [str(path) for path in paths]
+
+
+def test_klive_legacy_server(server, tmp_path):
+    server.legacy = True
+    client = KliveClient(port=server.server_address[1], timeout=0.2)
+    paths = get_paths(tmp_path, 2)
+    for path in paths:
+        client.submit(lambda path=path: klive.get_request(path))
+        client.flush(timeout=5)
+
+    assert client.persistent is False and client.errors == 0
+    for _ in range(50):
+        if len(server.requests) == 2:
+            break
+        threading.Event().wait(0.05)
+    assert server.requests == [str(path) for path in paths]
+    assert server.connections == 2
+
+
+def test_klive_show_component(server, tmp_path, monkeypatch):
+    client = KliveClient(port=server.server_address[1])
+    monkeypatch.setattr(klive, "CLIENT", client)
+    c = pp.Component("klive_show")
+    c << pp.c.waveguide(length=3)
+    pp.show(c, gdsdir=tmp_path, block=True)
+    assert server.requests == [str(tmp_path / f"{c.name}.gds")]
+    assert pp.import_gds(server.requests[0]).xsize == c.xsize
+    assert sorted(path.name for path in tmp_path.iterdir()) == [f"{c.name}.gds"]
+
+
+def test_klive_show_snapshot(server, tmp_path, monkeypatch):
+    client = KliveClient(port=server.server_address[1])
+    monkeypatch.setattr(klive, "CLIENT", client)
+    c = pp.Component("klive_snapshot")
+    ref = c << pp.c.waveguide(length=3)
+    xsize = c.xsize
+    with client._condition:  # holds the sender thread until c is edited
+        pp.show(c, gdsdir=tmp_path)
+        ref.movex(10)
+        c << pp.c.waveguide(length=5)
+    client.flush()
+    c_shown = pp.import_gds(server.requests[0])
+    assert c_shown.xsize == xsize
+    assert len(c_shown.references) == 1
@@ -0,0 +1,77 @@
+"""Benchmark for get_netlist on layouts with many instances.
+
+Instance names come from an index of the labels and the ports of all the
+references are transformed as one array, so the extraction time grows
+linearly with the number of references.
+"""
+import time
+
+import numpy as np
+
+import pp
+from pp.drc import snap_to_1nm_grid
+from pp.get_netlist import get_netlist, get_references_ports
+
+MAX_SECONDS_PER_10K = 10.0
+
+
+def get_grid(n: int = 10000, labels: bool = True) -> pp.Component:
+    """Returns a grid of n ring_single_array instances named by labels."""
+    c = pp.Component(f"ring_single_array_grid_{n}_{labels}")
+    cell = pp.c.ring_single_array()
+    side = int(np.ceil(np.sqrt(n)))
+    for i in range(n):
+        ref = c.add_ref(cell)
+        ref.move((i % side * 500, i // side * 100))
+        if labels:
+            c.add_label(
+                f"ring_array_{i}", position=ref.center, layer=pp.LAYER.LABEL_INSTANCE
+            )
+    return c
+
+
+def get_netlist_seconds(n: int = 10000) -> float:
+    c = get_grid(n)
+    t0 = time.perf_counter()
+    netlist = get_netlist(c)
+    t1 = time.perf_counter()
+    assert len(netlist["instances"]) == n
+    return t1 - t0
+
+
+def test_references_ports():
+    c = pp.Component("references_ports")
+    mmi = pp.c.mmi1x2()
+    for i, (rotation, mirror) in enumerate(
+        [(0, False), (90, False), (180, True), (270, False), (33, True)]
+    ):
+        ref = c.add_ref(mmi).rotate(rotation).move((i * 20.0, 3.0))
+        if mirror:
+            ref.reflect()
+    names, midpoints = get_references_ports(c.references)
+    expected = [
+        (i, name, port.midpoint)
+        for i, ref in enumerate(c.references)
+        for name, port in ref.ports.items()
+    ]
+    assert names == [(i, name) for i, name, _ in expected]
+    assert np.array_equal(midpoints, np.array([m for _, _, m in expected]))
+
+
+def test_netlist_labels_index():
+    c = get_grid(25)
+    netlist = get_netlist(c)
+    assert sorted(netlist["instances"]) == sorted(f"ring_array_{i}" for i in range(25))
+    x, y = snap_to_1nm_grid(c.references[0].origin)
+    assert netlist["placements"]["ring_array_0"]["x"] == x
+
+
+def test_netlist_benchmark(record_property):
+    seconds = get_netlist_seconds(2000) * 5
+    record_property("netlist_seconds_per_10k", seconds)
+    assert seconds < MAX_SECONDS_PER_10K
+
+
+if __name__ == "__main__":
+    for n in [1000, 10000]:
+        print(f"{n} instances: {get_netlist_seconds(n):.2f} s")
@@ -0,0 +1,166 @@
+import json
+
+import numpy as np
+import pytest
+from omegaconf import OmegaConf
+
+import pp
+from pp.netlist_hierarchical import (
+    flatten_netlist,
+    from_dict,
+    get_cells,
+    get_connections,
+    get_netlist_hierarchical,
+    get_nets,
+    to_dict,
+)
+from pp.test.test_netlist_benchmark import get_grid
+
+
+def get_net_names(flat):
+    nets = get_nets(flat)
+    names = {}
+    for node, net in zip(flat["nodes"], nets):
+        names.setdefault(net, set()).add(node)
+    return {frozenset(names) for names in names.values() if len(names) > 1}
+
+
+def test_netlist_hierarchical_matches_get_netlist():
+    c = pp.c.mzi()
+    netlist = get_netlist_hierarchical(c)
+    assert list(netlist["cells"])[-1] == netlist["top"] == c.name
+
+    for cell in [c] + [ref.parent for ref in c.references]:
+        expected = cell.get_netlist()
+        connections = get_connections(netlist, cell.name)
+        ports = set(cell.ports)
+        assert {
+            (a, b) if a in ports else tuple(sorted([a, b])) for a, b in connections
+        } == set(expected["connections"].items()) | set(expected["ports"].items())
+        assert sorted(netlist["cells"][cell.name]["instances"]) == sorted(
+            expected["instances"]
+        )
+
+
+def test_netlist_hierarchical_memo():
+    c = get_grid(25)
+    cell = c.references[0].parent
+    netlist = get_netlist_hierarchical(c)
+    assert len(netlist["cells"]) == len({c.name, cell.name} | cell_names(cell))
+    assert netlist["cells"][cell.name]["placements"].shape == (len(cell.references), 3,)
+
+    again = get_netlist_hierarchical(c)
+    assert all(
+        again["cells"][name] is netlist["cells"][name] for name in netlist["cells"]
+    )
+
+    c.references[0].move((1, 0))
+    moved = get_netlist_hierarchical(c)
+    assert moved["cells"][c.name] is not netlist["cells"][c.name]
+    assert moved["cells"][cell.name] is netlist["cells"][cell.name]
+
+
+def test_netlist_hierarchical_reference_transforms():
+    c = pp.Component("netlist_transforms")
+    ref = c << pp.c.waveguide(length=3)
+    assert get_netlist_hierarchical(c)["cells"][c.name]["placements"].tolist() == [
+        [0, 0, 0]
+    ]
+    ref.translate(3, 0)
+    assert get_netlist_hierarchical(c)["cells"][c.name]["placements"].tolist() == [
+        [3, 0, 0]
+    ]
+    ref.rotation = 90
+    ref.x_reflection = True
+    cell = get_netlist_hierarchical(c)["cells"][c.name]
+    assert cell["placements"].tolist() == [[3, 0, 90]]
+    assert cell["mirror"].tolist() == [True]
+
+
+def test_netlist_hierarchical_duplicated_names():
+    c = pp.Component("netlist_duplicated_names")
+    for length in [1, 2]:
+        child = pp.Component("dup")
+        child << pp.c.waveguide(length=length)
+        c << child
+    with pytest.raises(ValueError):
+        get_netlist_hierarchical(c)
+
+
+def test_get_cells_identity(monkeypatch):
+    import pp.netlist_hierarchical as netlist_hierarchical
+
+    c = pp.Component("get_cells_identity")
+    children = [pp.Component("same") for _ in range(2)]
+    for child in children:
+        child << pp.c.waveguide(length=1)
+        for _ in range(10):
+            c << child
+
+    calls = []
+    hash_cell = netlist_hierarchical.hash_cell
+    monkeypatch.setattr(
+        netlist_hierarchical,
+        "hash_cell",
+        lambda cell: calls.append(cell) or hash_cell(cell),
+    )
+    cells = get_cells(c)
+    assert [cell.name for cell in cells].count("same") == 1
+    assert len(calls) == 2
+
+
+def cell_names(cell):
+    names = set()
+    for ref in cell.references:
+        names |= {ref.parent.name} | cell_names(ref.parent)
+    return names
+
+
+def test_netlist_hierarchical_flatten():
+    c = pp.Component("netlist_hierarchical_flatten")
+    mzi = pp.c.mzi()
+    mzi1 = c << mzi
+    mzi2 = c << mzi
+    mzi2.connect("W0", mzi1.ports["E0"])
+    c.add_port("W0", port=mzi1.ports["W0"])
+    netlist = get_netlist_hierarchical(c)
+    flat = flatten_netlist(netlist)
+
+    nodes = 2 * len(flatten_netlist(get_netlist_hierarchical(mzi))["nodes"])
+    assert len(flat["nodes"]) == len(set(flat["nodes"])) == nodes + len(c.ports)
+
+    name1, name2 = netlist["cells"][c.name]["instances"]
+    nets = get_net_names(flat)
+    assert any({"W0", f"{name1},W0"} <= net for net in nets)
+    assert any({f"{name1},E0", f"{name2},W0"} <= net for net in nets)
+    assert not any({f"{name1},W0", f"{name2},W0"} <= net for net in nets)
+
+    # the nets inside each instance are the nets of the cell
+    inner = get_net_names(flatten_netlist(get_netlist_hierarchical(mzi)))
+    for name in [name1, name2]:
+        prefixed = {
+            frozenset(
+                f"{name}/{node}" if "," in node else f"{name},{node}" for node in net
+            )
+            for net in inner
+        }
+        assert all(any(net <= net2 for net2 in nets) for net in prefixed)
+
+
+def test_netlist_hierarchical_serialize():
+    netlist = get_netlist_hierarchical(pp.c.mzi_lattice())
+    data = to_dict(netlist)
+    assert json.loads(json.dumps(data)) == data
+    yaml_data = OmegaConf.to_container(OmegaConf.create(OmegaConf.to_yaml(data)))
+    assert yaml_data == data
+
+    netlist2 = from_dict(data)
+    for name, cell in netlist["cells"].items():
+        for key, value in cell.items():
+            if isinstance(value, np.ndarray):
+                assert np.array_equal(value, netlist2["cells"][name][key])
+            else:
+                assert value == netlist2["cells"][name][key]
+    assert np.array_equal(
+        flatten_netlist(netlist)["edges"], flatten_netlist(netlist2)["edges"]
+    )
@@ -23,7 +23,7 @@ def test_netlist_read_full():
     # print(len(c.get_netlist().connections))
     # print(len(c.get_dependencies()))
     # assert len(c.get_netlist().connections) == 18
-    assert len(c.get_dependencies()) == 18
+    assert len(c.get_dependencies()) == 5
     return c
 
 
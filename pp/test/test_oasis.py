@@ -0,0 +1,75 @@
+"""OASIS files are written and read by file extension.
+
+Run this file to compare the size and write/read time of GDS and OASIS
+for a sample mask.
+"""
+import time
+
+import numpy as np
+
+import pp
+from pp.load_component import load_component
+
+
+def get_sample_mask(copies: int = 10) -> pp.Component:
+    """Returns a mask with fiber arrays around a few sample components."""
+    components = [
+        pp.routing.add_fiber_array(c)
+        for c in [pp.c.mzi(), pp.c.ring_single(), pp.c.spiral_inner_io(), pp.c.mmi1x2()]
+    ]
+    mask = pp.Component(f"sample_mask_{copies}")
+    for i in range(copies):
+        for j, c in enumerate(components):
+            ref = mask.add_ref(c)
+            ref.move((j * 3000, i * 3000))
+    return mask
+
+
+def benchmark(component: pp.Component, dirpath) -> dict:
+    """Returns {suffix: (file size in bytes, write seconds, read seconds)}."""
+    results = {}
+    for suffix in [".gds", ".oas"]:
+        filepath = dirpath / f"{component.name}{suffix}"
+        t0 = time.perf_counter()
+        pp.write_gds(component, filepath)
+        t1 = time.perf_counter()
+        pp.import_gds(filepath)
+        t2 = time.perf_counter()
+        results[suffix] = (filepath.stat().st_size, t1 - t0, t2 - t1)
+    return results
+
+
+def test_oasis_roundtrip(tmp_path):
+    c = pp.c.mzi()
+    gdspath = pp.write_component(c, gdspath=tmp_path / "mzi.oas")
+    assert gdspath.suffix == ".oas"
+    assert gdspath.with_suffix(".ports").exists()
+    assert gdspath.with_suffix(".json").exists()
+
+    c1 = load_component(pp.write_component(c, gdspath=tmp_path / "mzi.gds"))
+    c2 = load_component(gdspath)
+    assert list(c2.ports) == list(c.ports)
+    assert np.allclose(c2.bbox, c.bbox)
+
+    # klayout can change the winding of polygons, so compare areas
+    cells1 = {cell.name: cell for cell in c1.get_dependencies(recursive=True)}
+    cells2 = {cell.name: cell for cell in c2.get_dependencies(recursive=True)}
+    assert cells1.keys() == cells2.keys()
+    for name, cell in cells1.items():
+        area1 = cell.area(by_spec=True)
+        area2 = cells2[name].area(by_spec=True)
+        assert area1.keys() == area2.keys()
+        assert np.allclose([area1[k] for k in area1], [area2[k] for k in area1])
+
+
+def test_oasis_smaller(tmp_path):
+    results = benchmark(get_sample_mask(copies=2), tmp_path)
+    assert results[".oas"][0] < results[".gds"][0]
+
+
+if __name__ == "__main__":
+    mask = get_sample_mask()
+    results = benchmark(mask, pp.CONFIG["build_directory"])
+    print(f"{'format':<8} {'MB':>8} {'write (s)':>10} {'read (s)':>10}")
+    for suffix, (size, write_time, read_time) in results.items():
+        print(f"{suffix:<8} {size/1e6:>8.3f} {write_time:>10.3f} {read_time:>10.3f}")
@@ -0,0 +1,69 @@
+import numpy as np
+from omegaconf import OmegaConf
+
+import pp
+from pp.lazy_component import load_lazy_component
+from pp.load_component import load_component
+from pp.mask.merge_json import merge_json
+from pp.sidecar import INDEX_NAME, export_sidecar, read_index
+
+
+def test_sidecar_load_component(tmp_path):
+    c = pp.c.mmi1x2()
+    gdspath = pp.write_component(c, gdsdir=tmp_path, sidecar="npz")
+    assert gdspath.with_suffix(".npz").exists()
+    assert not gdspath.with_suffix(".json").exists()
+
+    c1 = load_component(gdspath)
+    c2 = load_lazy_component(gdspath)
+    for c_loaded in [c1, c2]:
+        assert list(c_loaded.ports) == list(c.ports)
+        for name, port in c.ports.items():
+            assert np.allclose(c_loaded.ports[name].midpoint, port.midpoint)
+            assert c_loaded.ports[name].port_type == port.port_type
+    assert c1.settings["settings"]["width_mmi"] == c.settings["width_mmi"]
+    assert c2.settings["width_mmi"] == c.settings["width_mmi"]
+
+
+def test_sidecar_switch_format(tmp_path):
+    c = pp.c.mmi1x2()
+    gdspath = pp.write_component(c, gdsdir=tmp_path, sidecar="npz")
+    c2 = pp.Component(c.name)
+    c2.add_port(name="W0", midpoint=(0, 0), width=0.5, orientation=180)
+    pp.write_component(c2, gdsdir=tmp_path, sidecar="csv")
+    assert not gdspath.with_suffix(".npz").exists()
+    assert list(load_component(gdspath).ports) == ["W0"]
+    assert list(load_lazy_component(gdspath).ports) == ["W0"]
+
+    pp.write_component(c, gdsdir=tmp_path, sidecar="npz")
+    assert not gdspath.with_suffix(".json").exists()
+    assert not gdspath.with_suffix(".ports").exists()
+
+
+def test_sidecar_export(tmp_path):
+    c = pp.c.mmi1x2()
+    csvpath = pp.write_component(c, gdsdir=tmp_path / "csv", sidecar="csv")
+    npzpath = pp.write_component(c, gdsdir=tmp_path / "npz", sidecar="npz")
+    ports_path, json_path = export_sidecar(npzpath.with_suffix(".npz"))
+    assert ports_path.read_text() == csvpath.with_suffix(".ports").read_text()
+    assert json_path.read_text() == csvpath.with_suffix(".json").read_text()
+
+
+def test_sidecar_index(tmp_path):
+    dirpath = tmp_path / "devices" / "wg"
+    for length in [1, 2]:
+        pp.write_component(pp.c.waveguide(length=length), gdsdir=dirpath, sidecar="npz")
+    index = read_index(dirpath)
+    assert sorted(index) == ["waveguide_L1", "waveguide_L2"]
+    assert (dirpath / INDEX_NAME).exists()
+
+    pp.write_component(pp.c.waveguide(length=3), gdsdir=dirpath, sidecar="npz")
+    assert len(read_index(dirpath)) == 3
+
+    metadata = merge_json(
+        doe_directory=tmp_path / "doe",
+        extra_directories=[tmp_path / "devices"],
+        jsonpath=tmp_path / "metadata.json",
+        config=OmegaConf.create(dict(name="test")),
+    )
+    assert "waveguide_L3" in metadata["cells"]
@@ -0,0 +1,41 @@
+import pp
+from pp.write_component import read_manifest, write_component
+
+
+def test_write_component_incremental(tmp_path):
+    c = pp.c.waveguide(length=3)
+    gdspath = write_component(c, gdsdir=tmp_path, incremental=True)
+    paths = [gdspath.with_suffix(suffix) for suffix in [".gds", ".ports", ".json"]]
+    mtimes = [path.stat().st_mtime_ns for path in paths]
+    manifest = read_manifest(gdspath.with_suffix(".manifest"))
+    assert manifest["geometry"] and manifest["settings"]
+
+    assert write_component(c, gdsdir=tmp_path, incremental=True) == gdspath
+    assert [path.stat().st_mtime_ns for path in paths] == mtimes
+
+    c2 = pp.Component(c.name)
+    c2 << pp.c.waveguide(length=4)
+    write_component(c2, gdsdir=tmp_path, incremental=True)
+    assert gdspath.stat().st_mtime_ns != mtimes[0]
+    assert read_manifest(gdspath.with_suffix(".manifest")) != manifest
+    # c2 has no ports, so the .ports of c is removed
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [path.name for path in paths if path.suffix != ".ports"]
+        + [gdspath.with_suffix(".manifest").name]
+    )
+
+
+def test_write_component_removes_manifest(tmp_path):
+    c = pp.c.waveguide(length=3)
+    gdspath = write_component(c, gdsdir=tmp_path, incremental=True)
+    manifest_path = gdspath.with_suffix(".manifest")
+
+    c2 = pp.Component(c.name)
+    c2 << pp.c.waveguide(length=4)
+    write_component(c2, gdsdir=tmp_path)
+    assert not manifest_path.exists()
+
+    mtime = gdspath.stat().st_mtime_ns
+    write_component(c, gdsdir=tmp_path, incremental=True)
+    assert gdspath.stat().st_mtime_ns != mtime
+    assert manifest_path.exists()
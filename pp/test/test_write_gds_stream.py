@@ -0,0 +1,116 @@
+import datetime
+
+import gdspy
+import pytest
+
+import pp
+from pp.compare_cells import hash_cells
+from pp.write_component import write_gds, write_gds_stream
+
+
+def _read_hashes(gdspath):
+    lib = gdspy.GdsLibrary(infile=str(gdspath))
+    hashes = {}
+    for cell in lib.top_level():
+        hash_cells(cell, hashes)
+    return hashes
+
+
+def test_write_gds_stream(tmp_path):
+    c = pp.c.mzi()
+    hashes = _read_hashes(pp.write_gds(c, tmp_path / "mzi.gds"))
+    assert _read_hashes(write_gds_stream(c, tmp_path / "mzi_stream.gds")) == hashes
+
+
+def test_write_gds_stream_generator(tmp_path):
+    lengths = [1, 2, 3]
+
+    def components():
+        for length in lengths:
+            c = pp.Component(f"top_{length}")
+            c << pp.c.waveguide(length=length)
+            c << pp.c.mmi1x2()
+            yield c
+
+    gdspath = write_gds_stream(components(), tmp_path / "tops.gds", free=True)
+    lib = gdspy.GdsLibrary(infile=str(gdspath))
+    assert sorted(c.name for c in lib.top_level()) == [
+        f"top_{length}" for length in lengths
+    ]
+    assert len(lib.cells) == 2 * len(lengths) + 1
+    assert lib.cells["top_1"].get_bounding_box() is not None
+    assert pp.c.mmi1x2().polygons
+
+
+def _cell(name, layer):
+    c = pp.Component(name)
+    c.add_polygon([(0, 0), (1, 0), (1, 1)], layer=layer)
+    return c
+
+
+def test_write_gds_stream_duplicated_names(tmp_path):
+    c = pp.Component("duplicated_names")
+    c << _cell("dup", layer=(1, 0))
+    c << _cell("dup", layer=(2, 0))
+    with pytest.raises(ValueError):
+        write_gds_stream(c, tmp_path / "dup.gds")
+
+    def components():
+        for layer in [(1, 0), (2, 0)]:
+            top = pp.Component(f"top_{layer[0]}")
+            top << _cell("dup", layer=layer)
+            yield top
+
+    tops = list(components())
+    with pytest.raises(ValueError):
+        write_gds_stream(tops, tmp_path / "tops.gds")
+
+    # cells with the same name and geometry (rebuilt) are written once
+    tops = [pp.Component(f"top_{i}") for i in range(2)]
+    for top in tops:
+        top << _cell("dup", layer=(1, 0))
+    lib = gdspy.GdsLibrary(infile=str(write_gds_stream(tops, tmp_path / "ok.gds")))
+    assert len(lib.cells) == 3
+
+
+def test_write_gds_stream_free(tmp_path):
+    dup = _cell("dup_free", layer=(1, 0))
+    top1 = pp.Component("top_free_1")
+    top1 << dup
+    top2 = pp.Component("top_free_2")
+    top2 << dup
+    top2 << _cell("dup_free", layer=(1, 0))
+    gdspath = write_gds_stream([top1, top2], tmp_path / "free.gds", free=True)
+    assert len(gdspy.GdsLibrary(infile=str(gdspath)).cells) == 3
+
+    tops = [pp.Component(f"top_free_{layer[0]}") for layer in [(1, 0), (2, 0)]]
+    for top, layer in zip(tops, [(1, 0), (2, 0)]):
+        top << _cell("dup_free", layer=layer)
+    with pytest.raises(ValueError):
+        write_gds_stream(tops, tmp_path / "free_dup.gds", free=True)
+
+
+def test_write_gds_workers(tmp_path):
+    c = pp.c.mzi()
+    timestamp = datetime.datetime(2020, 1, 1)
+    gdspath1 = write_gds(c, tmp_path / "serial.gds", timestamp=timestamp)
+    gdspath2 = write_gds(c, tmp_path / "parallel.gds", workers=2, timestamp=timestamp)
+    assert gdspath1.read_bytes() == gdspath2.read_bytes()
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_write_gds_duplicated_names(tmp_path, workers):
+    c = pp.Component("duplicated_names")
+    c << _cell("dup", layer=(1, 0))
+    c << _cell("dup", layer=(2, 0))
+    with pytest.raises(ValueError):
+        write_gds(c, tmp_path / "dup.gds", workers=workers)
+
+    gdspath = write_gds(c, tmp_path / "renamed.gds", auto_rename=True)
+    lib = gdspy.GdsLibrary(infile=str(gdspath))
+    assert len(lib.cells) == 3
+    assert set(lib.top_level()[0].get_polygons(by_spec=True)) == {(1, 0), (2, 0)}
+
+
+if __name__ == "__main__":
+    test_write_gds_stream(pp.CONFIG["build_directory"])
@@ -2,18 +2,55 @@
 
 """
 
+import copy
+import datetime
+import hashlib
+import io
+import itertools
 import json
+import multiprocessing
+import os
 import pathlib
+import struct
 import tempfile
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
 from pathlib import PosixPath
-from typing import Optional
-
-from phidl import device_layout as pd
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import gdspy
+import klayout.db as pya
+import numpy as np
 
 from pp import klive
-from pp.cell import clear_cache
+from pp.catalog import Catalog
+from pp.cell import CACHE, get_cell_key
+from pp.compare_cells import hash_cell, hash_cells
 from pp.component import Component
-from pp.config import CONFIG
+from pp.compression import (
+    get_format_suffix,
+    get_suffix,
+    open_compressed,
+    strip_compression,
+    write_layout,
+)
+from pp.config import CONFIG, __version__, conf
+from pp.disk_cache import _atomic_write
+from pp.import_cache import IMPORT_CACHE
+from pp.sidecar import get_ports_array, get_ports_csv, get_sidecar
+
+OASIS_COMPRESSION_LEVEL = 2
 
 tmp = pathlib.Path(tempfile.TemporaryDirectory().name).parent / "gdsfactory"
 tmp.mkdir(exist_ok=True)
@@ -38,7 +75,7 @@ def write_component_report(component: Component, json_path=None) -> PosixPath:
                 )
 
     with open(json_path, "w+") as fw:
-        fw.write(json.dumps(component.get_json(), indent=2))
+        fw.write(json.dumps(get_json(component), indent=2))
     return json_path
 
 
@@ -47,6 +84,9 @@ def write_component(
     gdspath: Optional[PosixPath] = None,
     gdsdir: PosixPath = tmp,
     precision: float = 1e-9,
+    incremental: bool = False,
+    sidecar: Optional[str] = None,
+    catalog: Optional[bool] = None,
 ) -> PosixPath:
     """write component GDS and metadata:
 
@@ -54,33 +94,159 @@ def write_component(
     - ports
     - properties
 
+    Files are written into a temporary file and renamed,
+    so readers never see half-written files.
+
     Args:
         component:
         gdspath:
         path_library
         precision: to save GDS points
+        incremental: skips writing if the geometry and settings hashes
+            match the `.manifest` next to the GDS (and writes the manifest).
+            Other writes remove the manifest (or rewrite it with catalog)
+        sidecar: `csv` writes `.ports` CSV and `.json`, `npz` a binary `.npz`
+            (see pp.sidecar), defaults to conf.sidecar_format
+        catalog: adds the component to the catalog of the GDS directory
+            (see pp.catalog), defaults to conf.catalog
     """
 
     gdspath = gdspath or gdsdir / (component.name + ".gds")
     gdspath = pathlib.Path(gdspath)
-    ports_path = gdspath.with_suffix(".ports")
-    json_path = gdspath.with_suffix(".json")
+    sidecar_path = strip_compression(gdspath)
+    ports_path = sidecar_path.with_suffix(".ports")
+    json_path = sidecar_path.with_suffix(".json")
+    npz_path = sidecar_path.with_suffix(".npz")
+    manifest_path = sidecar_path.with_suffix(".manifest")
+    sidecar = sidecar or conf.sidecar_format
+    if sidecar not in ["csv", "npz"]:
+        raise ValueError(f"sidecar = {sidecar!r} must be 'csv' or 'npz'")
+
+    ports_array = get_ports_array(component)
+    metadata = get_json(component)
+    if sidecar == "npz":
+        data = get_sidecar(ports_array, metadata)
+        paths = [gdspath, npz_path]
+    else:
+        # component.ports CSV and component.json metadata dict
+        ports = get_ports_csv(ports_array)
+        metadata = json.dumps(metadata, indent=2)
+        data = (ports + metadata).encode()
+        paths = [gdspath, json_path] + ([ports_path] if ports else [])
+
+    catalog = conf.catalog if catalog is None else catalog
+    if incremental or catalog:
+        manifest = get_manifest(component, data, precision=precision)
+    if incremental:
+        if (
+            all(path.exists() for path in paths)
+            and read_manifest(manifest_path) == manifest
+        ):
+            component.path = gdspath
+            if catalog:
+                _add_to_catalog(component, gdspath, manifest)
+            return gdspath
+
+    with _atomic_path(gdspath) as tmppath:
+        write_gds(component=component, gdspath=tmppath, precision=precision)
+    IMPORT_CACHE.invalidate(gdspath)
+    component.path = gdspath
 
-    gdspath = write_gds(component=component, gdspath=str(gdspath), precision=precision,)
+    if sidecar == "npz":
+        _atomic_write(npz_path, data)
+    else:
+        if ports:
+            _atomic_write(ports_path, ports.encode())
+        _atomic_write(json_path, metadata.encode())
+    # readers prefer the .npz, so remove the sidecars of the other format
+    if sidecar == "npz":
+        stale = [ports_path, json_path]
+    else:
+        stale = [npz_path] + ([] if ports else [ports_path])
+    for path in stale:
+        if path.exists():
+            path.unlink()
+    if incremental or catalog:
+        _atomic_write(manifest_path, json.dumps(manifest, indent=2).encode())
+    elif manifest_path.exists():
+        manifest_path.unlink()
+    if catalog:
+        _add_to_catalog(component, gdspath, manifest)
+    return gdspath
 
-    # component.ports CSV
-    if len(component.ports) > 0:
-        with open(ports_path, "w") as fw:
-            for port in component.ports.values():
-                layer, purpose = pd._parse_layer(port.layer)
-                fw.write(
-                    f"{port.name}, {port.x:.3f}, {port.y:.3f}, {int(port.orientation)}, {port.width:.3f}, {layer}, {purpose}\n"
-                )
 
-    # component.json metadata dict
-    with open(json_path, "w+") as fw:
-        fw.write(json.dumps(component.get_json(), indent=2))
-    return gdspath
+def _add_to_catalog(
+    component: Component, gdspath: PosixPath, manifest: Dict[str, str]
+) -> None:
+    with Catalog(gdspath.parent) as catalog:
+        catalog.add_component(component, gdspath, geometry_hash=manifest["geometry"])
+
+
+def get_manifest(
+    component: Component, metadata: bytes, precision: float
+) -> Dict[str, str]:
+    """Returns the geometry and settings hashes that write_component compares.
+
+    Args:
+        component: to hash
+        metadata: sidecars written for component
+        precision: GDS precision
+    """
+    geometry = hashlib.sha1(hash_cell(component).encode())
+    cells = [component] + list(component.get_dependencies(recursive=True))
+    for cell in sorted(cells, key=lambda cell: cell.name):
+        for label in cell.labels:
+            geometry.update(
+                f"{cell.name}{label.text}{np.round(label.position, 4).tolist()}"
+                f"{label.layer}{label.texttype}{label.rotation}".encode()
+            )
+    settings = hashlib.sha1(metadata + f"{precision}".encode())
+    return dict(
+        geometry=geometry.hexdigest(),
+        settings=settings.hexdigest(),
+        version=__version__,
+    )
+
+
+def read_manifest(manifest_path: PosixPath) -> Optional[Dict[str, str]]:
+    """Returns the manifest written by write_component (None if missing)."""
+    try:
+        return json.loads(pathlib.Path(manifest_path).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+@contextmanager
+def _atomic_path(filepath: pathlib.Path) -> Iterator[pathlib.Path]:
+    """Yields a temporary path next to filepath that is renamed to filepath
+    if the context exits without errors."""
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    suffix = get_suffix(filepath)
+    fd, tmppath = tempfile.mkstemp(
+        dir=filepath.parent,
+        prefix=f".{filepath.name[: len(filepath.name) - len(suffix)]}.",
+        suffix=suffix,
+    )
+    os.close(fd)
+    try:
+        yield pathlib.Path(tmppath)
+        os.replace(tmppath, filepath)
+    finally:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+
+
+def get_json(component: Component) -> Dict[str, Any]:
+    """Returns component metadata with the bbox, so pp.lazy_component can
+    load an abstract view (ports, bbox, settings) without the GDS,
+    and the cell key (source hash and settings) it was built with."""
+    bbox = component.get_bounding_box()
+    bbox = None if bbox is None else bbox.tolist()
+    metadata = component.get_json(bbox=bbox)
+    cell_key = get_cell_key(component)
+    if cell_key:
+        metadata["cell_key"] = cell_key
+    return metadata
 
 
 def write_json(json_path, **settings):
@@ -97,6 +263,8 @@ def write_gds(
     unit: float = 1e-6,
     precision: float = 1e-9,
     auto_rename: bool = False,
+    workers: Optional[int] = None,
+    timestamp: Optional[datetime.datetime] = None,
 ) -> PosixPath:
     """Write component to GDS and returs gdspath
 
@@ -107,6 +275,12 @@ def write_gds(
         precision: for the dimensions of the objects in the library (m).
         remove_previous_markers: clear previous ones to avoid duplicates.
         auto_rename: If True, fixes any duplicate cell names.
+        workers: processes to serialize the cells (same file as 1 worker).
+        timestamp: GDS timestamp (defaults to now).
+
+    Writes OASIS (with CBLOCK compression and repetitions) if gdspath ends
+    with `.oas`, and compresses as a stream if it ends with `.gz` (gzip) or
+    `.zst` (zstd), see pp.compression.
 
     Returns:
         gdspath
@@ -118,13 +292,382 @@ def write_gds(
     gdsdir = gdspath.parent
     gdsdir.mkdir(exist_ok=True, parents=True)
 
-    component.write_gds(
-        str(gdspath), unit=unit, precision=precision, auto_rename=auto_rename,
-    )
+    is_oasis = get_format_suffix(gdspath) == ".oas"
+    with ExitStack() as files:
+        if is_oasis:
+            outfile = io.BytesIO()
+        else:
+            outfile = files.enter_context(open_compressed(gdspath, "wb"))
+
+        if auto_rename:
+            component.write_gds(
+                outfile, unit=unit, precision=precision, auto_rename=auto_rename,
+            )
+        else:
+            cells = list(_get_dependencies_bottom_up(component))
+            with GdsWriter(
+                outfile, unit=unit, precision=precision, timestamp=timestamp
+            ) as writer:
+                if workers and workers > 1 and len(cells) > 1 and klive.can_fork():
+                    writer.write_cells_parallel(cells, workers=workers)
+                else:
+                    for cell in cells:
+                        writer.write_cell(cell)
+
+    if is_oasis:
+        gds_to_oas(outfile.getvalue(), gdspath)
+    IMPORT_CACHE.invalidate(gdspath)
     component.path = gdspath
     return gdspath
 
 
+def get_oasis_options(
+    compression_level: int = OASIS_COMPRESSION_LEVEL,
+) -> pya.SaveLayoutOptions:
+    """Returns klayout options to write compressed OASIS.
+
+    Args:
+        compression_level: 0 (no repetitions) to 10 (searches more repetitions)
+    """
+    options = pya.SaveLayoutOptions()
+    options.format = "OASIS"
+    options.oasis_compression_level = compression_level
+    options.oasis_write_cblocks = True
+    options.oasis_strict_mode = True
+    options.write_context_info = False
+    return options
+
+
+def gds_to_oas(
+    gds: Union[bytes, PosixPath],
+    oaspath: PosixPath,
+    compression_level: int = OASIS_COMPRESSION_LEVEL,
+) -> PosixPath:
+    """Converts GDS (bytes or file path) to an OASIS file with CBLOCK
+    compression and repetitions.
+
+    Args:
+        gds: GDS data or path
+        oaspath: OASIS file path to write to
+        compression_level: 0 (no repetitions) to 10 (searches more repetitions)
+    """
+    layout = pya.Layout()
+    if isinstance(gds, bytes):
+        layout.read_bytes(gds)
+    else:
+        layout.read(str(gds))
+    write_layout(layout, oaspath, get_oasis_options(compression_level))
+    return oaspath
+
+
+def _check_same_cell(cell1: gdspy.Cell, cell2: gdspy.Cell) -> None:
+    """Raises ValueError if two cells with the same name have different
+    geometry (a cell rebuilt after clearing the cache is the same cell)."""
+    if cell1 is not cell2 and hash_cell(cell1) != hash_cell(cell2):
+        raise ValueError(
+            f"Two different cells are named {cell1.name!r}, give them different "
+            "names or use write_gds(auto_rename=True)"
+        )
+
+
+def _get_dependencies_bottom_up(
+    cell: gdspy.Cell, skip: Optional[Callable[[gdspy.Cell], bool]] = None
+) -> Iterator[gdspy.Cell]:
+    """Yields cell and the cells it references (once per cell, skipping
+    the cells for which skip returns True), children before their parents.
+
+    Raises ValueError if two cells with different geometry have the same name.
+    """
+    stack = [(cell, False)]
+    visited = {}
+    while stack:
+        cell, expanded = stack.pop()
+        if expanded:
+            yield cell
+            continue
+        other = visited.get(cell.name)
+        if other is not None:
+            # written names are checked by skip against the written geometry
+            if other is not cell and not (skip is not None and skip(cell)):
+                _check_same_cell(cell, other)
+            continue
+        visited[cell.name] = cell
+        if skip is not None and skip(cell):
+            continue
+        stack.append((cell, True))
+        for reference in reversed(cell.references):
+            if isinstance(reference.ref_cell, gdspy.Cell):
+                stack.append((reference.ref_cell, False))
+
+
+class GdsWriter:
+    """Streams cells to a GDS file as they are written.
+
+    Cells are written once, after all the cells they reference, so the
+    writer only keeps the names of the cells that it wrote, with their
+    geometry hash (and a weak reference to them). Writing a cell with the
+    name of a written one and a different hash raises ValueError, even if
+    the written cell was released (free or garbage collected).
+
+    .. code::
+
+        with GdsWriter("mask.gds") as writer:
+            for component in components:  # can be a generator
+                writer.write(component)
+
+    Args:
+        gdspath: GDS file path (`.gds.gz` and `.gds.zst` compress as a
+            stream) or binary file to write to
+        unit: unit size for objects in library (m)
+        precision: for the dimensions of the objects in the library (m)
+        name: library name
+        timestamp: GDS timestamp (defaults to now)
+        free: after writing a cell, removes it from the cell cache and
+            clears its geometry (the component can not be used after)
+    """
+
+    def __init__(
+        self,
+        gdspath: Union[PosixPath, str],
+        unit: float = 1e-6,
+        precision: float = 1e-9,
+        name: str = "library",
+        timestamp: Optional[datetime.datetime] = None,
+        free: bool = False,
+    ) -> None:
+        self.gdspath = gdspath
+        self.multiplier = unit / precision
+        self.timestamp = timestamp or datetime.datetime.today()
+        self.free = free
+        self.names = {}  # name: (weakref to the written cell, geometry hash)
+        self._hashes = {}  # hash_cells memo of the written cells
+
+        self._files = ExitStack()
+        if hasattr(gdspath, "write"):
+            self.outfile = gdspath
+        else:
+            self.outfile = self._files.enter_context(open_compressed(gdspath, "wb"))
+
+        now = self.timestamp
+        name = name if len(name) % 2 == 0 else (name + "\0")
+        self.outfile.write(
+            struct.pack(
+                ">5H12h2H",
+                6,
+                0x0002,
+                0x0258,
+                28,
+                0x0102,
+                *(now.year, now.month, now.day, now.hour, now.minute, now.second) * 2,
+                4 + len(name),
+                0x0206,
+            )
+            + name.encode("ascii")
+            + struct.pack(">2H", 20, 0x0305)
+            + gdspy.library._eight_byte_real(precision / unit)
+            + gdspy.library._eight_byte_real(precision)
+        )
+
+    def is_written(self, cell: gdspy.Cell) -> bool:
+        """Returns True if cell was written. Raises ValueError if a cell
+        with the same name and different geometry was written."""
+        if cell.name not in self.names:
+            return False
+        written, written_hash = self.names[cell.name]
+        written = written() if isinstance(written, weakref.ref) else written
+        if written is not cell and hash_cell(cell) != written_hash:
+            raise ValueError(
+                f"Two different cells are named {cell.name!r}, give them different "
+                "names or use write_gds(auto_rename=True)"
+            )
+        return True
+
+    def _add(self, cell: gdspy.Cell) -> None:
+        # children are written (and hashed) first, so each cell is hashed once
+        cell_hash = hash_cells(cell, self._hashes)[cell.name]
+        try:
+            self.names[cell.name] = (weakref.ref(cell), cell_hash)
+        except TypeError:  # gdspy cells do not support weak references
+            self.names[cell.name] = (cell, cell_hash)
+        if self.free:
+            _free(cell)
+
+    def write_cell(self, cell: gdspy.Cell) -> None:
+        """Writes one cell (not the cells that it references)."""
+        if self.is_written(cell):
+            return
+        cell.to_gds(self.outfile, self.multiplier, timestamp=self.timestamp)
+        self._add(cell)
+
+    def write_cells_parallel(self, cells: List[gdspy.Cell], workers: int) -> None:
+        """Writes cells in order, serializing them in a pool of forked processes.
+
+        The cells are split in contiguous chunks of similar size,
+        so concatenating the chunks gives the same bytes as write_cell.
+        """
+        global _CELLS
+        unique = {}
+        for cell in cells:
+            if cell.name in unique:
+                _check_same_cell(cell, unique[cell.name])
+            elif not self.is_written(cell):
+                unique[cell.name] = cell
+        cells = list(unique.values())
+        chunks = _split_chunks(cells, n=4 * workers)
+        _CELLS = cells
+        try:
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(workers, mp_context=context) as executor:
+                for data in executor.map(
+                    _to_gds_bytes,
+                    chunks,
+                    itertools.repeat(self.multiplier),
+                    itertools.repeat(self.timestamp),
+                ):
+                    self.outfile.write(data)
+        finally:
+            _CELLS = None
+        for cell in cells:
+            self._add(cell)
+
+    def write(self, component: gdspy.Cell) -> None:
+        """Writes component and all the cells it references."""
+        for cell in _get_dependencies_bottom_up(component, skip=self.is_written):
+            self.write_cell(cell)
+
+    def close(self) -> None:
+        """Writes the end of the library and closes the file."""
+        if self.outfile is None:
+            return
+        self.outfile.write(struct.pack(">2H", 4, 0x0400))
+        self._files.close()
+        self.outfile = None
+
+    def __enter__(self) -> "GdsWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class _CellSnapshot(gdspy.Cell):
+    """gdspy Cell that can be written by write_gds (it has a path)."""
+
+
+def _snapshot(component: gdspy.Cell) -> gdspy.Cell:
+    """Returns a copy of component and the cells it references that only
+    shares the polygon points (replaced, not modified, by transformations),
+    so editing component does not change the copy."""
+    cells = {}
+    for cell in _get_dependencies_bottom_up(component):
+        snapshot = _CellSnapshot(cell.name, exclude_from_current=True)
+        snapshot.polygons = [copy.copy(polygon) for polygon in cell.polygons]
+        snapshot.paths = [copy.deepcopy(path) for path in cell.paths]
+        snapshot.labels = [copy.copy(label) for label in cell.labels]
+        for reference in cell.references:
+            ref_cell = reference.ref_cell
+            ref_cell = (
+                cells[ref_cell.name] if isinstance(ref_cell, gdspy.Cell) else ref_cell
+            )
+            transform = dict(
+                origin=tuple(reference.origin),
+                rotation=reference.rotation,
+                magnification=reference.magnification,
+                x_reflection=reference.x_reflection,
+            )
+            if isinstance(reference, gdspy.CellArray):
+                snapshot.add(
+                    gdspy.CellArray(
+                        ref_cell,
+                        columns=reference.columns,
+                        rows=reference.rows,
+                        spacing=tuple(reference.spacing),
+                        **transform,
+                    )
+                )
+            else:
+                snapshot.add(gdspy.CellReference(ref_cell, **transform))
+        cells[cell.name] = snapshot
+    return cells[component.name]
+
+
+def _free(cell: gdspy.Cell) -> None:
+    """Releases the geometry of a written cell."""
+    if isinstance(cell, Component):
+        CACHE.invalidate(cell)
+    cell.polygons = []
+    cell.paths = []
+    cell.labels = []
+    cell.references = []
+    cell._bb_valid = False
+
+
+_CELLS = None  # cells to serialize, inherited by the forked workers
+
+
+def _to_gds_bytes(
+    chunk: Tuple[int, int], multiplier: float, timestamp: datetime.datetime
+) -> bytes:
+    """Returns the GDS records of the cells [start, stop) of _CELLS."""
+    outfile = io.BytesIO()
+    for cell in _CELLS[chunk[0] : chunk[1]]:
+        cell.to_gds(outfile, multiplier, timestamp=timestamp)
+    return outfile.getvalue()
+
+
+def _split_chunks(cells: List[gdspy.Cell], n: int) -> List[Tuple[int, int]]:
+    """Returns [start, stop) ranges of cells with a similar number of
+    polygon points."""
+    weights = np.cumsum(
+        [
+            1 + sum(p.size for polygonset in cell.polygons for p in polygonset.polygons)
+            for cell in cells
+        ]
+    )
+    stops = np.searchsorted(weights, weights[-1] * np.arange(1, n) / n, side="right")
+    stops = sorted(set(stops.tolist()) | {len(cells)})
+    starts = [0] + stops[:-1]
+    return [(start, stop) for start, stop in zip(starts, stops) if stop > start]
+
+
+def write_gds_stream(
+    components: Union[Component, Iterable[Component]],
+    gdspath: PosixPath,
+    unit: float = 1e-6,
+    precision: float = 1e-9,
+    free: bool = False,
+    timestamp: Optional[datetime.datetime] = None,
+) -> PosixPath:
+    """Writes one or many components to a GDS file, one cell at a time.
+
+    Unlike write_gds, it does not build a library with all the cells,
+    so components can come from a generator and be released as soon as
+    they are written.
+
+    Args:
+        components: Component or iterable (or generator) of Components
+        gdspath: GDS file path to write to
+        unit: unit size for objects in library (m)
+        precision: for the dimensions of the objects in the library (m)
+        free: clears the geometry of the cells after writing them
+        timestamp: GDS timestamp (defaults to now)
+
+    Returns:
+        gdspath
+    """
+    gdspath = pathlib.Path(gdspath)
+    gdspath.parent.mkdir(exist_ok=True, parents=True)
+    if isinstance(components, gdspy.Cell):
+        components = [components]
+
+    with GdsWriter(
+        gdspath, unit=unit, precision=precision, free=free, timestamp=timestamp
+    ) as writer:
+        for component in components:
+            writer.write(component)
+    return gdspath
+
+
 def clean_value(value):
     """Returns JSON serializable value."""
     if isinstance(value, Component):
@@ -138,32 +681,60 @@ def clean_value(value):
     return value
 
 
-def show(component: Component, **kwargs) -> None:
+def show(component: Component, block: bool = False, **kwargs) -> None:
     """write component GDS and shows it in klayout
 
+    Returns right away: the GDS of a copy of the component (so it can be
+    edited after show) is written and sent to klayout from a background
+    thread, which skips the components that a later call to show replaces
+    before they are written (see pp.klive). With auto_rename the GDS is
+    written before returning.
+
     Args:
         component
+        block: waits until the GDS is written and sent
+        kwargs: for write_gds
     """
     if isinstance(component, pathlib.Path):
         component = str(component)
-        return klive.show(component)
+        return klive.show(component, block=block)
     elif isinstance(component, str):
-        return klive.show(component)
+        return klive.show(component, block=block)
     elif hasattr(component, "path"):
-        return klive.show(component.path)
+        return klive.show(component.path, block=block)
     elif component is None:
         raise ValueError(
             "Component is None, make sure that your function returns the component"
         )
 
     elif isinstance(component, Component):
-        gdspath = write_gds(component, **kwargs)
-        klive.show(gdspath)
+        gdspath = kwargs.get("gdspath") or pathlib.Path(kwargs.get("gdsdir", tmp)) / (
+            component.name + ".gds"
+        )
+        gdspath = pathlib.Path(gdspath)
+        snapshot = component if kwargs.get("auto_rename") else _snapshot(component)
+
+        def write() -> None:
+            with _atomic_path(gdspath) as tmppath:
+                write_gds(snapshot, **dict(kwargs, gdspath=tmppath))
+            IMPORT_CACHE.invalidate(gdspath)
+
+        def write_request() -> bytes:
+            if snapshot is not component:
+                write()
+            component.path = gdspath
+            return klive.get_request(gdspath)
+
+        if snapshot is component:
+            write()
+        klive.CLIENT.submit(write_request)
+        if block:
+            klive.CLIENT.flush()
     else:
         raise ValueError(
             f"Component is {type(component)}, make sure pass a Component or a path"
         )
-    clear_cache()
+    CACHE.invalidate(component)
 
 
 if __name__ == "__main__":